@@ -0,0 +1,42 @@
+"""Latency admin page: per-stage p50/p95/p99 from the span log written by rag.tracing.
+
+    streamlit run admin.py
+"""
+import os
+import sys
+import time
+
+import streamlit as st
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from rag.tracing import TRACE_FILE, load_spans, summarize_spans
+
+st.set_page_config(page_title="RAG latency")
+st.title("Pipeline latency")
+
+trace_file = st.sidebar.text_input("Span log", value=TRACE_FILE)
+window = st.sidebar.selectbox("Window", ["15 minutes", "1 hour", "24 hours", "All"], index=1)
+seconds = {"15 minutes": 900, "1 hour": 3600, "24 hours": 86400, "All": None}[window]
+
+spans = load_spans(trace_file)
+if not spans:
+    st.info("No spans recorded yet. Ask a question in one of the apps, or set TRACE_FILE.")
+    st.stop()
+
+apps = sorted({item.get("app") for item in spans if item.get("app")})
+selected = st.sidebar.multiselect("Apps", apps, default=apps)
+traces = {item["trace"] for item in spans if item.get("span") == "request" and item.get("app") in selected}
+if apps:
+    spans = [item for item in spans if item.get("trace") in traces or item.get("trace") is None]
+
+summary = summarize_spans(spans, since=time.time() - seconds if seconds else None)
+rows = [
+    {"stage": stage, "count": stats["count"],
+     **{key: round(stats[key] * 1000, 1) for key in ("p50", "p95", "p99", "mean") if key in stats}}
+    for stage, stats in summary.items()
+]
+st.caption("Milliseconds, wall clock")
+st.dataframe(rows, use_container_width=True)
+
+if st.sidebar.button("Refresh"):
+    st.rerun()
@@ -0,0 +1,88 @@
+"""Chunks/sec and prompt tokens per answer of the apps' chunking strategies.
+
+Each strategy splits the bundled PDFs the way one of the apps did, or with
+rag.chunking.StructuredSplitter. Timed separately: extraction plus chunking,
+and chunking alone over already extracted pages. Then the chunks are indexed
+in FAISS with FakeEmbeddings, and for each question the top-k chunks are
+stuffed into a prompt as the apps do. Prompt size is counted in tokens
+(tiktoken cl100k_base, or characters / 4 when its vocabulary cannot be
+loaded).
+
+    python benchmarks/bench_chunking.py --k 4 20 30
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from langchain_community.vectorstores.faiss import FAISS
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from bench_end_to_end import QUESTIONS
+from rag.chains import format_documents
+from rag.chunking import StructuredSplitter
+from rag.fakes import FakeEmbeddings
+from rag.ingest import iter_chunks
+from rag.pdf_extract import extract_pages
+
+# name -> (splitter factory, extraction backend)
+STRATEGIES = {
+    "recursive-10000 (gemini, app2, app3)": (lambda: RecursiveCharacterTextSplitter(chunk_size=10000,
+                                                                                     chunk_overlap=1000), "pypdf"),
+    "recursive-1000 (app1, hf space)": (lambda: RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200),
+                                        "pdfplumber"),
+    "structured (pypdf pages)": (StructuredSplitter, "pypdf"),
+    "structured (layout)": (StructuredSplitter, "layout"),
+}
+
+
+def token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text)), "tiktoken"
+    except Exception:  # not installed, or no network to fetch the vocabulary
+        return lambda text: len(text) // 4, "chars/4"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob(os.path.join(ROOT_DIR, "documents", "*.pdf"))))
+    parser.add_argument("--k", nargs="+", type=int, default=[4, 20, 30], help="chunks stuffed per answer")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    count_tokens, counter = token_counter()
+    embeddings = FakeEmbeddings(args.dimension)
+    print(f"{len(args.pdfs)} PDFs, {len(QUESTIONS)} questions, tokens counted with {counter}")
+    header = f"{'strategy':<38} {'chunks':>6} {'mean ch':>7} {'end-to-end/s':>12} {'split-only/s':>12}"
+    print(header + "".join(f" {f'tok@k={k}':>9}" for k in args.k))
+    for name, (make_splitter, backend) in STRATEGIES.items():
+        pages = extract_pages(args.pdfs, backend=backend)  # warm-up; also reused for split-only timing
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            chunks = list(iter_chunks(extract_pages(args.pdfs, backend=backend), make_splitter()))
+        end_to_end = len(chunks) * args.repeat / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            list(iter_chunks(pages, make_splitter()))
+        split_only = len(chunks) * args.repeat / (time.perf_counter() - start)
+
+        store = FAISS.from_texts([text for text, _ in chunks], embeddings, metadatas=[meta for _, meta in chunks])
+        tokens = []
+        for k in args.k:
+            per_answer = [count_tokens(format_documents(store.similarity_search(question, k=k)))
+                          for question in QUESTIONS]
+            tokens.append(sum(per_answer) / len(per_answer))
+        mean_chars = sum(len(text) for text, _ in chunks) / len(chunks)
+        print(f"{name:<38} {len(chunks):>6} {mean_chars:>7.0f} {end_to_end:>12.1f} {split_only:>12.1f}"
+              + "".join(f" {value:>9.0f}" for value in tokens))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Chunks/sec of the local embedding backends on chunks of the bundled PDFs.
+
+    python benchmarks/bench_embeddings.py --backends torch int8 onnx --batch-sizes 16 64 --threads 1 4
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from rag.embeddings import DEFAULT_MODEL, LocalEmbeddings
+from rag.ingest import iter_chunks
+from rag.pdf_extract import iter_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob(os.path.join(ROOT_DIR, "documents", "*.pdf"))))
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8"], choices=["torch", "int8", "onnx"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[16, 32, 64, 128])
+    parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_size // 5)
+    chunks = [text for text, _ in iter_chunks(iter_pages(args.pdfs, backend="pypdf"), splitter)]
+    print(f"{len(chunks)} chunks of <= {args.chunk_size} chars from {len(args.pdfs)} PDFs")
+
+    print(f"{'backend':<8} {'threads':>7} {'batch':>6} {'best s':>8} {'chunks/s':>9}")
+    for backend in args.backends:
+        for threads in args.threads:
+            model = LocalEmbeddings(args.model, backend=backend, num_threads=threads)
+            for batch_size in args.batch_sizes:
+                model.batch_size = batch_size
+                model.embed_documents(chunks[:batch_size])  # warm-up
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    model.embed_documents(chunks)
+                    timings.append(time.perf_counter() - start)
+                best = min(timings)
+                print(f"{backend:<8} {threads:>7} {batch_size:>6} {best:>8.2f} {len(chunks) / best:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""Offline end-to-end benchmark of the apps' ingestion and question paths.
+
+Drives the code behind groq/app3.py (rag.pinecone_qa), gemini.py and app.py
+(rag.graph_chain) with deterministic stand-ins: every LLM call is answered by
+rag.fakes.FakeChatModel (CHAT_MODEL_PROVIDER=fake), FakeEmbeddings of
+--dimension replace the embedding models, FAISS stands in for Pinecone and
+rag.fakes.InMemoryGraph for Neo4j. The corpus is documents/*.pdf.
+
+Each pipeline runs in a fresh process, so peak RSS is per pipeline and the
+caches start cold. Reported per pipeline: ingestion throughput, query latency
+percentiles for the first pass over the questions (cold) and the repeats
+(warm), time to first token, prompt context tokens (retrieved vs packed),
+per-stage spans and peak RSS. Results are saved
+to benchmarks/results/<commit>.json and compared with the previous commit's.
+
+    python benchmarks/bench_end_to_end.py --rounds 3 --llm-latency 0.2 --tokens-per-second 200
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+sys.path.append(ROOT_DIR)
+
+QUESTIONS = [
+    "What did Stripe say about total payment volume in 2023?",
+    "How did Stripe describe its approach to profitability?",
+    "Which new products did Stripe launch for businesses?",
+    "What does Stripe say about stablecoins and crypto?",
+    "What is the fiscal deficit target in the India budget?",
+    "How much capital expenditure does the India budget allocate to infrastructure?",
+    "What does the India budget propose for income tax?",
+    "Which schemes in the India budget support agriculture and farmers?",
+]
+
+# Metrics compared across commits; True when higher is better.
+TRACKED = {
+    "ingest.chunks_per_sec": True,
+    "query.cold.p50": False,
+    "query.cold.p95": False,
+    "query.warm.p50": False,
+    "query.warm.p95": False,
+    "ttft.p50": False,
+    "context.tokens": False,
+    "peak_rss_mb": False,
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def open_pdfs(paths):
+    """The PDFs as named in-memory uploads, the way Streamlit and server.py hand them over."""
+    uploads = []
+    for path in paths:
+        with open(path, "rb") as f:
+            upload = io.BytesIO(f.read())
+        upload.name = os.path.basename(path)
+        uploads.append(upload)
+    return uploads
+
+
+def stream_answer(chain, inputs):
+    from rag.streaming import StreamStats, answer_stream
+    from rag.tracing import trace_config
+    stats = StreamStats()
+    for _ in answer_stream(chain.stream(inputs, config=trace_config()), stats):
+        pass
+    return stats
+
+
+def app3_pipeline(pdfs, args):
+    """groq/app3.py: section-aware chunks into the vector index, top-20 retrieval, Groq stuff chain."""
+    from rag.chains import format_documents
+    from rag.fakes import FakeEmbeddings
+    from rag.ingest import FaissSink, run_pipeline
+    from rag import pinecone_qa
+
+    embeddings = FakeEmbeddings(args.dimension, latency=args.embedding_latency)
+    sink = FaissSink(embeddings)
+    chunks = run_pipeline(pdfs, pinecone_qa.get_text_splitter(), sink, embeddings=embeddings, backend="layout")
+    contexts = []
+
+    def ask(question):
+        context = pinecone_qa.retrieve_context(question, store=sink.store)
+        contexts.append(context)
+        chain = pinecone_qa.get_conversational_chain()
+        return stream_answer(chain, {"context": format_documents(context.documents), "question": question})
+
+    return {"chunks": chunks, "contexts": contexts}, ask
+
+
+def gemini_pipeline(pdfs, args):
+    """gemini.py: cached ingestion, one upsert of the corpus, then gemini.answer_question per question."""
+    import gemini
+    from rag.cache import cached_ingest
+    from rag.chunking import StructuredSplitter
+    from rag.fakes import FakeEmbeddings
+    from rag.ingest import FaissSink
+    from rag.pinecone_index import namespace_for
+
+    embeddings = FakeEmbeddings(args.dimension, latency=args.embedding_latency)
+    text_chunks, metadatas, vectors, corpus_key = cached_ingest(pdfs, StructuredSplitter(), embeddings, backend="layout")
+    sink = FaissSink(embeddings)  # stands in for the Pinecone namespace
+    sink.upsert(text_chunks, metadatas, [list(vector) for vector in vectors])
+    namespace = namespace_for(corpus_key, "bench")
+    contexts = []
+
+    def ask(question):
+        from rag.streaming import StreamStats
+        _, context, stats = gemini.answer_question(question, sink.store, namespace)
+        if context is not None:
+            contexts.append(context)
+        return stats or StreamStats()  # None for an answer-cache hit
+
+    return {"chunks": len(text_chunks), "contexts": contexts}, ask
+
+
+class LocalBackfill:
+    """EmbeddingBackfill stand-in: notify() embeds the graph's new documents into a FAISS index."""
+
+    def __init__(self, graph, embeddings):
+        from rag.ingest import FaissSink
+        self.graph = graph
+        self.sink = FaissSink(embeddings)
+        self.namespace = "neo4j"
+        self.embedded = 0
+
+    @property
+    def version(self):
+        from rag.retrieval_cache import index_version
+        return index_version(self.namespace)
+
+    def notify(self):
+        from rag.retrieval_cache import bump_version
+        _, texts, metadatas = self.graph.take_pending()
+        if texts:
+            self.sink.upsert(texts, metadatas, self.sink.embeddings.embed_documents(texts))
+            self.embedded += len(texts)
+            bump_version(self.namespace)
+
+
+def graph_splitter():
+    """About graph_chain's 512-token chunks at ~4 characters per token; TokenTextSplitter would download tiktoken."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=2048, chunk_overlap=96)
+
+
+def graph_pipeline(pdfs, args):
+    """app.py: graph extraction into the knowledge graph, then the graph + vector RAG chain."""
+    from langchain_experimental.graph_transformers import LLMGraphTransformer
+
+    from rag.answer_cache import get_answer_cache
+    from rag.cache import upload_key
+    from rag.fakes import FakeEmbeddings, FakeGraphChatModel, InMemoryGraph
+    from rag import graph_chain
+
+    embeddings = FakeEmbeddings(args.dimension, latency=args.embedding_latency)
+    graph = InMemoryGraph()
+    backfill = LocalBackfill(graph, embeddings)
+    transformer = LLMGraphTransformer(llm=FakeGraphChatModel(latency=args.llm_latency))
+    stats = graph_chain.ingest(pdfs, upload_key(pdfs), backfill, writer=graph, llm_transformer=transformer,
+                               text_splitter=graph_splitter())
+    chain = graph_chain.build_chain(backfill.sink.store, backfill, driver=graph.async_driver(args.graph_latency))
+    answer_cache = get_answer_cache(embeddings)
+
+    def ask(question):
+        answer_stats = []
+
+        def compute():
+            answer_stats.append(stream_answer(chain, {"question": question}))
+            return answer_stats[0].text, []
+
+        answer_cache.answer(question, "neo4j", compute, version=backfill.version)
+        return answer_stats[0] if answer_stats else None
+
+    return {"chunks": backfill.embedded, "nodes": stats["nodes"], "relationships": stats["relationships"]}, ask
+
+
+PIPELINES = {"app3": app3_pipeline, "gemini": gemini_pipeline, "graph": graph_pipeline}
+
+
+def run_pipeline_child(name, args):
+    """Ingest, then ask every question `rounds` times; runs inside the child process."""
+    from rag.tracing import get_tracer, summarize, trace
+
+    pdfs = open_pdfs(args.pdfs)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    ingest, ask = PIPELINES[name](pdfs, args)
+    seconds = time.perf_counter() - start
+    contexts = ingest.pop("contexts", [])
+    megabytes = sum(len(pdf.getvalue()) for pdf in pdfs) / (1024 * 1024)
+    ingest.update(seconds=seconds, chunks_per_sec=ingest["chunks"] / seconds, mb_per_sec=megabytes / seconds)
+
+    cold, warm, ttft = [], [], []
+    for round_no in range(args.rounds):
+        for question in QUESTIONS[:args.questions]:
+            with trace("request", app=name) as request_span:
+                stats = ask(question)
+            (cold if round_no == 0 else warm).append(request_span.duration)
+            if stats is not None and stats.ttft is not None:
+                ttft.append(stats.ttft)
+    result = {
+        "ingest": ingest,
+        "query": {"cold": summarize(cold), "warm": summarize(warm)},
+        "ttft": summarize(ttft),
+        "stages": get_tracer().summary(),
+        "import_rss_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if contexts:  # mean prompt context per answered question
+        result["context"] = {"retrieved_tokens": sum(c.retrieved_tokens for c in contexts) / len(contexts),
+                             "tokens": sum(c.tokens for c in contexts) / len(contexts),
+                             "chunks": sum(len(c.documents) for c in contexts) / len(contexts)}
+    return result
+
+
+def child_env(args, cache_dir):
+    env = dict(os.environ)
+    env.update({
+        "CHAT_MODEL_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "RAG_CACHE_DIR": cache_dir,
+        "RAG_DATA_DIR": os.path.join(cache_dir, "data"),
+        "TRACE_FILE": "",
+    })
+    return env
+
+
+def run_isolated(name, args, argv):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), *argv, "--pipeline", name],
+                              env=child_env(args, cache_dir), capture_output=True, text=True, cwd=ROOT_DIR)
+    if proc.returncode:
+        return {"error": (proc.stderr.strip().splitlines() or ["exit code %d" % proc.returncode])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git(*argv):
+    try:
+        return subprocess.run(["git", *argv], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def metric(result, path):
+    for part in path.split("."):
+        if not isinstance(result, dict) or part not in result:
+            return None
+        result = result[part]
+    return result
+
+
+def load_baseline(baseline, current_path):
+    """The results file for `baseline` (a path or commit), else the newest from another commit."""
+    if baseline:
+        path = baseline if os.path.exists(baseline) else os.path.join(RESULTS_DIR, f"{git('rev-parse', baseline)[:12]}.json")
+        with open(path) as f:
+            return json.load(f)
+    runs = []
+    for path in glob.glob(os.path.join(RESULTS_DIR, "*.json")):
+        if os.path.abspath(path) != os.path.abspath(current_path):
+            with open(path) as f:
+                runs.append(json.load(f))
+    return max(runs, key=lambda run: run["timestamp"]) if runs else None
+
+
+def compare(current, baseline, threshold):
+    """Print tracked metrics against the baseline, flagging changes for the worse beyond `threshold`."""
+    print(f"\nvs {baseline['commit'][:12]}{' (dirty)' if baseline.get('dirty') else ''}:")
+    for name, result in current["pipelines"].items():
+        for path, higher_is_better in TRACKED.items():
+            new, old = metric(result, path), metric(baseline["pipelines"].get(name, {}), path)
+            if new is None or not old:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > threshold else ""
+            print(f"  {name:<7} {path:<22} {old:>10.4f} -> {new:>10.4f} {change:>+8.1%}{flag}")
+
+
+def report(name, result):
+    if "skipped" in result or "error" in result:
+        print(f"{name:<7} {'skipped' if 'skipped' in result else 'failed'}: {result.get('skipped') or result['error']}")
+        return
+    ingest, query = result["ingest"], result["query"]
+    print(f"{name:<7} ingest {ingest['chunks']} chunks in {ingest['seconds']:.2f}s "
+          f"({ingest['chunks_per_sec']:.1f} chunks/s, {ingest['mb_per_sec']:.2f} MB/s), "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB")
+    for phase in ("cold", "warm"):
+        stats = query[phase]
+        if stats["count"]:
+            print(f"        {phase:<5} p50 {stats['p50'] * 1000:8.1f} ms  p95 {stats['p95'] * 1000:8.1f} ms  "
+                  f"p99 {stats['p99'] * 1000:8.1f} ms  ({stats['count']} queries)")
+    if result["ttft"]["count"]:
+        print(f"        ttft  p50 {result['ttft']['p50'] * 1000:8.1f} ms")
+    if "context" in result:
+        context = result["context"]
+        print(f"        context {context['tokens']:.0f} tokens in {context['chunks']:.1f} chunks "
+              f"(retrieved {context['retrieved_tokens']:.0f}, saved {context['retrieved_tokens'] - context['tokens']:.0f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob(os.path.join(ROOT_DIR, "documents", "*.pdf"))))
+    parser.add_argument("--pipelines", nargs="+", choices=sorted(PIPELINES), default=sorted(PIPELINES))
+    parser.add_argument("--dimension", type=int, default=384, help="fake embedding dimension")
+    parser.add_argument("--questions", type=int, default=len(QUESTIONS))
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the questions; the first is cold")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="simulated decode rate (0: instant)")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="simulated seconds per embedding call")
+    parser.add_argument("--graph-latency", type=float, default=0.0, help="simulated graph query round trip")
+    parser.add_argument("--baseline", help="results file or commit to compare with (default: the latest other run)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change flagged as a regression")
+    parser.add_argument("--no-save", action="store_true", help="do not write benchmarks/results/<commit>.json")
+    parser.add_argument("--pipeline", choices=sorted(PIPELINES), help=argparse.SUPPRESS)  # child process
+    args = parser.parse_args()
+
+    if args.pipeline:
+        try:
+            result = run_pipeline_child(args.pipeline, args)
+        except ImportError as exc:  # e.g. gemini.py's Google dependencies
+            result = {"skipped": f"{type(exc).__name__}: {exc}"}
+        print(json.dumps(result))
+        return
+
+    argv = [arg for arg in sys.argv[1:] if arg != "--no-save"]
+    print(f"{len(args.pdfs)} PDFs, {args.questions} questions x {args.rounds} rounds, "
+          f"dimension {args.dimension}, LLM latency {args.llm_latency}s")
+    pipelines = {}
+    for name in args.pipelines:
+        pipelines[name] = run_isolated(name, args, argv)
+        report(name, pipelines[name])
+
+    commit = git("rev-parse", "HEAD") or "unknown"
+    dirty = bool(git("status", "--porcelain", "--untracked-files=no"))
+    current = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items()
+                     if key not in ("pipeline", "baseline", "no_save", "threshold")},
+        "pipelines": pipelines,
+    }
+    path = os.path.join(RESULTS_DIR, f"{commit[:12]}{'-dirty' if dirty else ''}.json")
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nSaved {os.path.relpath(path, ROOT_DIR)}")
+    baseline = load_baseline(args.baseline, path)
+    if baseline is not None:
+        compare(current, baseline, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Recall vs latency of the FAISS index types against the flat baseline.
+
+Builds every rag.faiss_index type over the same vectors as
+bench_vector_backends.py: PDF chunks embedded with FakeEmbeddings, padded
+with --vectors synthetic unit vectors. Each is swept over nprobe (IVF) or
+efSearch (HNSW), and IVF-PQ also over the RFlat re-ranking factor. Reported:
+build/training time, index size, single-query p50/p95 latency and recall@k
+against exact search.
+
+    python benchmarks/bench_faiss_index.py --vectors 200000 --nprobe 4 16 64 --ef-search 32 64 128
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import faiss
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from bench_vector_backends import corpus, exact_neighbours
+from rag.faiss_index import INDEX_TYPES, build_index, configure, factory_string
+from rag.tracing import summarize
+
+
+def measure(index, queries, truth, k):
+    index.search(queries[:5], k)  # warm-up
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, rows = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(rows[0].tolist()) & expected)
+    stats = summarize(latencies)
+    return stats["p50"] * 1000, stats["p95"] * 1000, hits / (len(queries) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob(os.path.join(ROOT_DIR, "documents", "*.pdf"))))
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--vectors", type=int, default=100000, help="pad the corpus with synthetic vectors up to N")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[16, 64, 256])
+    parser.add_argument("--refine-k", nargs="+", type=int, default=[1, 4, 10], help="ivfpq: RFlat k_factor")
+    args = parser.parse_args()
+
+    chunks, vectors, queries = corpus(args)
+    truth = exact_neighbours(vectors, queries, args.k)
+    print(f"{len(vectors)} vectors of dimension {args.dimension}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<30} {'setting':<20} {'build s':>8} {'MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7}")
+
+    for kind in args.types:
+        start = time.perf_counter()
+        index = build_index(vectors, kind)
+        build = time.perf_counter() - start
+        size = faiss.serialize_index(index).nbytes / 1e6
+        spec = factory_string(kind, args.dimension, len(vectors))
+        if kind == "ivfpq":
+            settings = [("nprobe", f"{nprobe},k_factor={k_factor}", {"nprobe": nprobe, "k_factor": k_factor})
+                        for nprobe in args.nprobe for k_factor in args.refine_k]
+        elif kind == "ivf":
+            settings = [("nprobe", value, {"nprobe": value}) for value in args.nprobe]
+        elif kind == "hnsw":
+            settings = [("efSearch", value, {"ef_search": value}) for value in args.ef_search]
+        else:
+            settings = [("exact", "", {})]
+        for label, value, params in settings:
+            configure(index, **params)
+            p50, p95, recall = measure(index, queries, truth, args.k)
+            print(f"{spec:<30} {f'{label}={value}' if value else label:<20} {build:>8.2f} {size:>8.1f} "
+                  f"{p50:>8.3f} {p95:>8.3f} {recall:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
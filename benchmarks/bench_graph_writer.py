@@ -0,0 +1,72 @@
+"""Neo4j write throughput: add_graph_documents vs BulkGraphWriter.
+
+Graph documents come from FakeGraphChatModel, so only a Neo4j instance is
+needed (NEO4J_URI / NEO4J_USERNAME / NEO4J_PASSWORD). Use a scratch
+database: the benchmark writes into it. The second bulk write re-ingests the
+same chunks and should be a near-instant no-op.
+
+    python benchmarks/bench_graph_writer.py --batch-size 500 1000 5000
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from langchain_community.graphs import Neo4jGraph
+from langchain_core.documents import Document
+from langchain_experimental.graph_transformers import LLMGraphTransformer
+from langchain_text_splitters import TokenTextSplitter
+
+from rag.fakes import FakeGraphChatModel
+from rag.graph_extract import extract_graph_documents
+from rag.graph_schema import bootstrap
+from rag.graph_writer import BulkGraphWriter
+from rag.ingest import iter_chunks
+from rag.pdf_extract import iter_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob(os.path.join(ROOT_DIR, "documents", "*.pdf"))))
+    parser.add_argument("--batch-size", nargs="+", type=int, default=[1000])
+    parser.add_argument("--skip-baseline", action="store_true", help="don't time add_graph_documents")
+    args = parser.parse_args()
+
+    splitter = TokenTextSplitter(chunk_size=512, chunk_overlap=24)
+    documents = [Document(page_content=text, metadata=metadata)
+                 for text, metadata in iter_chunks(iter_pages(args.pdfs, backend="pypdf"), splitter)]
+    graph_documents = extract_graph_documents(documents, LLMGraphTransformer(llm=FakeGraphChatModel()))
+    # Count Document nodes and MENTIONS edges too, as BulkGraphWriter.stats() does.
+    nodes = sum(len(doc.nodes) + 1 for doc in graph_documents)
+    rels = sum(len(doc.relationships) + len(doc.nodes) for doc in graph_documents)
+    print(f"{len(documents)} chunks, {nodes} nodes, {rels} relationships")
+
+    graph = Neo4jGraph()
+    bootstrap(graph._driver)
+    clear = "MATCH (n) WHERE n:Document OR n:__Entity__ DETACH DELETE n"
+
+    if not args.skip_baseline:
+        graph.query(clear)
+        start = time.perf_counter()
+        graph.add_graph_documents(graph_documents, baseEntityLabel=True, include_source=True)
+        elapsed = time.perf_counter() - start
+        print(f"{'add_graph_documents':<24} {nodes / elapsed:>9.0f} nodes/s {rels / elapsed:>9.0f} rels/s")
+
+    for batch_size in args.batch_size:
+        graph.query(clear)
+        writer = BulkGraphWriter(graph._driver, batch_size=batch_size)
+        writer.write(graph_documents)
+        stats = writer.stats()
+        start = time.perf_counter()
+        writer.write(graph_documents)
+        again = time.perf_counter() - start
+        print(f"{'bulk batch=' + str(batch_size):<24} {stats['nodes_per_sec']:>9.0f} nodes/s "
+              f"{stats['rels_per_sec']:>9.0f} rels/s, re-ingest {again:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
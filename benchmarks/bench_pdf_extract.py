@@ -0,0 +1,42 @@
+"""Pages/sec of rag.pdf_extract on the bundled PDFs, per backend and worker count.
+
+    python benchmarks/bench_pdf_extract.py --workers 1 4 8
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from rag.pdf_extract import BACKENDS, extract_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob(os.path.join(ROOT_DIR, "documents", "*.pdf"))))
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'pdf':<32} {'backend':<11} {'workers':>7} {'pages':>6} {'best s':>8} {'pages/s':>9}")
+    for pdf in args.pdfs:
+        for backend in args.backends:
+            for workers in args.workers:
+                # Warm-up run so pool start-up is not counted against the first sample.
+                extract_pages(pdf, backend=backend, workers=workers)
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    pages = extract_pages(pdf, backend=backend, workers=workers)
+                    timings.append(time.perf_counter() - start)
+                best = min(timings)
+                print(f"{os.path.basename(pdf):<32} {backend:<11} {workers:>7} {len(pages):>6} "
+                      f"{best:>8.2f} {len(pages) / best:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Hosted Pinecone vs the local stand-in (rag.local_index), side by side.
+
+Chunks of the bundled PDFs are embedded with FakeEmbeddings, optionally
+padded with --vectors clustered synthetic unit vectors to reach a realistic index size,
+and written through rag.ingest.PineconeSink to each backend. Reported per
+backend: upsert throughput, query latency p50/p95 and recall@k against exact
+NumPy search. "local-flat" is the brute-force kernel, "local-hnsw" the
+hnswlib graph (needs hnswlib). "pinecone" runs only with --hosted and
+PINECONE_API_KEY, and uses a throwaway namespace that is deleted afterwards.
+
+    python benchmarks/bench_vector_backends.py --vectors 100000 --queries 200 --ef 32 64 128
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from bench_end_to_end import QUESTIONS
+from rag import local_index
+from rag.fakes import FakeEmbeddings
+from rag.ingest import PineconeSink, iter_chunks
+from rag.pdf_extract import iter_pages
+from rag.tracing import summarize
+
+
+def corpus(args):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_size // 5)
+    chunks = [text for text, _ in iter_chunks(iter_pages(args.pdfs, backend="pypdf"), splitter)]
+    embeddings = FakeEmbeddings(args.dimension)
+    vectors = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    if args.vectors > len(chunks):
+        # Clustered like real embeddings (uniform noise has no neighbourhoods for an ANN index to exploit).
+        centres = rng.standard_normal((max(args.vectors // 100, 1), args.dimension)).astype(np.float32)
+        extra = centres[rng.integers(len(centres), size=args.vectors - len(chunks))]
+        extra += rng.normal(0, 0.5, extra.shape).astype(np.float32)
+        vectors = np.vstack([vectors, extra / np.linalg.norm(extra, axis=1, keepdims=True)])
+        chunks = chunks + [f"synthetic {i}" for i in range(len(chunks), args.vectors)]
+    # Questions plus jittered stored vectors, so queries land near real neighbourhoods.
+    queries = np.asarray(embeddings.embed_documents(QUESTIONS), dtype=np.float32)
+    picks = vectors[rng.choice(len(vectors), max(args.queries - len(queries), 0))]
+    queries = np.vstack([queries, picks + rng.normal(0, 0.05, picks.shape).astype(np.float32)])[:args.queries]
+    return chunks, vectors, queries
+
+
+def exact_neighbours(vectors, queries, k):
+    scores = queries / np.linalg.norm(queries, axis=1, keepdims=True) @ vectors.T
+    return [set(np.argpartition(-row, k - 1)[:k]) for row in scores]
+
+
+def load(index, namespace, chunks, vectors, args):
+    sink = PineconeSink(index, id_prefix="bench", namespace=namespace, batch_size=args.batch_size)
+    start = time.perf_counter()
+    for first in range(0, len(chunks), args.batch_size):
+        last = first + args.batch_size
+        sink.upsert(chunks[first:last], [{} for _ in chunks[first:last]], vectors[first:last].tolist())
+    sink.flush()
+    return time.perf_counter() - start
+
+
+def measure(name, index, namespace, queries, truth, args):
+    for query in queries[:5]:  # warm-up
+        index.query(vector=query.tolist(), top_k=args.k, namespace=namespace)
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = index.query(vector=query.tolist(), top_k=args.k, namespace=namespace, include_metadata=False)
+        latencies.append(time.perf_counter() - start)
+        hits += len({int(match["id"].rsplit("-", 1)[1]) for match in result["matches"]} & expected)
+    stats = summarize(latencies)
+    print(f"  {name:<22} p50 {stats['p50'] * 1000:>8.2f} ms  p95 {stats['p95'] * 1000:>8.2f} ms  "
+          f"recall@{args.k} {hits / (len(queries) * args.k):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob(os.path.join(ROOT_DIR, "documents", "*.pdf"))))
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--vectors", type=int, default=50000, help="pad the corpus with synthetic vectors up to N")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--ef", nargs="+", type=int, default=[16, local_index.LOCAL_HNSW_EF, 256],
+                        help="HNSW efSearch values")
+    parser.add_argument("--hosted", action="store_true", help="also benchmark the Pinecone index --index")
+    parser.add_argument("--index", default="bench-vectors")
+    args = parser.parse_args()
+
+    chunks, vectors, queries = corpus(args)
+    truth = exact_neighbours(vectors, queries, args.k)
+    print(f"{len(vectors)} vectors of dimension {args.dimension}, {len(queries)} queries, k={args.k}")
+
+    root = tempfile.mkdtemp(prefix="bench-vectors-")
+    for mode in ("flat", "hnsw"):
+        if mode == "hnsw":
+            try:
+                import hnswlib  # noqa: F401
+            except ImportError:
+                print("local-hnsw: skipped (pip install hnswlib)")
+                continue
+        local_index.LOCAL_HNSW_MIN = 0 if mode == "flat" else 1
+        index = local_index.LocalIndex(f"bench-{mode}", args.dimension, root=root)
+        seconds = load(index, "bench", chunks, vectors, args)
+        print(f"local-{mode}: upsert {len(chunks) / seconds:,.0f} vectors/s")
+        if mode == "flat":
+            measure("exact", index, "bench", queries, truth, args)
+            continue
+        start = time.perf_counter()
+        graph = index._namespaces["bench"]._index()  # built lazily on the first query otherwise
+        print(f"  HNSW build {time.perf_counter() - start:.2f} s")
+        for ef in args.ef:
+            graph.set_ef(max(ef, args.k))
+            measure(f"efSearch={ef}", index, "bench", queries, truth, args)
+
+    if args.hosted:
+        if not os.getenv("PINECONE_API_KEY"):
+            print("pinecone: skipped (PINECONE_API_KEY is not set)")
+            return
+        from rag import pinecone_index
+        pinecone_index.VECTOR_BACKEND = "pinecone"
+        index = pinecone_index.ensure_index(args.index, dimension=args.dimension)
+        namespace = f"bench-{uuid.uuid4().hex[:8]}"
+        try:
+            seconds = load(index, namespace, chunks, vectors, args)
+            pinecone_index.wait_for_namespace(index, namespace, len(chunks))
+            print(f"pinecone: upsert {len(chunks) / seconds:,.0f} vectors/s")
+            measure("serverless", index, namespace, queries, truth, args)
+        finally:
+            pinecone_index.delete_namespace(index, namespace)
+
+
+if __name__ == "__main__":
+    main()
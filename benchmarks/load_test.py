@@ -0,0 +1,340 @@
+"""Concurrent load generator for the question path.
+
+Each of N virtual users loops: pick a corpus by the --mix weights and a
+question, send it, wait a think time (exponentially distributed around
+--think-time), repeat until --duration is up. Every level in --users runs in
+turn against:
+
+- --url http://host:8000: a running server.py, over POST /query/stream, so
+  time to first token is measured at the client. 429/503 responses and
+  refused connections count as throttled.
+- by default, server.py's app in-process (POST /query over httpx's ASGI
+  transport) with offline corpora built as in bench_end_to_end.py: fake chat
+  models and embeddings, FAISS for Pinecone and an in-memory graph for Neo4j.
+
+Corpora: "faiss" (groq/app1.py), "pinecone" (groq/app3.py), "graph" (app.py).
+Per level: sustained QPS, latency and TTFT percentiles, error and throttle
+rates, and where requests queue: waiting for a server query slot
+(query_queue), client latency outside the server's answer timing (slot wait
+plus transport), and how each stage's mean latency moves from the first level.
+
+    python benchmarks/load_test.py --users 1 8 32 --duration 20 --think-time 0.5 --llm-latency 0.3
+    python benchmarks/load_test.py --url http://localhost:8000 --mix pinecone=3,graph=1
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from bench_end_to_end import QUESTIONS, LocalBackfill, graph_splitter, open_pdfs
+
+THROTTLED = (429, 503)
+METRIC_LINE = re.compile(r'^rag_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+
+
+class Outcome:
+    def __init__(self, corpus, start):
+        self.corpus = corpus
+        self.start = start
+        self.latency = None
+        self.ttft = None
+        self.server_total = None
+        self.status = "ok"  # ok | error | throttled
+        self.error = None
+
+    def fail(self, status, error):
+        self.status = status
+        self.error = error
+        return self
+
+
+class OfflineFaissCorpus:
+    """groq/app1.py's retrieval chain over a FAISS index of the PDFs."""
+    answer_key = "answer"
+
+    def __init__(self, pdfs, embeddings, args):
+        from rag import faiss_qa
+        from rag.ingest import FaissSink, run_pipeline
+        sink = FaissSink(embeddings)
+        run_pipeline(pdfs, faiss_qa.get_text_splitter(), sink, embeddings=embeddings, backend="layout")
+        self.store = sink.store
+
+    async def prepare(self, request):
+        from rag.faiss_qa import get_chain
+        return get_chain(self.store, "offline-faiss"), {"input": request.question}, []
+
+
+class OfflinePineconeCorpus:
+    """groq/app3.py's top-20 retrieval and stuff chain, FAISS standing in for Pinecone."""
+    answer_key = None
+
+    def __init__(self, pdfs, embeddings, args):
+        from rag import pinecone_qa
+        from rag.ingest import FaissSink, run_pipeline
+        sink = FaissSink(embeddings)
+        run_pipeline(pdfs, pinecone_qa.get_text_splitter(), sink, embeddings=embeddings, backend="layout")
+        self.store = sink.store
+
+    async def prepare(self, request):
+        from rag.chains import format_documents
+        from rag.pinecone_qa import get_conversational_chain, retrieve
+        docs = await asyncio.to_thread(retrieve, request.question, store=self.store)
+        return get_conversational_chain(), {"context": format_documents(docs), "question": request.question}, docs
+
+
+class OfflineGraphCorpus:
+    """app.py's graph + vector chain over an in-memory knowledge graph."""
+    answer_key = None
+
+    def __init__(self, pdfs, embeddings, args):
+        from langchain_experimental.graph_transformers import LLMGraphTransformer
+
+        from rag import graph_chain
+        from rag.cache import upload_key
+        from rag.fakes import FakeGraphChatModel, InMemoryGraph
+        graph = InMemoryGraph()
+        backfill = LocalBackfill(graph, embeddings)
+        transformer = LLMGraphTransformer(llm=FakeGraphChatModel(latency=args.llm_latency))
+        graph_chain.ingest(pdfs, upload_key(pdfs), backfill, writer=graph, llm_transformer=transformer,
+                           text_splitter=graph_splitter())
+        self.chain = graph_chain.build_chain(backfill.sink.store, backfill, driver=graph.async_driver(args.graph_latency))
+
+    async def prepare(self, request):
+        inputs = {"question": request.question}
+        if request.chat_history:
+            inputs["chat_history"] = request.chat_history
+        return self.chain, inputs, []
+
+
+OFFLINE_CORPORA = {"faiss": OfflineFaissCorpus, "pinecone": OfflinePineconeCorpus, "graph": OfflineGraphCorpus}
+
+
+def offline_client(args, names):
+    """An httpx client bound to server.py's app with offline corpora registered."""
+    import httpx
+
+    # Read by rag.chains / rag.cache / rag.tracing at import time.
+    os.environ.update({
+        "CHAT_MODEL_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "RAG_CACHE_DIR": tempfile.mkdtemp(prefix="rag-load-"),
+        "RAG_DATA_DIR": tempfile.mkdtemp(prefix="rag-load-data-"),
+        "TRACE_FILE": "",
+    })
+    import server
+    from rag.fakes import FakeEmbeddings
+
+    pdfs = open_pdfs(args.pdfs)
+    embeddings = FakeEmbeddings(args.dimension, latency=args.embedding_latency)
+    for name in names:
+        start = time.perf_counter()
+        server.corpora[name] = OFFLINE_CORPORA[name](pdfs, embeddings, args)
+        print(f"offline corpus {name!r} ready in {time.perf_counter() - start:.1f}s")
+    server.query_slots = asyncio.Semaphore(args.max_concurrency)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://offline",
+                             timeout=args.timeout)
+
+
+async def send_json(client, corpus, question):
+    """POST /query; TTFT and total come from the server's timings."""
+    import httpx
+    outcome = Outcome(corpus, time.perf_counter())
+    try:
+        response = await client.post("/query", json={"question": question, "corpus": corpus})
+    except httpx.HTTPError as exc:
+        return outcome.fail("error", type(exc).__name__)
+    outcome.latency = time.perf_counter() - outcome.start
+    if response.status_code in THROTTLED:
+        return outcome.fail("throttled", str(response.status_code))
+    if response.status_code != 200:
+        return outcome.fail("error", str(response.status_code))
+    body = response.json()
+    outcome.ttft, outcome.server_total = body.get("ttft"), body.get("total")
+    return outcome
+
+
+async def send_stream(client, corpus, question):
+    """POST /query/stream; TTFT is the first token event as seen by the client."""
+    import httpx
+    outcome = Outcome(corpus, time.perf_counter())
+    event = None
+    try:
+        async with client.stream("POST", "/query/stream", json={"question": question, "corpus": corpus}) as response:
+            if response.status_code in THROTTLED:
+                return outcome.fail("throttled", str(response.status_code))
+            if response.status_code != 200:
+                return outcome.fail("error", str(response.status_code))
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    if event == "token" and outcome.ttft is None:
+                        outcome.ttft = time.perf_counter() - outcome.start
+                    elif event == "error":
+                        outcome.fail("error", json.loads(line[5:]).get("error", "error"))
+                    elif event == "end":
+                        outcome.server_total = json.loads(line[5:]).get("total")
+    except httpx.ConnectError:
+        return outcome.fail("throttled", "connection refused")
+    except httpx.HTTPError as exc:
+        return outcome.fail("error", type(exc).__name__)
+    outcome.latency = time.perf_counter() - outcome.start
+    return outcome
+
+
+async def stage_totals(client):
+    """Lifetime (sum, count) per stage from the server's /metrics."""
+    totals = defaultdict(lambda: [0.0, 0])
+    try:
+        response = await client.get("/metrics")
+    except Exception:
+        return totals
+    for line in response.text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            totals[stage][0 if kind == "sum" else 1] = float(value)
+    return totals
+
+
+def stage_means(before, after):
+    means = {}
+    for stage, (total, count) in after.items():
+        done = count - before.get(stage, (0.0, 0))[1]
+        if done > 0:
+            means[stage] = (total - before.get(stage, (0.0, 0))[0]) / done
+    return means
+
+
+async def virtual_user(index, client, send, args, mix, questions, deadline, outcomes):
+    rng = random.Random(args.seed + index)
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        outcomes.append(await send(client, rng.choices(names, weights)[0], rng.choice(questions)))
+        if args.think_time:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+
+async def run_level(client, send, users, args, mix, questions):
+    outcomes = []
+    before = await stage_totals(client)
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*[virtual_user(i, client, send, args, mix, questions, deadline, outcomes)
+                           for i in range(users)])
+    elapsed = time.perf_counter() - start
+    return outcomes, elapsed, stage_means(before, await stage_totals(client))
+
+
+def level_report(users, outcomes, elapsed, stages, baseline_stages):
+    from rag.tracing import summarize
+
+    ok = [o for o in outcomes if o.status == "ok"]
+    counts = Counter(o.status for o in outcomes)
+    total = len(outcomes) or 1
+    latency = summarize([o.latency for o in ok])
+    ttft = summarize([o.ttft for o in ok if o.ttft is not None])
+    outside = summarize([o.latency - o.server_total for o in ok if o.server_total is not None])
+    report = {
+        "users": users, "requests": len(outcomes), "seconds": elapsed, "qps": len(ok) / elapsed,
+        "error_rate": counts["error"] / total, "throttle_rate": counts["throttled"] / total,
+        "errors": dict(Counter(o.error for o in outcomes if o.status == "error")),
+        "latency": latency, "ttft": ttft, "outside_server": outside,
+        "per_corpus": {name: summarize([o.latency for o in ok if o.corpus == name])
+                       for name in sorted({o.corpus for o in ok})},
+        "stages": stages,
+    }
+
+    print(f"\n{users} users: {len(outcomes)} requests in {elapsed:.1f}s, {report['qps']:.2f} QPS sustained, "
+          f"{report['error_rate']:.1%} errors, {report['throttle_rate']:.1%} throttled")
+    for label, stats in (("latency", latency), ("ttft", ttft), ("outside server", outside)):
+        if stats["count"]:
+            print(f"  {label:<15} p50 {stats['p50'] * 1000:9.1f} ms  p95 {stats['p95'] * 1000:9.1f} ms  "
+                  f"p99 {stats['p99'] * 1000:9.1f} ms")
+    for name, stats in report["per_corpus"].items():
+        print(f"  {name:<15} p50 {stats['p50'] * 1000:9.1f} ms  p95 {stats['p95'] * 1000:9.1f} ms  "
+              f"({stats['count']} ok)")
+    if report["errors"]:
+        print(f"  errors: {report['errors']}")
+    if stages:
+        # A stage whose mean grows with concurrency is where requests wait on a shared resource.
+        print("  stage means (change from first level):")
+        for stage, mean in sorted(stages.items(), key=lambda item: -item[1]):
+            base = baseline_stages.get(stage)
+            growth = f"{(mean - base) * 1000:+9.1f} ms" if base is not None else ""
+            print(f"    {stage:<18} {mean * 1000:9.1f} ms  {growth}")
+    return report
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def run(args):
+    import httpx
+
+    mix = parse_mix(args.mix)
+    questions = QUESTIONS
+    if args.questions_file:
+        with open(args.questions_file) as f:
+            questions = [line.strip() for line in f if line.strip()]
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=None, max_keepalive_connections=None))
+        send = send_stream
+    else:
+        client = offline_client(args, list(mix))
+        send = send_json
+
+    reports = []
+    async with client:
+        for users in args.users:
+            outcomes, elapsed, stages = await run_level(client, send, users, args, mix, questions)
+            reports.append(level_report(users, outcomes, elapsed, stages, reports[0]["stages"] if reports else {}))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server.py (default: in-process, offline)")
+    parser.add_argument("--users", nargs="+", type=int, default=[1, 8, 32], help="concurrency levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between a user's questions")
+    parser.add_argument("--mix", default="faiss=1,pinecone=1,graph=1", help="corpus=weight,...")
+    parser.add_argument("--questions-file", help="one question per line (default: bench_end_to_end.QUESTIONS)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the per-level report here")
+    offline = parser.add_argument_group("offline (in-process) target")
+    offline.add_argument("--pdfs", nargs="+", default=sorted(glob.glob(os.path.join(ROOT_DIR, "documents", "*.pdf"))))
+    offline.add_argument("--max-concurrency", type=int, default=32, help="server query slots (SERVICE_MAX_CONCURRENCY)")
+    offline.add_argument("--dimension", type=int, default=384, help="fake embedding dimension")
+    offline.add_argument("--llm-latency", type=float, default=0.0, help="simulated seconds to first token")
+    offline.add_argument("--tokens-per-second", type=float, default=0.0, help="simulated decode rate (0: instant)")
+    offline.add_argument("--embedding-latency", type=float, default=0.0, help="simulated seconds per embedding call")
+    offline.add_argument("--graph-latency", type=float, default=0.0, help="simulated graph query round trip")
+    args = parser.parse_args()
+
+    reports = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
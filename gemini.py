@@ -31,6 +31,19 @@ import streamlit as st
 from PyPDF2 import PdfReader
 from dotenv import load_dotenv
 import time
+import uuid
+
+from rag.cache import cached_ingest, cache_key, get_default_cache
+from rag.chunking import StructuredSplitter
+from rag.context import pack_context
+from rag.ingest import PineconeSink
+from rag.pinecone_index import (get_index, namespace_count, namespace_for, open_vector_store,
+                                 vector_store_from_texts, wait_for_namespace)
+from rag.answer_cache import get_answer_cache
+from rag.chains import format_documents, get_stuff_answer_chain
+from rag.retrieval_cache import cached_similarity_search, index_version
+from rag.streaming import StreamStats, answer_stream, write_answer
+from rag.tracing import trace, trace_config
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
@@ -42,19 +55,6 @@ neo4j_pass = os.getenv('NEO4J_PASSWORD')
 
 
 
-# Read the documents 
-
-def get_pdf_text(pdf_docs):
-    text = ""
-    for pdf_doc in pdf_docs:  # Iterate over each PDF in the list
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            pdf_data = pdf_doc.read()
-            temp_file.write(pdf_data)
-            pdf_reader = PdfReader(temp_file.name)
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-    return text
-
 # Divide the docs into chunks
 def get_text_chunks(text,chunk_size=10000,chunk_overlap=1000):
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
@@ -62,18 +62,34 @@ def get_text_chunks(text,chunk_size=10000,chunk_overlap=1000):
     return chunks
 
 
-def get_vector_store(text_chunks, embeddings='google'):
+def get_vector_store(text_chunks, embeddings='google', vectors=None, metadatas=None, corpus_key=None, user=None):
     index_name = "langchain-vector"
     if embeddings=='google':
         embeddings =GoogleGenerativeAIEmbeddings(model = 'models/embedding-001')
-        vector_store = PineconeVectorStore.from_texts(text_chunks, embeddings, index_name=index_name)
+        if vectors is None:
+            vector_store = vector_store_from_texts(text_chunks, embeddings, index_name)
+        else:
+            # Embeddings come from the ingestion cache; upsert them directly into the corpus'
+            # own namespace, in parallel batches, so the same upload is written to Pinecone only once.
+            namespace = namespace_for(corpus_key, user)
+            cache = get_default_cache()
+            marker = cache_key(index_name, namespace)
+            index = get_index(index_name)
+            stored = cache.get(marker)
+            # The marker is only trusted while the namespace still holds what was written (the index may be wiped).
+            if stored is None or namespace_count(index, namespace) < stored["upserted"]:
+                sink = PineconeSink(index, id_prefix=corpus_key, namespace=namespace)
+                sink.upsert(text_chunks, metadatas or [{}] * len(text_chunks), vectors)
+                sink.flush()
+                wait_for_namespace(sink.index, namespace, sink.count)
+                cache.put(marker, {"upserted": sink.count})
+            vector_store = open_vector_store(index_name, embeddings, namespace=namespace)
     elif embeddings=='openai':
         embeddings = OpenAIEmbeddings(api_key=os.environ['OPENAI_API_KEY'])
         vector_store = PineconeVectorStore.from_documents(text_chunks, embeddings, index_name=index_name)
     return vector_store
 
-def get_conversational_chain():
-    prompt_template = """
+QA_PROMPT_TEMPLATE = """
     Answer the question as detailed as possible from the provided context, make sure to provide all the details, if the answer is not in
     provided context just say, "answer is not available in the context", don't provide the wrong answer\n\n
     Context:\n {context}?\n
@@ -81,47 +97,91 @@ def get_conversational_chain():
 
     Answer:
     """
+
+
+def get_conversational_chain():
     # model = genai.GenerativeModel('gemini-pro')
-    model = ChatGoogleGenerativeAI(model='gemini-pro', temperature=0.5)
-    prompt = PromptTemplate(template=prompt_template, input_variables=['context','question'])
-    print("Here is the prompt : ", prompt)
-    chain = load_qa_chain(model, chain_type='stuff',prompt=prompt)
-    print("Here is the chain : ", chain)
-    print("Here is the type of the chain ", type(chain))
-    return chain
-
-
-def user_input(user_question,text_chunks):
-    db = get_vector_store(text_chunks)
-    docs = db.similarity_search(user_question, k=30)
+    # Built once per process; later questions reuse the chain and the model's HTTP client.
+    # Same prompt and stuffing as load_qa_chain, but as a runnable so the answer can be streamed.
+    return get_stuff_answer_chain(QA_PROMPT_TEMPLATE, "google", "gemini-pro", temperature=0.5)
+
+
+def answer_question(user_question, db, namespace, write=None):
+    """
+    The question path without Streamlit: (answer, context, stats) for
+    `user_question` over the `namespace` store `db`. `context` and `stats`
+    are None for an answer-cache hit, and the answer is None when nothing
+    was retrieved. `write` consumes the streamed answer tokens.
+    """
+    answer_cache = get_answer_cache(db.embeddings)
+    # Answers are cached per Pinecone namespace and dropped only when that namespace is written to.
+    version = index_version(namespace)
+    cached = answer_cache.lookup(user_question, namespace, version=version)
+    if cached:
+        return cached[0], None, None
+
+    # Cached per Pinecone namespace; any upsert or delete there invalidates the results.
+    docs = cached_similarity_search(db, user_question, k=30, namespace=namespace, version=version)
+    # Dedupe the 30 hits and keep only what fits gemini-pro's context budget.
+    context = pack_context(docs, "gemini-pro", question=user_question, embeddings=db.embeddings)
+    docs = context.documents
     # Filter documents based on a minimum similarity score
     # filtered_docs = [doc for doc in docs if doc['score'] > 0.4]  # Adjust threshold as needed
-
-    if docs:
-        chain = get_conversational_chain()
-        response = chain(
-            {'input_documents': docs, 'question': user_question},
-            return_only_outputs=True
-        )
-        print(response)
-        st.write("Reply: ", response['output_text'])
+    if not docs:
+        return None, context, None
+
+    chain = get_conversational_chain()
+    stats = StreamStats()
+    tokens = answer_stream(chain.stream({'context': format_documents(docs), 'question': user_question},
+                                        config=trace_config()), stats)
+    if write is None:
+        for _ in tokens:
+            pass
     else:
+        write(tokens)
+    answer_cache.store(user_question, stats.text, docs, namespace, version=version)
+    return stats.text, context, stats
+
+
+def user_input(user_question,db):
+    def write(tokens):
+        st.write("Reply: ")
+        write_answer(tokens)
+
+    answer, context, stats = answer_question(user_question, db, st.session_state.namespace, write)
+    if answer is None:
         st.warning("No relevant documents found for your question.")
+    elif stats is None:
+        st.write("Reply: ", answer)
+    else:
+        st.caption(stats.summary())
+        st.caption(context.summary())
 
 def main():
     st.set_page_config("Chat With Multiple PDFs")
     st.header("Chat with multiple PDFs using Gemini")
 
     uploaded_pdfs = st.sidebar.file_uploader("Upload your PDF files", accept_multiple_files=True)  # Allow multiple files
+    # Namespaces are per session, so sessions uploading the same PDFs do not share (or delete) each other's vectors.
+    user_id = st.session_state.setdefault("user_id", uuid.uuid4().hex)
 
-    if uploaded_pdfs is not None:  # Check if any PDFs are uploaded
+    if uploaded_pdfs:  # file_uploader returns [] when nothing is uploaded
         with st.spinner("Processing..."):
-            raw_text = get_pdf_text(uploaded_pdfs)  # Pass the list of PDFs
-            text_chunks = get_text_chunks(raw_text)
+            # Section-sized chunks from the PDF layout instead of blind 10k-char slices.
+            text_splitter = StructuredSplitter()
+            embeddings = GoogleGenerativeAIEmbeddings(model='models/embedding-001')
+            text_chunks, metadatas, vectors, corpus_key = cached_ingest(uploaded_pdfs, text_splitter, embeddings,
+                                                                        backend="layout")
+            if st.session_state.get("corpus_key") != corpus_key:
+                st.session_state.vector_store = get_vector_store(text_chunks, vectors=vectors, metadatas=metadatas,
+                                                                 corpus_key=corpus_key, user=user_id)
+                st.session_state.namespace = namespace_for(corpus_key, user_id)
+                st.session_state.corpus_key = corpus_key
 
             user_question = st.text_input("Ask a Quesiton from the uploaded PDFs")
             if user_question:
-                user_input(user_question, text_chunks)
+                with trace("request", app="gemini"):
+                    user_input(user_question, st.session_state.vector_store)
             else:
                 st.warning("Please enter a question about the uploaded PDFs.")
     else:
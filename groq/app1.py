@@ -8,7 +8,6 @@ from langchain_community.document_loaders import WebBaseLoader
 # from langchain.document_loaders.web import WebLoader
 from langchain_community.document_loaders.url_selenium import SeleniumURLLoader
 
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
@@ -18,13 +17,23 @@ from langchain.chains import create_retrieval_chain
 # Other
 import streamlit as st
 import os
+import sys
 import time
+import uuid
 from PyPDF2 import PdfReader
 import tempfile
 import pdfplumber
 from dotenv import load_dotenv
 load_dotenv()
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.embeddings import get_embeddings, warm_up
+from rag.faiss_store import ingest_uploads
+from rag.answer_cache import get_answer_cache
+from rag.faiss_qa import EMBEDDING_MODEL, get_chain, get_corpus, get_text_splitter
+from rag.streaming import StreamStats, answer_stream, write_answer
+from rag.tracing import trace, trace_config
+
 groq_api_key = os.getenv('GROQ_API_KEY')
 
 
@@ -34,20 +43,11 @@ option = None
 # Prompt user to choose between PDFs or website
 option = st.radio("Choose input type:", ("PDF(s)", "Website"), index=None)
 
-def get_pdf_processed(pdf_docs):
-    text = ""
-    for pdf in pdf_docs:
-        with pdfplumber.open(pdf) as pdf_file:
-            for page in pdf_file.pages:
-                text += page.extract_text()
-    return text
-
-
+model_name = EMBEDDING_MODEL
+warm_up(EMBEDDING_MODEL)
+st.session_state.embeddings = get_embeddings(EMBEDDING_MODEL)
 
-model_name = "all-MiniLM-L6-v2"
-st.session_state.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-st.session_state.text_splitter = RecursiveCharacterTextSplitter(chunk_size =1000, chunk_overlap= 200)
+st.session_state.text_splitter = get_text_splitter()
 
  
 if option:
@@ -64,43 +64,71 @@ if option:
                 print(st.session_state.docs)
                 st.session_state.final_documents = st.session_state.text_splitter.split_documents(st.session_state.docs)
                 st.session_state.vector = FAISS.from_documents(st.session_state.final_documents,st.session_state.embeddings)            
+                # This store is private to the session, so it gets a namespace of its own in the caches.
+                st.session_state.vector_namespace = f"web:{website_link}:{uuid.uuid4().hex}"
+                st.session_state.vector_version = None
             st.success("Done!")
             
     elif option == "PDF(s)":
+        corpus = st.text_input("Corpus name", value="default")
+        # Loaded once per process (mmap) and shared by every session.
+        try:
+            faiss_store = get_corpus(corpus)
+        except ValueError as exc:  # names are restricted to [A-Za-z0-9_-]
+            st.error(str(exc))
+            st.stop()
         pdf_files = st.file_uploader("Upload your PDF files", type=["pdf"], accept_multiple_files=True)
         if pdf_files:
             with st.spinner("Loading pdf..."):
-                st.session_state.docs = get_pdf_processed(pdf_files)
-                st.session_state.final_documents = st.session_state.text_splitter.split_text(st.session_state.docs)
-                st.session_state.vector = FAISS.from_texts(st.session_state.final_documents,st.session_state.embeddings)            
+                ingest_uploads(faiss_store, pdf_files, st.session_state.text_splitter, backend="layout")
             st.success("Done!")
 
+        if faiss_store.sources:
+            with st.sidebar:
+                names = {source_id: source["name"] for source_id, source in faiss_store.sources.items()}
+                source_id = st.selectbox("Documents in this corpus", list(names), format_func=names.get)
+                if st.button("Remove document"):
+                    faiss_store.delete_source(source_id)
+                    faiss_store.save()
+        st.session_state.vector = faiss_store.store
+        st.session_state.vector_namespace = faiss_store.path
+        st.session_state.vector_version = lambda: faiss_store.version
+
 
 def llm_model():
 
-    llm = ChatGroq(model="mixtral-8x7b-32768",groq_api_key=groq_api_key)
     # llm = ChatGroq(model="mixtral-8x7b-32768")
-    prompt = ChatPromptTemplate.from_template(
-    """
-    Answer the question based on the provided context only.
-    Please provide the most accurate response based on the question
-    <context>
-    {context}
-    </context>
-    Questions:{input}
-    """
-    )
-    document_chain = create_stuff_documents_chain(llm,prompt)
-    retriever = st.session_state.vector.as_retriever() if st.session_state.vector else None
-    retrieval_chain = create_retrieval_chain(retriever,document_chain)
+    # Repeated questions against an unchanged index skip both the query embedding and the search.
+    # The chain is built once per store/namespace; the Groq client and prompt are shared across questions.
+    retrieval_chain = get_chain(st.session_state.vector, st.session_state.vector_namespace,
+                                st.session_state.vector_version)
 
     prompt = st.text_input("Input your question here")
 
     if prompt:
-        start = time.process_time()
-        response = retrieval_chain.invoke({"input":prompt})
-        st.write(response['answer'])
-        st.write("Response time: ", time.process_time() - start)
+        # Wall-clock spans per stage; see admin.py for percentiles.
+        with trace("request", app="app1") as request_span:
+            stats = StreamStats()
+
+            def ask():
+                # Tokens are rendered as they arrive; the joined answer is what gets cached.
+                chunks = retrieval_chain.stream({"input":prompt}, config=trace_config())
+                write_answer(answer_stream(chunks, stats, key="answer"))
+                return stats.text, stats.context
+
+            # Near-duplicate questions against the same corpus version are answered without the LLM.
+            version = st.session_state.vector_version() if st.session_state.vector_version else None
+            answer, sources, cached = get_answer_cache(st.session_state.embeddings).answer(
+                prompt, st.session_state.vector_namespace, ask, version=version)
+            if cached:
+                st.write(answer)
+                st.caption("Answered from cache")
+            else:
+                st.caption(stats.summary())
+        stats = get_answer_cache(st.session_state.embeddings).stats()
+        st.sidebar.caption(f"Answer cache: {stats['hits']} hits / {stats['misses']} misses "
+                           f"({stats['hit_rate']:.0%} hit rate)")
+        st.write("Response time: ", request_span.duration)
 
 
 if option:
@@ -2,7 +2,6 @@ import streamlit as st
 import os
 from langchain_groq import ChatGroq 
 from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
@@ -11,18 +10,29 @@ from langchain.chains import create_retrieval_chain
 from langchain_pinecone import PineconeVectorStore
 import pinecone
 from langchain.vectorstores import Pinecone as LangchainPinecone
-from pinecone import Pinecone, ServerlessSpec
 
 
 import time
+import uuid
 from PyPDF2 import PdfReader
 import tempfile
 from dotenv import load_dotenv
 load_dotenv()
 import psutil
 import os
+import sys
 import pdfplumber
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.cache import upload_key
+from rag.chunking import StructuredSplitter
+from rag.chains import get_retrieval_chain
+from rag.streaming import StreamStats, answer_stream, write_answer
+from rag.tracing import trace, trace_config
+from rag.embeddings import get_embeddings, warm_up
+from rag.ingest import PineconeSink, run_pipeline
+from rag.pinecone_index import delete_namespace, ensure_index, namespace_for, open_vector_store, wait_for_namespace
+
 ## Load the API keys
 groq_api_key = os.getenv('GROQ_API_KEY')
 pinecone_api_key = os.getenv('PINECONE_API_KEY')
@@ -38,42 +48,38 @@ pinecone_api_key = os.getenv('PINECONE_API_KEY')
 
 # Prompt user to choose between PDFs or website
 # option = st.radio("Choose input type:", ("PDF(s)", "Website"), index=None)
-# Create an instance of the Pinecone class
-pinecone = Pinecone(api_key=pinecone_api_key)
 index_name = "myindex"
 
 
 st.title("Ask questions from your PDF(s) or website")
 model_name = "all-MiniLM-L6-v2"
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+warm_up("all-MiniLM-L6-v2")
+embeddings = get_embeddings("all-MiniLM-L6-v2")
 
-text_splitter = RecursiveCharacterTextSplitter(chunk_size =10000, chunk_overlap= 1000)
+text_splitter = StructuredSplitter()
 
 
 if "vector" not in st.session_state:
     st.session_state.vector = None
+# Namespaces are per session, so one user's "Clear my documents" never deletes another's upload of the same PDFs.
+user_id = st.session_state.setdefault("user_id", uuid.uuid4().hex)
 
-clear_index = st.checkbox("Clear existing index")
+# Long-lived index: created once if missing, then shared; each upload writes to its own namespace.
+index = ensure_index(index_name, dimension=384)  # Adjust the dimension based on your embedding model
 
-if clear_index:
-    # Delete the existing index
-    pinecone.delete_index(index_name)
-    st.success("Index cleared!")
+clear_index = st.button("Clear my documents")
 
-def get_pdf_processed(pdf_docs):
-    text = ""
-    for pdf in pdf_docs:
-        with pdfplumber.open(pdf) as pdf_file:
-            for page in pdf_file.pages:
-                text += page.extract_text()
-    return text
+if clear_index and st.session_state.get("namespace"):
+    # Only this session's namespace; the index and other users' documents stay.
+    delete_namespace(index, st.session_state.namespace)
+    st.session_state.vector = None
+    st.session_state.pop("namespace", None)
+    st.session_state.pop("vector_namespace", None)
+    st.session_state.pop("corpus_key", None)  # so uploading the same PDFs again re-ingests them
+    st.success("Documents cleared!")
 
 
-def llm_model(input_text):
-    # llm = ChatGroq(model="mixtral-8x7b-32768",groq_api_key=st.secrets['GROQ_API_KEY'])
-    llm = ChatGroq(model="mixtral-8x7b-32768",groq_api_key=groq_api_key)
-    prompt = ChatPromptTemplate.from_template(
-    """
+PROMPT_TEMPLATE = """
     Answer the question based on the provided context.
     Please provide the most accurate response based on the question
     <context>
@@ -81,46 +87,43 @@ def llm_model(input_text):
     </context>
     Questions:{input}
     """
-    )
-    document_chain = create_stuff_documents_chain(llm,prompt)
-    retriever = st.session_state.vector.as_retriever() if st.session_state.vector else None
-    retrieval_chain = create_retrieval_chain(retriever,document_chain)
-    start = time.process_time()
-    response = retrieval_chain.invoke({"input":input_text})
-    st.write(response['answer'])
-    st.write("Response time: ", time.process_time() - start)
+
+
+def llm_model(input_text):
+    # llm = ChatGroq(model="mixtral-8x7b-32768",groq_api_key=st.secrets['GROQ_API_KEY'])
+    # One chain per index namespace, built once; the Groq client and prompt are shared across questions.
+    vector = st.session_state.vector
+    namespace = st.session_state.get("namespace") if vector else None
+    retrieval_chain = get_retrieval_chain(vector.as_retriever() if vector else None, (index_name, namespace),
+                                          PROMPT_TEMPLATE, "groq", "mixtral-8x7b-32768", groq_api_key=groq_api_key)
+    with trace("request", app="app2") as request_span:
+        stats = StreamStats()
+        write_answer(answer_stream(retrieval_chain.stream({"input":input_text}, config=trace_config()), stats,
+                                   key="answer"))
+    st.caption(stats.summary())
+    st.write("Response time: ", request_span.duration)
 
 # st.session_state.embeddings =GoogleGenerativeAIEmbeddings(model = 'models/embedding-001',google_api_key=st.secrets['GOOGLE_API_KEY'])
 
 # vector = PineconeVectorStore(index_name=index_name, embedding=embeddings)
-# Check if the index exists, and create it if it doesn't
-if index_name not in pinecone.list_indexes().names():
-    pinecone.create_index(
-        name=index_name,
-        dimension=384,  # Adjust the dimension based on your embedding model
-        metric='cosine',
-        spec=ServerlessSpec(
-            cloud='aws',
-            region='us-east-1'  # Adjust the region based on your preference
-        )
-    )
 
 pdf_files = st.file_uploader("Upload your PDF files", type=["pdf"], accept_multiple_files=True)
 if pdf_files:
     with st.spinner("Loading pdf..."):
-        docs = get_pdf_processed(pdf_files) 
-        final_documents = text_splitter.split_text(docs)
-        if index_name not in pinecone.list_indexes().names():
-            pinecone.create_index(
-                name=index_name,
-                dimension=384,  # Adjust the dimension based on your embedding model
-                metric='cosine',
-                spec=ServerlessSpec(
-                    cloud='aws',
-                    region='us-east-1'  # Adjust the region based on your preference
-                )
-            )
-        st.session_state.vector = LangchainPinecone.from_texts(final_documents, index_name=index_name, embedding = embeddings) 
+        corpus_key = upload_key(pdf_files)
+        namespace = namespace_for(corpus_key, user_id)
+        if st.session_state.get("corpus_key") != corpus_key:
+            # Stream pages -> chunks -> embedding batches straight into this corpus' namespace,
+            # in parallel upsert batches; wait until they are queryable.
+            sink = PineconeSink(index, id_prefix=corpus_key, namespace=namespace)
+            count = run_pipeline(pdf_files, text_splitter, sink, embeddings=embeddings, backend="layout")
+            wait_for_namespace(index, namespace, count)
+            st.session_state.corpus_key = corpus_key
+            st.session_state.namespace = namespace
+        if st.session_state.get("namespace") and st.session_state.get("vector_namespace") != st.session_state.namespace:
+            # Opened once per namespace, not on every rerun.
+            st.session_state.vector = open_vector_store(index_name, embeddings, namespace=st.session_state.namespace)
+            st.session_state.vector_namespace = st.session_state.namespace
         st.success("Done!")
 
 user_question = st.text_input("Input your question here")
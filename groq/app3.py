@@ -2,6 +2,8 @@ import streamlit as st
 from PyPDF2 import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import os
+import sys
+import uuid
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 import google.generativeai as genai
 from langchain.vectorstores import FAISS
@@ -9,7 +11,6 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains.question_answering import load_qa_chain
 from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
-from langchain_community.embeddings import HuggingFaceEmbeddings
 
 from langchain_groq import ChatGroq 
 # from langchain_pinecone import PineconeVectorStore
@@ -25,6 +26,13 @@ from langchain_community.vectorstores import Neo4jVector
 from langchain_community.vectorstores.neo4j_vector import remove_lucene_chars
 
 load_dotenv()
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.embeddings import warm_up
+from rag.chains import format_documents
+from rag.pinecone_qa import EMBEDDING_MODEL, get_conversational_chain, ingest, retrieve_context
+from rag.streaming import StreamStats, answer_stream, write_answer
+from rag.tracing import trace, trace_config
+
 groq_api_key = os.getenv('GROQ_API_KEY')
 pinecone_api_key = os.getenv('PINECONE_API_KEY')
 
@@ -35,77 +43,27 @@ pinecone_api_key = os.getenv('PINECONE_API_KEY')
 # graph = Neo4jGraph()
 
 
-def get_pdf_text(pdf_docs):
-    text=""
-    for pdf in pdf_docs:
-        pdf_reader= PdfReader(pdf)
-        for page in pdf_reader.pages:
-            text+= page.extract_text()
-    return  text
-
-
-def get_text_chunks(text):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
-    chunks = text_splitter.split_text(text)
-    return chunks
-
-
-def get_vector_store(text_chunks):
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    pc= Pinecone(
-        api_key=pinecone_api_key,
-    )
-
-    # Create a new Pinecone index or retrieve an existing one
-    index_name = "chatindex"
-
-    if index_name in pc.list_indexes().names():
-        pc.delete_index(index_name)
-
-    pc.create_index(index_name, dimension=384, metric="cosine",
-                        spec=ServerlessSpec(cloud='aws',region='us-east-1')) 
-    vector_store = langpinecone.from_texts(text_chunks, embeddings, index_name=index_name)
-
-    return vector_store
-
-def get_conversational_chain():
-
-    prompt_template = """
-    Answer the question as detailed as possible from the provided context, make sure to provide all the details, if the answer is not in
-    provided context just say, "answer is not available in the context", don't provide the wrong answer\n\n
-    Context:\n {context}?\n
-    Question: \n{question}\n
- 
-    Answer:
-    """
-
-    model = ChatGroq(model="mixtral-8x7b-32768",groq_api_key=groq_api_key)    
-    prompt = PromptTemplate(template = prompt_template, input_variables = ["context", "question"])
-    chain = load_qa_chain(model, chain_type="stuff", prompt=prompt)
-
-    return chain 
-
-
 def user_input(user_question):
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    index_name = "chatindex"
-    pc = Pinecone(api_key = pinecone_api_key)
-    vector_store = langpinecone.from_existing_index(index_name, embeddings)
-
-    docs = vector_store.similarity_search(user_question, k=20)
-    # Search and retrieve relevant documents
-
-    chain = get_conversational_chain()
+    with trace("request", app="app3") as request_span:
+        # Search and retrieve relevant documents
+        context = retrieve_context(user_question, namespace=st.session_state.get("namespace"))
+        docs = context.documents
 
-    response = chain(
-        {"input_documents":docs, "question": user_question}
-        , return_only_outputs=True)
+        chain = get_conversational_chain()
 
-    st.write("Reply: ", response["output_text"])
+        stats = StreamStats()
+        tokens = answer_stream(chain.stream({"context": format_documents(docs), "question": user_question},
+                                            config=trace_config()), stats)
+        st.write("Reply: ")
+        write_answer(tokens)
+    st.caption(stats.summary())
+    st.caption(context.summary())
+    st.write("Response time: ", request_span.duration)
 
 
 def main():
     st.set_page_config("Chat PDF")
+    warm_up(EMBEDDING_MODEL)
     st.header("Chat with PDF using Gemini💁")
 
     user_question = st.text_input("Ask a Question from the PDF Files")
@@ -118,9 +76,9 @@ def main():
         pdf_docs = st.file_uploader("Upload your PDF Files and Click on the Submit & Process Button", accept_multiple_files=True)
         if st.button("Submit & Process"):
             with st.spinner("Processing..."):
-                raw_text = get_pdf_text(pdf_docs)
-                text_chunks = get_text_chunks(raw_text)
-                get_vector_store(text_chunks)
+                # Each upload gets its own namespace per session; other sessions' documents are untouched.
+                user_id = st.session_state.setdefault("user_id", uuid.uuid4().hex)
+                st.session_state.namespace = ingest(pdf_docs, user=user_id)
                 st.success("Done")
 
 
@@ -7,34 +7,41 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains import create_retrieval_chain
 
 # Embedding and model imports
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_groq import ChatGroq
 
 # Other
 import streamlit as st
 import os
+import sys
 import time
+import uuid
 from PyPDF2 import PdfReader
 import tempfile
 
 from dotenv import load_dotenv
 load_dotenv()
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.embeddings import get_embeddings, warm_up
+from rag.chunking import StructuredSplitter
+from rag.faiss_store import PersistentFaiss, ingest_uploads
+from rag.chains import get_retrieval_chain
+from rag.streaming import StreamStats, answer_stream, write_answer
+from rag.tracing import trace, trace_config
+
 groq_api_key = os.getenv('GROQ_API_KEY')
 
 # st.title("Ask your questions from pdf(s) or website")
 
 
-def get_pdf_processed(pdf_docs):
-    text=""
-    for pdf in pdf_docs:
-        pdf_reader= PdfReader(pdf)
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-    return text
+warm_up("all-MiniLM-L6-v2")
+st.session_state.embeddings = get_embeddings("all-MiniLM-L6-v2")
+st.session_state.text_splitter = StructuredSplitter()
 
-st.session_state.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-st.session_state.text_splitter = RecursiveCharacterTextSplitter(chunk_size =1000, chunk_overlap= 200)
+@st.cache_resource
+def load_faiss_store(corpus, _embeddings):
+    # Loaded once per process (mmap) and shared by every session.
+    return PersistentFaiss(_embeddings, corpus)
 
 def initialize_vector_store(option):
     if option:
@@ -46,21 +53,32 @@ def initialize_vector_store(option):
                     st.session_state.docs = st.session_state.loader.load()
                     st.session_state.final_documents = st.session_state.text_splitter.split_documents(st.session_state.docs)
                     st.session_state.vector = FAISS.from_documents(st.session_state.final_documents,st.session_state.embeddings)
+                    # Private to this session, so its chain gets a key of its own.
+                    st.session_state.vector_key = f"web:{website_link}:{uuid.uuid4().hex}"
                     st.success("Website content loaded successfully!")
 
         elif option == "PDF(s)":
+            corpus = st.text_input("Corpus name", value="default")
+            try:
+                faiss_store = load_faiss_store(corpus, st.session_state.embeddings)
+            except ValueError as exc:  # names are restricted to [A-Za-z0-9_-]
+                st.error(str(exc))
+                st.stop()
             pdf_files = st.file_uploader("Upload your PDF files", type=["pdf"], accept_multiple_files=True)
             if st.button("Submit & Process"):
                 with st.spinner("Loading pdf..."):
-                    st.session_state.docs = get_pdf_processed(pdf_files)
-                    st.session_state.final_documents = st.session_state.text_splitter.split_text(st.session_state.docs)
-                    st.session_state.vector = FAISS.from_texts(st.session_state.final_documents,st.session_state.embeddings)
+                    ingest_uploads(faiss_store, pdf_files, st.session_state.text_splitter, backend="layout")
                     st.success("PDF content loaded successfully!")
-
-def get_conversational_chain():
-    llm = ChatGroq(model="mixtral-8x7b-32768",groq_api_key=groq_api_key)
-    prompt = ChatPromptTemplate.from_template(
-    """
+            if faiss_store.sources:
+                names = {source_id: source["name"] for source_id, source in faiss_store.sources.items()}
+                source_id = st.selectbox("Documents in this corpus", list(names), format_func=names.get)
+                if st.button("Remove document"):
+                    faiss_store.delete_source(source_id)
+                    faiss_store.save()
+            st.session_state.vector = faiss_store.store
+            st.session_state.vector_key = faiss_store.path
+
+PROMPT_TEMPLATE = """
     Answer the question based on the provided context only.
     Please provide the most accurate response based on the question
     <context>
@@ -68,21 +86,25 @@ def get_conversational_chain():
     </context>
     Questions:{input}
     """
-    )
-    document_chain = create_stuff_documents_chain(llm,prompt)
-    retriever = st.session_state.vector.as_retriever() if st.session_state.vector else None
-    retrieval_chain = create_retrieval_chain(retriever,document_chain)
-    return retrieval_chain
+
+
+def get_conversational_chain():
+    # One chain per corpus path or website load, built once; the Groq client and prompt are shared across questions.
+    vector = st.session_state.get("vector")
+    key = st.session_state.get("vector_key") if vector else None
+    return get_retrieval_chain(vector.as_retriever() if vector else None, key, PROMPT_TEMPLATE,
+                               "groq", "mixtral-8x7b-32768", groq_api_key=groq_api_key)
 
 def user_input(prompt):
     chain = get_conversational_chain()
-    start =time.process_time()
-    response = chain.invoke({"input":prompt})
-    st.write(response['answer'])
-    st.write("Response time: ", time.process_time() - start)
+    with trace("request", app="huggingfacespace") as request_span:
+        stats = StreamStats()
+        write_answer(answer_stream(chain.stream({"input":prompt}, config=trace_config()), stats, key="answer"))
+    st.caption(stats.summary())
+    st.write("Response time: ", request_span.duration)
 
     with st.expander("Did not like the response? Check out more here"):
-        for i, doc in enumerate(response['context']):
+        for i, doc in enumerate(stats.context):
             st.write(doc.page_content)
             st.write("-----------------------------")
 
@@ -0,0 +1 @@
+"""Shared ingestion and retrieval helpers used by the Streamlit apps."""
@@ -0,0 +1,26 @@
+"""A long-lived asyncio loop on a background thread.
+
+Streamlit runs scripts on worker threads without an event loop, and async
+clients (the Neo4j async driver, httpx pools in the LLM SDKs) are bound to
+the loop they were first used on. Submitting every coroutine to one shared
+loop lets those clients and their connection pools be reused across reruns.
+"""
+import asyncio
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="rag-aio", daemon=True).start()
+        return _loop
+
+
+def run(coro, timeout=None):
+    """Run `coro` on the shared loop and block the calling thread for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
@@ -0,0 +1,130 @@
+"""Semantic answer cache in front of the LLM chains.
+
+Each answered question is embedded and kept, per corpus, in a small
+normalized matrix. A new question whose cosine similarity to a stored one is
+at least the threshold gets the stored answer and source chunks back without
+calling the model.
+
+A corpus is the vector-store namespace the answers were retrieved from. It is
+emptied when its index version changes, which by default is the namespace's
+retrieval-cache version (rag.retrieval_cache.index_version), bumped only by
+actual writes to that namespace.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from rag.retrieval_cache import get_retrieval_cache, index_version
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_CORPORA = int(os.getenv("ANSWER_CACHE_CORPORA", "256"))  # least recently used corpora are dropped
+
+
+class _Corpus:
+    def __init__(self, version):
+        self.version = version
+        self.matrix = None
+        self.entries = []  # (question, answer, sources), aligned with matrix rows
+
+
+class SemanticAnswerCache:
+    def __init__(self, embeddings, threshold=ANSWER_CACHE_THRESHOLD, maxsize=ANSWER_CACHE_SIZE,
+                 max_corpora=ANSWER_CACHE_CORPORA):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.max_corpora = max_corpora
+        self.hits = 0
+        self.misses = 0
+        self._corpora = OrderedDict()  # one per namespace, so one per session since namespaces are per user
+        self._lock = threading.Lock()
+
+    def _vector(self, question):
+        # Shares memoized query vectors with the retrieval cache.
+        vector = np.asarray(get_retrieval_cache().query_vector(self.embeddings, question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _corpus(self, corpus, version):
+        version = index_version(corpus) if version is None else version
+        state = self._corpora.get(corpus)
+        if state is None or state.version != version:
+            state = self._corpora[corpus] = _Corpus(version)
+        self._corpora.move_to_end(corpus)
+        while len(self._corpora) > self.max_corpora:
+            self._corpora.popitem(last=False)
+        return state
+
+    def lookup(self, question, corpus, version=None):
+        """(answer, sources, similarity) of the closest stored question above threshold, else None."""
+        vector = self._vector(question)
+        with self._lock:
+            state = self._corpus(corpus, version)
+            if state.matrix is not None:
+                similarities = state.matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    _, answer, sources = state.entries[best]
+                    return answer, sources, float(similarities[best])
+            self.misses += 1
+            return None
+
+    def store(self, question, answer, sources, corpus, version=None):
+        vector = self._vector(question)[None, :]
+        with self._lock:
+            version = index_version(corpus) if version is None else version
+            state = self._corpora.get(corpus)
+            if state is not None and state.version != version:
+                return  # computed against another version of the corpus; do not evict its answers
+            state = self._corpus(corpus, version)
+            state.matrix = vector if state.matrix is None else np.vstack([state.matrix, vector])
+            state.entries.append((question, answer, sources))
+            if len(state.entries) > self.maxsize:
+                state.matrix = state.matrix[1:]
+                state.entries.pop(0)
+
+    def answer(self, question, corpus, compute, version=None):
+        """
+        Cached (answer, sources, hit) for `question`; on a miss `compute()` must
+        return (answer, sources) and the result is stored.
+        """
+        version = index_version(corpus) if version is None else version  # the same for lookup and store
+        cached = self.lookup(question, corpus, version)
+        if cached is not None:
+            return cached[0], cached[1], True
+        answer, sources = compute()
+        self.store(question, answer, sources, corpus, version)
+        return answer, sources, False
+
+    def invalidate(self, corpus=None):
+        with self._lock:
+            if corpus is None:
+                self._corpora.clear()
+            else:
+                self._corpora.pop(corpus, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": sum(len(state.entries) for state in self._corpora.values()),
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(embeddings):
+    """One process-wide cache per embedding model, shared by every session."""
+    key = getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None) or type(embeddings).__name__
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = SemanticAnswerCache(embeddings)
+        return _caches[key]
@@ -0,0 +1,194 @@
+"""On-disk ingestion cache.
+
+Each uploaded PDF is keyed by a hash of its bytes plus the extraction
+backend, splitter and embedding-model settings. An entry holds the extracted
+text, the chunks and the float32 embedding matrix, so a repeat upload skips
+parse, split and embed. The cache directory is bounded by entry count and
+total size (LRU by mtime).
+
+Only disposable data lives under RAG_CACHE_DIR: these entries, the retrieval
+cache (bounded the same way), rotated traces and graph-extraction checkpoints
+of unfinished ingests. Durable stores (FAISS corpora, local vector indexes and
+their index versions) live under RAG_DATA_DIR and are never evicted.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+import numpy as np
+
+from rag.ingest import DEFAULT_BATCH_SIZE, iter_chunks, iter_embedded_batches, prefetch
+from rag.pdf_extract import DEFAULT_BACKEND, iter_pages
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", os.path.join(ROOT_DIR, ".rag_cache"))
+DATA_DIR = os.getenv("RAG_DATA_DIR", os.path.join(ROOT_DIR, ".rag_data"))
+CACHE_MAX_MB = int(os.getenv("RAG_CACHE_MAX_MB", "1024"))
+CACHE_MAX_ENTRIES = int(os.getenv("RAG_CACHE_MAX_ENTRIES", "256"))
+
+
+def cache_key(*parts, **settings):
+    """Stable hex key for content digests plus any settings that change the output."""
+    payload = json.dumps({"parts": parts, "settings": settings}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def splitter_settings(text_splitter):
+    return {
+        "type": type(text_splitter).__name__,
+        "chunk_size": getattr(text_splitter, "_chunk_size", None),
+        "chunk_overlap": getattr(text_splitter, "_chunk_overlap", None),
+    }
+
+
+def embedding_settings(embeddings):
+    model = getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None)
+    return {"type": type(embeddings).__name__, "model": model, "backend": getattr(embeddings, "backend", None)}
+
+
+def read_bytes(uploaded_file):
+    """Bytes of a Streamlit UploadedFile (or any file-like), leaving it rewound."""
+    if hasattr(uploaded_file, "getvalue"):
+        return uploaded_file.getvalue()
+    data = uploaded_file.read()
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    return data
+
+
+class IngestionCache:
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_MB * 1024 * 1024, max_entries=CACHE_MAX_ENTRIES,
+                 evict_every=1):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.evict_every = evict_every  # puts between evictions; each scans the whole directory
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def put(self, key, entry):
+        # Write to a temp file and rename so concurrent readers never see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._puts += 1
+            due = self._puts % self.evict_every == 0
+        if due:
+            self.evict()
+
+    def update(self, key, **fields):
+        entry = self.get(key)
+        if entry is not None:
+            entry.update(fields)
+            self.put(key, entry)
+        return entry
+
+    def evict(self):
+        """Drop least recently used entries until under the count and size limits."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.root):
+                if not name.endswith(".pkl"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+                _, size, name = entries.pop(0)
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        for name in os.listdir(self.root):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.root, name))
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = IngestionCache()
+    return _default_cache
+
+
+def upload_key(pdf_files, **settings):
+    """Key identifying a set of uploaded PDFs by content."""
+    return cache_key(*[hashlib.sha256(read_bytes(pdf)).hexdigest() for pdf in pdf_files], **settings)
+
+
+def cached_ingest(pdf_files, text_splitter, embeddings, backend=DEFAULT_BACKEND, cache=None,
+                  batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Extract, split and embed uploaded PDFs, reusing cached work per file.
+
+    Cache misses go through the streaming pipeline stages in rag.ingest.
+    Returns (chunks, metadatas, vectors, corpus_key) where vectors is a float32
+    matrix aligned with chunks and corpus_key identifies the whole upload.
+    """
+    cache = cache or get_default_cache()
+    settings = {"backend": backend, "splitter": splitter_settings(text_splitter),
+                "embeddings": embedding_settings(embeddings)}
+    chunks, metadatas, matrices, keys = [], [], [], []
+    for pdf in pdf_files:
+        key = cache_key(hashlib.sha256(read_bytes(pdf)).hexdigest(), **settings)
+        entry = cache.get(key)
+        if entry is None:
+            page_texts, file_chunks, file_metadatas, file_vectors = [], [], [], []
+
+            def pages():
+                for page in iter_pages([pdf], backend=backend):
+                    page_texts.append(page.text)
+                    yield page
+
+            batches = prefetch(iter_embedded_batches(iter_chunks(prefetch(pages()), text_splitter),
+                                                     embeddings, batch_size))
+            for texts, batch_metadatas, vectors in batches:
+                file_chunks.extend(texts)
+                file_metadatas.extend(batch_metadatas)
+                file_vectors.extend(vectors)
+            entry = {
+                "text": "".join(page_texts),
+                "chunks": file_chunks,
+                "metadatas": file_metadatas,
+                "embeddings": np.asarray(file_vectors, dtype=np.float32) if file_vectors else None,
+            }
+            cache.put(key, entry)
+        keys.append(key)
+        chunks.extend(entry["chunks"])
+        metadatas.extend(entry.get("metadatas") or [{} for _ in entry["chunks"]])
+        if entry["embeddings"] is not None:
+            matrices.append(entry["embeddings"])
+    vectors = np.vstack(matrices) if matrices else np.zeros((0, 0), dtype=np.float32)
+    return chunks, metadatas, vectors, cache_key(*keys)
@@ -0,0 +1,113 @@
+"""Process-wide registry of LLM clients and chains.
+
+The apps used to build the chat model, prompt and stuff/QA chain on every
+question, and Streamlit reruns rebuilt app.py's whole graph RAG chain. Here
+each runnable is built once per configuration key and handed out from a
+bounded LRU registry. Chat models are shared across chains, so their HTTP
+clients and connection pools are reused as well.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+CHAIN_REGISTRY_SIZE = int(os.getenv("CHAIN_REGISTRY_SIZE", "64"))
+# "fake" answers every get_llm() with rag.fakes.FakeChatModel, for offline benchmarks.
+CHAT_MODEL_PROVIDER = os.getenv("CHAT_MODEL_PROVIDER")
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0"))
+
+
+class ChainRegistry:
+    def __init__(self, maxsize=CHAIN_REGISTRY_SIZE):
+        self.maxsize = maxsize
+        self.builds = 0
+        self._items = OrderedDict()
+        # Re-entrant: factories fetch their chat model from the same registry.
+        self._lock = threading.RLock()
+
+    def get(self, key, factory):
+        """The runnable registered under `key`, built with `factory()` on first use."""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+            value = factory()
+            self.builds += 1
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_registry = ChainRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+def _chat_model(provider, model, **kwargs):
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+        return ChatGroq(model=model, **kwargs)
+    if provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=model, **kwargs)
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=model, **kwargs)
+    if provider == "fake":
+        from rag.fakes import FakeChatModel
+        return FakeChatModel(latency=FAKE_LLM_LATENCY, tokens_per_second=FAKE_LLM_TOKENS_PER_SECOND)
+    raise ValueError(f"Unknown chat model provider {provider!r}")
+
+
+def get_llm(provider, model, **kwargs):
+    provider = CHAT_MODEL_PROVIDER or provider
+    key = ("llm", provider, model, tuple(sorted(kwargs.items())))
+    return _registry.get(key, lambda: _chat_model(provider, model, **kwargs))
+
+
+def get_stuff_documents_chain(template, provider, model, **llm_kwargs):
+    """create_stuff_documents_chain over a ChatPromptTemplate; expects `context` and `input`."""
+    def build():
+        from langchain.chains.combine_documents import create_stuff_documents_chain
+        from langchain_core.prompts import ChatPromptTemplate
+        return create_stuff_documents_chain(get_llm(provider, model, **llm_kwargs),
+                                            ChatPromptTemplate.from_template(template))
+    return _registry.get(("stuff", template, provider, model, tuple(sorted(llm_kwargs.items()))), build)
+
+
+def get_retrieval_chain(retriever, retriever_key, template, provider, model, **llm_kwargs):
+    """
+    create_retrieval_chain(retriever, stuff chain). `retriever_key` identifies
+    the retriever's configuration (store, namespace, k); the retriever passed
+    in is only used when the chain is first built.
+    """
+    def build():
+        from langchain.chains import create_retrieval_chain
+        return create_retrieval_chain(retriever, get_stuff_documents_chain(template, provider, model, **llm_kwargs))
+    return _registry.get(("retrieval", retriever_key, template, provider, model,
+                          tuple(sorted(llm_kwargs.items()))), build)
+
+
+def format_documents(documents):
+    """Join documents the way load_qa_chain(chain_type="stuff") fills `{context}`."""
+    return "\n\n".join(document.page_content for document in documents)
+
+
+def get_stuff_answer_chain(template, provider, model, **llm_kwargs):
+    """
+    Streamable equivalent of load_qa_chain(chain_type="stuff"): prompt | llm | str.
+    Invoke with {"context": format_documents(docs), "question": ...}.
+    """
+    def build():
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import PromptTemplate
+        prompt = PromptTemplate(template=template, input_variables=["context", "question"])
+        return prompt | get_llm(provider, model, **llm_kwargs) | StrOutputParser()
+    return _registry.get(("stuff-answer", template, provider, model, tuple(sorted(llm_kwargs.items()))), build)
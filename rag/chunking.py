@@ -0,0 +1,125 @@
+"""Structure-aware chunking of PDF pages.
+
+`StructuredSplitter` is a LangChain text splitter that also understands the
+heading / text / table blocks of rag.pdf_extract's "layout" backend. In one
+pass over the pages it packs whole paragraphs into chunks of up to
+`chunk_size` characters. It never crosses a section heading, repeats the
+section heading at the top of continuation chunks, and overlaps consecutive
+chunks of a section by whole trailing sentences. Tables become their own
+chunks, split between rows with the header row repeated (tiny ones, such as a
+lone figure, are read as text). Every chunk carries
+source, page (where it starts) and section metadata; tables are tagged
+kind="table".
+
+Pages without blocks (other backends, plain text) are read as paragraphs
+separated by blank lines, so the splitter works with any backend.
+"""
+import os
+import re
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
+
+from rag.pdf_extract import Block
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1500"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))
+
+_PARAGRAPHS = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def text_blocks(text):
+    return [Block("text", paragraph.strip(), 0) for paragraph in _PARAGRAPHS.split(text) if paragraph.strip()]
+
+
+class StructuredSplitter(TextSplitter):
+    def __init__(self, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, **kwargs):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self._fallback = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0,
+                                                        length_function=self._length_function)
+
+    def split_text(self, text):
+        return [chunk for chunk, _ in self._assemble((None, 1, block) for block in text_blocks(text))]
+
+    def split_pages(self, pages):
+        """(chunk, metadata) pairs for a stream of rag.pdf_extract Pages, see rag.ingest.iter_chunks."""
+        def blocks():
+            for page in pages:
+                for block in page.blocks if page.blocks is not None else text_blocks(page.text):
+                    yield page.source, page.number, block
+        return self._assemble(blocks())
+
+    def _tail(self, parts):
+        """Whole trailing sentences of `parts` fitting in chunk_overlap characters."""
+        if not self._chunk_overlap or not parts:
+            return []
+        tail = []
+        for sentence in reversed(_SENTENCE_END.split(parts[-1])):
+            if self._length_function(" ".join([sentence] + tail)) > self._chunk_overlap:
+                break
+            tail.insert(0, sentence)
+        return [" ".join(tail)] if tail else []
+
+    def _table_chunks(self, text):
+        header, *rows = text.split("\n")
+        chunk = [header]
+        for row in rows:
+            if self._length_function("\n".join(chunk + [row])) > self._chunk_size and len(chunk) > 1:
+                yield "\n".join(chunk)
+                chunk = [header]
+            chunk.append(row)
+        yield "\n".join(chunk)
+
+    def _assemble(self, blocks):
+        source = page = start_page = None
+        outline = []  # (font size, heading) from the document title down to the current section
+        parts, size, body = [], 0, False  # body: parts hold more than the section heading / overlap
+
+        def metadata():
+            item = {"page": start_page, "section": " > ".join(heading for _, heading in outline)}
+            return {"source": source, **item} if source is not None else item
+
+        def flush(carry):
+            nonlocal parts, size, body, start_page
+            if body:
+                yield "\n".join(parts), metadata()
+                parts = ([outline[-1][1]] if outline else []) + (self._tail(parts) if carry else [])
+            elif not carry:
+                parts = []
+            size = self._length_function("\n".join(parts))
+            body = False
+            start_page = page
+
+        for block_source, page, block in blocks:
+            if block_source != source:
+                yield from flush(carry=False)
+                source, outline, parts, size = block_source, [], [], 0
+            if start_page is None or not body:
+                start_page = page
+            if block.kind == "heading":
+                yield from flush(carry=False)
+                while outline and outline[-1][0] <= block.size:
+                    outline.pop()
+                outline.append((block.size, block.text))
+                parts, size, start_page = [block.text], self._length_function(block.text), page
+            elif block.kind == "table" and self._length_function(block.text) * 10 >= self._chunk_size:
+                yield from flush(carry=False)
+                for text in self._table_chunks(block.text):
+                    yield text, {**metadata(), "page": page, "kind": "table"}
+                parts = [outline[-1][1]] if outline else []
+                size = self._length_function("\n".join(parts))
+            else:
+                pieces = [block.text]
+                if self._length_function(block.text) > self._chunk_size:
+                    pieces = self._fallback.split_text(block.text)
+                for piece in pieces:
+                    length = self._length_function(piece)
+                    if body and size + length + 1 > self._chunk_size:
+                        yield from flush(carry=True)
+                        if size + length + 1 > self._chunk_size:  # overlap does not fit beside this piece
+                            parts = parts[:1] if outline else []
+                            size = self._length_function("\n".join(parts))
+                    parts.append(piece)
+                    size += length + 1
+                    body = True
+        yield from flush(carry=False)
@@ -0,0 +1,185 @@
+"""Token-budgeted context assembly for the stuff chains.
+
+The apps retrieve the top 20-30 chunks and stuff all of them into the prompt.
+`pack_context` takes the retrieved documents in the order the vector store
+ranked them, best first, and never re-sorts them (FAISS scores are distances,
+Pinecone's similarities). It:
+
+1. Drops chunks contained in a better-ranked one, and trims the text that a
+   chunk shares with a neighbouring chunk because of the splitter overlap.
+2. Optionally reorders them by maximal marginal relevance
+   (CONTEXT_MMR_LAMBDA), using the chunk vectors the caller already has or
+   else the store's embeddings, memoized per chunk by the retrieval cache.
+3. Keeps them in rank order while they fit the model's context token budget.
+   A chunk that does not fit is skipped, but smaller later chunks may still
+   be added.
+
+Tokens are counted with tiktoken's cl100k_base. tiktoken downloads the
+vocabulary on first use; for offline hosts pre-cache it under
+TIKTOKEN_CACHE_DIR. Without it tokens are estimated as characters / 4 and a
+warning is logged. Every call records a "context_packing" span with the
+retrieved and packed token counts.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from rag.tracing import get_tracer
+
+# Context tokens per answer; the models' windows are larger, but long prompts are slow and costly.
+MODEL_CONTEXT_BUDGETS = {
+    "gemini-pro": 6000,
+    "mixtral-8x7b-32768": 4000,
+    "llama3-8b-8192": 3000,
+    "llama3-70b-8192": 3000,
+    "gemma-7b-it": 3000,
+}
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))  # 0: per model, else this for every model
+DEFAULT_CONTEXT_BUDGET = 3000
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0"))  # 0 disables MMR; 1 is pure relevance
+MIN_OVERLAP = 50  # shortest shared run of characters treated as splitter overlap
+SEPARATOR_TOKENS = 1  # format_documents joins chunks with a blank line
+
+logger = logging.getLogger(__name__)
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _encoder():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as exc:  # not installed, or the vocabulary cannot be downloaded
+                logger.warning("tiktoken cl100k_base unavailable (%s); estimating tokens as characters / 4. "
+                               "Pre-cache it under TIKTOKEN_CACHE_DIR for exact budgets.", exc)
+                _encoding = False
+        return _encoding
+
+
+def count_tokens(text):
+    encoding = _encoder()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def context_budget(model=None):
+    return CONTEXT_TOKEN_BUDGET or MODEL_CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+
+
+def _overlap(first, second):
+    """Length of the longest suffix of `first` that is a prefix of `second` (0 below MIN_OVERLAP)."""
+    if len(first) < MIN_OVERLAP or len(second) < MIN_OVERLAP:
+        return 0
+    probe = second[:MIN_OVERLAP]
+    start = first.find(probe, max(0, len(first) - len(second)))
+    while start != -1:
+        if second.startswith(first[start:]):
+            return len(first) - start
+        start = first.find(probe, start + 1)
+    return 0
+
+
+def _deduplicate(documents):
+    """(positions in `documents`, kept documents); see deduplicate."""
+    positions, kept, normalized = [], [], []
+    for position, doc in enumerate(documents):
+        text = doc.page_content.strip()
+        flat = " ".join(text.split())
+        if not flat or any(flat in other for other in normalized):
+            continue
+        for other in kept:
+            text = text[_overlap(other.page_content, text):]
+            cut = _overlap(text, other.page_content)
+            text = text[:len(text) - cut] if cut else text
+        text = text.strip()
+        if len(text) < MIN_OVERLAP and text != doc.page_content.strip():
+            continue  # almost nothing left once the overlap is removed
+        positions.append(position)
+        kept.append(doc if text == doc.page_content else Document(page_content=text, metadata=doc.metadata))
+        normalized.append(flat)
+    return positions, kept
+
+
+def deduplicate(documents):
+    """Documents minus those contained in a better-ranked one, with overlap against kept ones trimmed."""
+    return _deduplicate(documents)[1]
+
+
+def mmr_order(query_vector, doc_vectors, lambda_mult):
+    """Indices of the documents in maximal-marginal-relevance order."""
+    query = np.asarray(query_vector, dtype=np.float32)
+    docs = np.asarray(doc_vectors, dtype=np.float32)
+    docs = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    relevance = docs @ (query / max(np.linalg.norm(query), 1e-12))
+    similarity = docs @ docs.T
+    order, remaining = [], list(range(len(docs)))
+    while remaining:
+        if order:
+            redundancy = similarity[np.ix_(remaining, order)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        order.append(remaining.pop(int(np.argmax(scores))))
+    return order
+
+
+class PackedContext:
+    def __init__(self, documents, tokens, retrieved, retrieved_tokens, budget):
+        self.documents = documents
+        self.tokens = tokens
+        self.retrieved = retrieved
+        self.retrieved_tokens = retrieved_tokens
+        self.budget = budget
+
+    @property
+    def saved(self):
+        return self.retrieved_tokens - self.tokens
+
+    def summary(self):
+        return (f"Context: {len(self.documents)} of {self.retrieved} chunks, {self.tokens} tokens "
+                f"(budget {self.budget}, {self.saved} saved)")
+
+
+def pack_context(documents, model=None, budget=None, question=None, embeddings=None, mmr_lambda=None,
+                 doc_vectors=None):
+    """
+    The retrieved `documents` (in rank order, best first) deduplicated and
+    packed into the token budget of `model`. MMR reordering needs `question`
+    and `embeddings`; `doc_vectors`, aligned with `documents`, saves
+    embedding the chunks again.
+    """
+    start = time.perf_counter()
+    budget = budget or context_budget(model)
+    mmr_lambda = CONTEXT_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    retrieved_tokens = sum(count_tokens(doc.page_content) + SEPARATOR_TOKENS for doc in documents)
+
+    positions, candidates = _deduplicate(documents)
+    if mmr_lambda and embeddings is not None and question and len(candidates) > 1:
+        from rag.retrieval_cache import get_retrieval_cache
+        cache = get_retrieval_cache()
+        query_vector = cache.query_vector(embeddings, question)
+        if doc_vectors is not None:
+            vectors = [doc_vectors[position] for position in positions]
+        else:
+            vectors = cache.document_vectors(embeddings, [documents[position].page_content for position in positions])
+        candidates = [candidates[i] for i in mmr_order(query_vector, vectors, mmr_lambda)]
+
+    packed, tokens = [], 0
+    for doc in candidates:
+        cost = count_tokens(doc.page_content) + SEPARATOR_TOKENS
+        if tokens + cost <= budget or not packed:  # the best chunk is always kept
+            packed.append(doc)
+            tokens += cost
+    context = PackedContext(packed, tokens, len(documents), retrieved_tokens, budget)
+    get_tracer().record("context_packing", time.perf_counter() - start, retrieved=len(documents),
+                        packed=len(packed), tokens_retrieved=retrieved_tokens, tokens_packed=tokens,
+                        tokens_saved=context.saved)
+    return context
@@ -0,0 +1,127 @@
+"""Process-wide embedding models.
+
+Streamlit re-executes the app script on every interaction, but imported
+modules stay loaded, so models held here are built once per process and
+shared by every session and thread instead of being reloaded per rerun.
+
+EMBEDDING_BACKEND picks how the model runs: "huggingface" (the langchain
+wrapper, default), "torch" (LocalEmbeddings with explicit batching and
+thread control), "int8" (dynamically quantized torch) or "onnx".
+"""
+import os
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+DEFAULT_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+DEFAULT_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+DEFAULT_THREADS = int(os.getenv("EMBEDDING_THREADS", "0")) or None
+BACKENDS = ("huggingface", "torch", "int8", "onnx")
+WARM_UP_BATCH = ["warm-up"] * 8
+
+_models = {}
+_lock = threading.Lock()
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    sentence-transformers on CPU with explicit batch size and intra-op threads.
+
+    Texts are sorted by length and encoded in buckets of `batch_size`, so each
+    batch pads to a similar length, and results are returned in input order.
+
+    `num_threads` (EMBEDDING_THREADS, unset by default) is applied to this
+    model's own session for ONNX. For the torch backends it calls
+    torch.set_num_threads, which is process-wide and also affects every other
+    torch user in the process.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, backend="torch", batch_size=DEFAULT_BATCH_SIZE,
+                 num_threads=DEFAULT_THREADS):
+        from sentence_transformers import SentenceTransformer
+        import torch
+
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        if backend == "onnx":
+            model_kwargs = {}
+            if num_threads:
+                import onnxruntime
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = num_threads
+                model_kwargs["session_options"] = options  # passed on to optimum's ORTModel
+            self.client = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        else:
+            if num_threads:
+                torch.set_num_threads(num_threads)  # process-wide, see the class docstring
+            self.client = SentenceTransformer(model_name, device="cpu")
+            if backend == "int8":
+                self.client = torch.quantization.quantize_dynamic(self.client, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def embed_documents(self, texts):
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            encoded = self.client.encode([texts[i] for i in bucket], batch_size=len(bucket),
+                                         convert_to_numpy=True, show_progress_bar=False)
+            for i, vector in zip(bucket, encoded):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _load_model(model_name, backend=DEFAULT_BACKEND):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "huggingface":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+    return LocalEmbeddings(model_name, backend=backend)
+
+
+def get_model(model_name=DEFAULT_MODEL, backend=DEFAULT_BACKEND):
+    """The single loaded model for `model_name`, loading and warming it on first use."""
+    key = (model_name, backend)
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = _load_model(model_name, backend)
+                # First inference allocates buffers and initialises kernels; pay it here, not on a user query.
+                model.embed_documents(WARM_UP_BATCH)
+                _models[key] = model
+    return model
+
+
+class SharedEmbeddings(Embeddings):
+    """Lightweight handle to the shared model; cheap to create on every rerun."""
+
+    def __init__(self, model_name=DEFAULT_MODEL, backend=DEFAULT_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+
+    def embed_documents(self, texts):
+        return get_model(self.model_name, self.backend).embed_documents(texts)
+
+    def embed_query(self, text):
+        return get_model(self.model_name, self.backend).embed_query(text)
+
+
+def get_embeddings(model_name=DEFAULT_MODEL, backend=DEFAULT_BACKEND):
+    return SharedEmbeddings(model_name, backend)
+
+
+def warm_up(model_name=DEFAULT_MODEL, backend=DEFAULT_BACKEND, background=True):
+    """Load the model at app start-up, by default without blocking the first render."""
+    if (model_name, backend) in _models:
+        return
+    if background:
+        threading.Thread(target=get_model, args=(model_name, backend), daemon=True).start()
+    else:
+        get_model(model_name, backend)
@@ -0,0 +1,218 @@
+"""Approximate-nearest-neighbour index selection for the FAISS stores.
+
+A corpus starts as the exact IndexFlatL2 that LangChain's FAISS builds. Once
+it holds FAISS_ANN_MIN vectors, `maybe_upgrade` rebuilds it as FAISS_INDEX_TYPE:
+
+    flat   exact search, full float32 vectors (the default; never upgraded)
+    ivf    IVF<nlist>,Flat: k-means coarse quantizer; searches nprobe of nlist lists
+    hnsw   HNSW<M>,Flat: graph search; efSearch bounds the candidate list
+    ivfpq  IVF<nlist>,PQ<m>x4fs,RFlat: IVF over 4-bit fast-scan PQ codes; the
+           FAISS_REFINE_K * k best are re-ranked on the full vectors it also keeps
+
+IVF indexes are trained on a sample of the corpus at that point, and are
+retrained from the full vectors as the corpus outgrows nlist. A rebuilt index
+replaces the current one only if its recall@10 on a sample of the corpus is
+at least FAISS_MIN_RECALL; otherwise the next attempt waits until the corpus
+has doubled. The rebuild keeps vector order, so LangChain's position ->
+docstore id map stays valid. FAISS_NPROBE, FAISS_EF_SEARCH and FAISS_REFINE_K
+are applied at build time and whenever an index is loaded.
+"""
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+FAISS_ANN_MIN = int(os.getenv("FAISS_ANN_MIN", "50000"))
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "0"))  # 0: 4 * sqrt(n)
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", "40"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "0"))  # 0: dimension / 4
+FAISS_REFINE_K = int(os.getenv("FAISS_REFINE_K", "10"))
+FAISS_TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))
+FAISS_MIN_RECALL = float(os.getenv("FAISS_MIN_RECALL", "0.9"))
+RECALL_SAMPLE = 200
+RECALL_K = 10
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+logger = logging.getLogger(__name__)
+_rejected = {}  # id(index) -> ntotal when its last rebuild missed FAISS_MIN_RECALL
+
+
+def default_nlist(n):
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))  # faiss wants >= 39 training points per list
+
+
+def pq_subquantizers(dimension, m=None):
+    """PQ sub-quantizers (4 bits each): the largest divisor of `dimension` not above `m`."""
+    m = m or FAISS_PQ_M or max(1, dimension // 4)
+    return max(d for d in range(1, min(m, dimension) + 1) if dimension % d == 0)
+
+
+def factory_string(kind, dimension, n):
+    nlist = FAISS_NLIST or default_nlist(n)
+    if kind == "flat":
+        return "Flat"
+    if kind == "ivf":
+        return f"IVF{nlist},Flat"
+    if kind == "hnsw":
+        return f"HNSW{FAISS_HNSW_M},Flat"
+    if kind == "ivfpq":
+        # 4-bit fast-scan codes train in seconds where 8-bit PQ took minutes; RFlat recovers the recall.
+        return f"IVF{nlist},PQ{pq_subquantizers(dimension)}x4fs,RFlat"
+    raise ValueError(f"Unknown FAISS_INDEX_TYPE {kind!r}; expected one of {INDEX_TYPES}")
+
+
+def kind_of(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        return kind_of(index.base_index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, (faiss.IndexIVFPQ, faiss.IndexIVFPQFastScan)):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def configure(index, nprobe=None, ef_search=None, k_factor=None):
+    """Apply the search-time knobs (nprobe for IVF, efSearch for HNSW, k_factor for RFlat); returns the index."""
+    kind = kind_of(index)
+    if kind in ("ivf", "ivfpq"):
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = min(nprobe or FAISS_NPROBE, ivf.nlist)
+    elif kind == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = ef_search or FAISS_EF_SEARCH
+    refine = faiss.downcast_index(index)
+    if isinstance(refine, faiss.IndexRefine):
+        refine.k_factor = k_factor or FAISS_REFINE_K
+    return index
+
+
+def build_index(vectors, kind=None, nprobe=None, ef_search=None):
+    """A `kind` index over `vectors` (float32, n x d), trained on a sample of them if needed."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dimension = vectors.shape
+    index = faiss.index_factory(dimension, factory_string(kind or FAISS_INDEX_TYPE, dimension, n), faiss.METRIC_L2)
+    if kind_of(index) == "hnsw":
+        faiss.downcast_index(index).hnsw.efConstruction = FAISS_EF_CONSTRUCTION
+    if not index.is_trained:
+        sample = vectors
+        if n > FAISS_TRAIN_SAMPLE:
+            sample = vectors[np.random.default_rng(0).choice(n, FAISS_TRAIN_SAMPLE, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    return configure(index, nprobe, ef_search)
+
+
+def read_index(path, mmap=False):
+    """
+    Read an index from `path`; with `mmap` its vectors are memory-mapped
+    read-only instead of loaded. Flat and HNSW storage needs IO_FLAG_MMAP_IFC;
+    IVF inverted lists need IO_FLAG_MMAP and fail when both are given.
+    """
+    if not mmap:
+        return configure(faiss.read_index(path))
+    try:
+        index = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return configure(index)
+
+
+def _has_full_vectors(index):
+    # PQ codes only decode to approximations; IVFPQ indexes built before RFlat keep nothing else.
+    return kind_of(index) != "ivfpq" or isinstance(faiss.downcast_index(index), faiss.IndexRefine)
+
+
+def vectors_of(index):
+    """All stored vectors in insertion order (decoded approximations for PQ without RFlat)."""
+    if isinstance(faiss.downcast_index(index), faiss.IndexRefine):
+        return index.reconstruct_n(0, index.ntotal)  # from the refine stage's full vectors
+    if kind_of(index) in ("ivf", "ivfpq"):
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def measure_recall(index, vectors, k=RECALL_K, sample=RECALL_SAMPLE):
+    """
+    Recall@k of `index` against exact search over `vectors`, queried with a
+    sample of the vectors themselves (each query's own row is not counted).
+    """
+    rows = np.random.default_rng(0).choice(len(vectors), min(sample, len(vectors)), replace=False)
+    queries = np.ascontiguousarray(vectors[rows])
+    _, truth = faiss.knn(queries, vectors, k + 1)
+    _, found = index.search(queries, k + 1)
+    hits = 0
+    for row, expected, got in zip(rows, truth, found):
+        expected = [i for i in expected if i != row][:k]
+        got = [i for i in got if i != row][:k]
+        hits += len(set(expected) & set(got))
+    return hits / (len(rows) * k)
+
+
+def _needs_retrain(index):
+    if kind_of(index) not in ("ivf", "ivfpq") or FAISS_NLIST or not _has_full_vectors(index):
+        return False
+    return faiss.extract_index_ivf(index).nlist * 2 < default_nlist(index.ntotal)
+
+
+def maybe_upgrade(index, kind=None):
+    """
+    `index`, or its replacement once the corpus crosses FAISS_ANN_MIN (flat ->
+    `kind`) or an IVF index has far too few lists for its size (retrained),
+    provided the replacement reaches FAISS_MIN_RECALL.
+    """
+    kind = kind or FAISS_INDEX_TYPE
+    if kind == "flat" or index.ntotal < FAISS_ANN_MIN:
+        return index
+    if not (kind_of(index) == "flat" or _needs_retrain(index)):
+        return index
+    if index.ntotal < 2 * _rejected.get(id(index), 0):
+        return index
+    vectors = vectors_of(index)
+    rebuilt = build_index(vectors, kind)
+    recall = measure_recall(rebuilt, vectors)
+    if recall < FAISS_MIN_RECALL:
+        logger.warning("Keeping the %s index: %s recall@%d is %.3f, below FAISS_MIN_RECALL=%.2f",
+                       kind_of(index), kind, RECALL_K, recall, FAISS_MIN_RECALL)
+        _rejected[id(index)] = index.ntotal
+        return index
+    _rejected.pop(id(index), None)
+    return rebuilt
+
+
+def remove_rows(index, rows):
+    """`index` without the vectors at positions `rows`, remaining vectors kept in order."""
+    rows = np.asarray(sorted(rows), dtype=np.int64)
+    if kind_of(index) == "flat":
+        index.remove_ids(rows)  # a flat index compacts, as LangChain expects
+        return index
+    # IVF leaves holes in the id space and HNSW cannot remove at all: re-add the
+    # survivors to an empty copy, which keeps the trained quantizer.
+    keep = np.ones(index.ntotal, dtype=bool)
+    keep[rows] = False
+    survivors = vectors_of(index)[keep]
+    rebuilt = faiss.clone_index(index)
+    rebuilt.reset()
+    if len(survivors):
+        rebuilt.add(survivors)
+    return configure(rebuilt)
+
+
+def delete_documents(store, ids):
+    """LangChain FAISS.delete for any index type."""
+    ids = set(ids)
+    rows = [row for row, doc_id in store.index_to_docstore_id.items() if doc_id in ids]
+    if not rows:
+        return
+    store.index = remove_rows(store.index, rows)
+    store.docstore.delete([store.index_to_docstore_id[row] for row in rows])
+    remaining = [doc_id for _, doc_id in sorted(store.index_to_docstore_id.items()) if doc_id not in ids]
+    store.index_to_docstore_id = dict(enumerate(remaining))
@@ -0,0 +1,53 @@
+"""Question answering over a persistent FAISS corpus, as in groq/app1.py.
+
+Shared by groq/app1.py and the HTTP service (server.py): the splitter and
+embedding model of the corpus, the per-process corpus handle and the Groq
+retrieval chain over a store.
+"""
+import os
+import threading
+
+from rag.chains import get_retrieval_chain
+from rag.embeddings import get_embeddings
+from rag.retrieval_cache import CachedRetriever
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+CHAT_MODEL = "mixtral-8x7b-32768"
+
+PROMPT_TEMPLATE = """
+    Answer the question based on the provided context only.
+    Please provide the most accurate response based on the question
+    <context>
+    {context}
+    </context>
+    Questions:{input}
+    """
+
+# Corpus handles own the on-disk corpus and its locks, so unlike chains they are never evicted.
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+
+def get_text_splitter():
+    from rag.chunking import StructuredSplitter
+    return StructuredSplitter()
+
+
+def get_corpus(name="default"):
+    """The PersistentFaiss corpus `name`, loaded (mmap) once per process and kept for its lifetime."""
+    from rag.faiss_store import PersistentFaiss
+    key = (name, EMBEDDING_MODEL)
+    with _corpora_lock:
+        if key not in _corpora:
+            _corpora[key] = PersistentFaiss(get_embeddings(EMBEDDING_MODEL), name)
+        return _corpora[key]
+
+
+def get_chain(store, namespace, version_fn=None):
+    """
+    create_retrieval_chain over `store`; streams dicts with the retrieved
+    `context` and the `answer` deltas. Built once per store and namespace.
+    """
+    retriever = CachedRetriever(store=store, namespace=namespace, version_fn=version_fn) if store else None
+    return get_retrieval_chain(retriever, (id(store), namespace), PROMPT_TEMPLATE, "groq", CHAT_MODEL,
+                               groq_api_key=os.getenv('GROQ_API_KEY'))
@@ -0,0 +1,244 @@
+"""Persistent, per-corpus FAISS store.
+
+Each corpus lives in its own directory under FAISS_INDEX_DIR. Every save
+writes a fresh snapshot directory in the langchain `save_local` layout
+(index.faiss + index.pkl) plus a sources.json manifest, then atomically
+repoints the CURRENT file at it, so a crash never leaves an index and a
+docstore that disagree. The index is memory-mapped at startup, new documents
+are appended with add_embeddings/add_texts instead of rebuilding, and
+documents can be removed by source id. Large corpora switch to an
+approximate index (rag.faiss_index, FAISS_INDEX_TYPE).
+
+A store is shared by every session of the process: searches hold a read
+lock and adds/deletes a write lock, so the index never changes under a
+running search.
+"""
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+
+from langchain_community.vectorstores.faiss import FAISS
+
+from rag.cache import DATA_DIR, cached_ingest, upload_key
+from rag.faiss_index import delete_documents, maybe_upgrade, read_index
+from rag.pdf_extract import DEFAULT_BACKEND
+
+FAISS_DIR = os.getenv("FAISS_INDEX_DIR", os.path.join(DATA_DIR, "faiss"))
+CURRENT = "CURRENT"  # names the snapshot directory of the corpus' latest save
+
+_CORPUS_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def corpus_path(root, corpus):
+    """Directory of `corpus` under `root`; raises ValueError for names that could escape it."""
+    if not isinstance(corpus, str) or not _CORPUS_NAME.fullmatch(corpus):
+        raise ValueError(f"Invalid corpus name {corpus!r}: use only letters, digits, '_' and '-'")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, corpus))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Corpus {corpus!r} resolves outside {root}")
+    return path
+
+
+class _ReadWriteLock:
+    """Any number of readers or one writer; a waiting writer holds off new readers."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writing = False
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class LockedFAISS(FAISS):
+    """LangChain's FAISS with every search under the owning PersistentFaiss' read lock."""
+
+    rwlock = None
+
+    def similarity_search_with_score_by_vector(self, *args, **kwargs):
+        with self.rwlock.read():
+            return super().similarity_search_with_score_by_vector(*args, **kwargs)
+
+    def max_marginal_relevance_search_with_score_by_vector(self, *args, **kwargs):
+        with self.rwlock.read():
+            return super().max_marginal_relevance_search_with_score_by_vector(*args, **kwargs)
+
+
+class PersistentFaiss:
+    def __init__(self, embeddings, corpus="default", root=FAISS_DIR, mmap=True):
+        self.embeddings = embeddings
+        self.corpus = corpus
+        self.path = corpus_path(root, corpus)
+        self.store = None
+        self.sources = {}  # source_id -> {"name": ..., "ids": [...]}
+        # Retrieval-cache version: the snapshot name while unchanged since load, a fresh token
+        # after every add/delete, so cached results are never shared across different contents.
+        self.version = uuid.uuid4().hex
+        self._snapshot = None  # directory the index was loaded from / last saved to
+        self._mmapped = False
+        self._lock = threading.RLock()  # serializes writers and saves
+        self._rwlock = _ReadWriteLock()
+        self.load(mmap=mmap)
+
+    def _snapshot_dir(self):
+        pointer = os.path.join(self.path, CURRENT)
+        if os.path.exists(pointer):
+            with open(pointer) as f:
+                return os.path.join(self.path, f.read().strip())
+        if os.path.exists(os.path.join(self.path, "index.faiss")):
+            return self.path  # saved before snapshots existed
+        return None
+
+    def load(self, mmap=True):
+        snapshot = self._snapshot_dir()
+        if snapshot is None:
+            return
+        # A memory-mapped index is paged in lazily by the OS, so opening a large
+        # corpus is near-instant; it is copied into RAM only before the first write.
+        index = read_index(os.path.join(snapshot, "index.faiss"), mmap=mmap)
+        with open(os.path.join(snapshot, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        self.store = self._locked(LockedFAISS(self.embeddings, index, docstore, index_to_docstore_id))
+        self._snapshot = snapshot
+        self._mmapped = mmap
+        self.version = os.path.basename(snapshot)
+        manifest = os.path.join(snapshot, "sources.json")
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                self.sources = json.load(f)
+
+    def _locked(self, store):
+        store.rwlock = self._rwlock
+        return store
+
+    def _writable(self):
+        if self._mmapped:
+            # A still-mapped index is unchanged on disk; read it again into RAM (IVF's
+            # memory-mapped inverted lists cannot be cloned).
+            self.store.index = read_index(os.path.join(self._snapshot, "index.faiss"))
+            self._mmapped = False
+
+    def has_source(self, source_id):
+        return source_id in self.sources
+
+    def add_embeddings(self, source_id, texts, vectors, metadatas=None, name=None):
+        """Append precomputed (text, vector) pairs for one source; a known source is a no-op."""
+        with self._lock:
+            if source_id in self.sources:
+                return self.sources[source_id]["ids"]
+            ids = [f"{source_id}-{i}" for i in range(len(texts))]
+            metadatas = [{**(metadata or {}), "source_id": source_id}
+                         for metadata in (metadatas or [{}] * len(texts))]
+            if ids:
+                with self._rwlock.write():
+                    if self.store is None:
+                        self.store = self._locked(LockedFAISS.from_embeddings(
+                            list(zip(texts, vectors)), self.embeddings, metadatas=metadatas, ids=ids))
+                    else:
+                        self._writable()
+                        self.store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+                    # Past FAISS_ANN_MIN vectors the flat index is rebuilt (and trained) as FAISS_INDEX_TYPE.
+                    upgraded = maybe_upgrade(self.store.index)
+                    if upgraded is not self.store.index:
+                        self.store.index = upgraded
+                        self._mmapped = False
+            self.sources[source_id] = {"name": name or source_id, "ids": ids}
+            self.version = uuid.uuid4().hex
+            return ids
+
+    def add_texts(self, source_id, texts, metadatas=None, name=None):
+        if source_id in self.sources:
+            return self.sources[source_id]["ids"]
+        vectors = self.embeddings.embed_documents(list(texts))
+        return self.add_embeddings(source_id, texts, vectors, metadatas=metadatas, name=name)
+
+    def delete_source(self, source_id):
+        with self._lock:
+            entry = self.sources.pop(source_id, None)
+            if entry is None:
+                return False
+            if entry["ids"]:
+                with self._rwlock.write():
+                    self._writable()
+                    delete_documents(self.store, entry["ids"])
+            self.version = uuid.uuid4().hex
+            return True
+
+    def save(self):
+        """Write a new snapshot of the corpus and atomically make it the current one."""
+        with self._lock:
+            if self.store is None:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            snapshot = tempfile.mkdtemp(prefix="v-", dir=self.path)
+            try:
+                if self._mmapped:  # unchanged since load; copy rather than re-serialize the mapped index
+                    for name in ("index.faiss", "index.pkl"):
+                        shutil.copyfile(os.path.join(self._snapshot, name), os.path.join(snapshot, name))
+                else:
+                    self.store.save_local(snapshot)
+                with open(os.path.join(snapshot, "sources.json"), "w") as f:
+                    json.dump(self.sources, f)
+                fd, pointer = tempfile.mkstemp(prefix=".current-", dir=self.path)
+                with os.fdopen(fd, "w") as f:
+                    f.write(os.path.basename(snapshot))
+                os.replace(pointer, os.path.join(self.path, CURRENT))
+            except BaseException:
+                shutil.rmtree(snapshot, ignore_errors=True)
+                raise
+            previous, self._snapshot = self._snapshot, snapshot
+            # Keep the previous snapshot for processes that read CURRENT just before the swap.
+            for name in os.listdir(self.path):
+                path = os.path.join(self.path, name)
+                if name.startswith("v-") and path not in (snapshot, previous):
+                    shutil.rmtree(path, ignore_errors=True)
+
+
+def ingest_uploads(faiss_store, pdf_files, text_splitter, backend=DEFAULT_BACKEND):
+    """Add uploaded PDFs the corpus does not have yet and persist; returns how many were added."""
+    added = 0
+    for pdf in pdf_files:
+        source_id = upload_key([pdf])
+        if faiss_store.has_source(source_id):
+            continue
+        chunks, metadatas, vectors, _ = cached_ingest([pdf], text_splitter, faiss_store.embeddings, backend=backend)
+        faiss_store.add_embeddings(source_id, chunks, vectors, metadatas, name=getattr(pdf, "name", None))
+        added += 1
+    if added:
+        faiss_store.save()
+    return added
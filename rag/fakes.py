@@ -0,0 +1,325 @@
+"""Deterministic offline stand-ins for the hosted models and the graph store.
+
+They let the ingestion and question paths be exercised and benchmarked
+without API keys or services: latency and token rate are simulated, and
+rate-limit errors can be injected to exercise retry logic.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+ENTITY_PATTERN = re.compile(r"\b[A-Z][a-zA-Z]{2,}\b")
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class StructuredOutputUnsupported(NotImplementedError):
+    """
+    Raised by FakeChatModel.with_structured_output for schemas it cannot fill.
+    It subclasses NotImplementedError because that is what LLMGraphTransformer
+    catches to fall back to its JSON prompt.
+    """
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Echo-style chat model with simulated latency.
+
+    `latency` is the time to first token and `tokens_per_second` the decode
+    rate. Every `rate_limit_every`-th call raises FakeRateLimitError.
+    """
+
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    rate_limit_every: int = 0
+    calls: int = 0
+    _lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def respond(self, messages: List[BaseMessage]) -> str:
+        prompt = messages[-1].content if messages else ""
+        words = re.findall(r"\w+", prompt)
+        return "Answer: " + " ".join(words[-40:])
+
+    def _count_call(self):
+        with self._lock:
+            self.calls += 1
+            if self.rate_limit_every and self.calls % self.rate_limit_every == 0:
+                raise FakeRateLimitError("Rate limit reached (fake)")
+
+    def _tokens(self, messages):
+        return re.findall(r"\S+\s*", self.respond(messages))
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        self._count_call()
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + self._token_delay() * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        self._count_call()
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency + self._token_delay() * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self._count_call()
+        time.sleep(self.latency)
+        for token in self._tokens(messages):
+            time.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any):
+        self._count_call()
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs):
+        """
+        app.py's entity extraction: capitalised words of the input fill the
+        schema's `names` list. Other schemas (LLMGraphTransformer's) raise
+        StructuredOutputUnsupported.
+        """
+        fields = getattr(schema, "model_fields", None) or getattr(schema, "__fields__", {})
+        if "names" not in fields:
+            raise StructuredOutputUnsupported(f"FakeChatModel only structures entity names, not {schema!r}")
+
+        def names(prompt_value):
+            messages = prompt_value.to_messages()
+            text = messages[-1].content.rsplit("input:", 1)[-1] if messages else ""
+            return schema(names=list(dict.fromkeys(ENTITY_PATTERN.findall(text))))
+
+        def extract(prompt_value):
+            self._count_call()
+            time.sleep(self.latency)
+            return names(prompt_value)
+
+        async def aextract(prompt_value):
+            self._count_call()
+            await asyncio.sleep(self.latency)
+            return names(prompt_value)
+
+        return RunnableLambda(extract, afunc=aextract)
+
+
+class FakeGraphChatModel(FakeChatModel):
+    """
+    Answers LLMGraphTransformer's JSON prompt: capitalised words in the chunk
+    become entities, and consecutive entities are linked by RELATED_TO.
+    """
+
+    max_entities: int = 8
+
+    def respond(self, messages: List[BaseMessage]) -> str:
+        text = messages[-1].content if messages else ""
+        text = text.rsplit("Text:", 1)[-1]  # skip the transformer's instructions
+        entities = list(dict.fromkeys(ENTITY_PATTERN.findall(text)))[:self.max_entities]
+        triples = [
+            {"head": head, "head_type": "Organization", "relation": "RELATED_TO",
+             "tail": tail, "tail_type": "Organization"}
+            for head, tail in zip(entities, entities[1:])
+        ]
+        return json.dumps(triples)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Feature-hashing embeddings of configurable dimension: each word adds a
+    signed unit to a hashed coordinate and vectors are L2-normalised, so
+    texts sharing words are close. `latency` is simulated per call.
+    """
+
+    def __init__(self, dimension=384, latency=0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.model_name = f"fake-hashing-{dimension}"  # keys the ingestion cache per dimension
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._embed(text)
+
+
+class InMemoryGraph:
+    """
+    Dict-backed stand-in for the Neo4j knowledge graph.
+
+    Ingestion uses BulkGraphWriter's interface (existing_documents, write,
+    stats); `async_driver()` answers rag.graph's entity neighborhood queries,
+    so GraphSink and aretriever run unchanged without a database. Full-text
+    matching is approximated by case-insensitive substring matching of every
+    query term.
+    """
+
+    def __init__(self):
+        self.documents = {}  # id -> (text, metadata)
+        self.pending = []  # document ids not embedded yet
+        self.entities = {}  # id -> label
+        self.outgoing = defaultdict(dict)  # id -> {(type, target): None}
+        self.incoming = defaultdict(dict)  # id -> {(type, source): None}
+        self.nodes_written = 0
+        self.relationships_written = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def existing_documents(self, ids):
+        with self._lock:
+            return {doc_id for doc_id in ids if doc_id in self.documents}
+
+    def write(self, graph_documents):
+        from rag.graph_writer import document_id
+        start_time = time.perf_counter()
+        new = 0
+        with self._lock:
+            for doc in graph_documents:
+                doc_id = document_id(doc.source.page_content)
+                if doc_id in self.documents:
+                    continue
+                new += 1
+                self.documents[doc_id] = (doc.source.page_content, dict(doc.source.metadata))
+                self.pending.append(doc_id)
+                self.nodes_written += 1
+                for node in doc.nodes:
+                    self.nodes_written += node.id not in self.entities
+                    self.entities.setdefault(node.id, node.type)
+                    self.relationships_written += 1  # MENTIONS
+                for rel in doc.relationships:
+                    for node in (rel.source, rel.target):
+                        self.nodes_written += node.id not in self.entities
+                        self.entities.setdefault(node.id, node.type)
+                    key = (rel.type, rel.target.id)
+                    self.relationships_written += key not in self.outgoing[rel.source.id]
+                    self.outgoing[rel.source.id][key] = None
+                    self.incoming[rel.target.id][(rel.type, rel.source.id)] = None
+        self.seconds += time.perf_counter() - start_time
+        return new
+
+    def stats(self):
+        seconds = self.seconds or float("inf")
+        return {
+            "nodes": self.nodes_written,
+            "relationships": self.relationships_written,
+            "seconds": self.seconds,
+            "nodes_per_sec": self.nodes_written / seconds,
+            "rels_per_sec": self.relationships_written / seconds,
+        }
+
+    def take_pending(self):
+        """(ids, texts, metadatas) of documents written since the last call."""
+        with self._lock:
+            ids, self.pending = self.pending, []
+            return ids, [self.documents[i][0] for i in ids], [self.documents[i][1] for i in ids]
+
+    def neighborhood(self, query, nodes=2, limit=50):
+        """Triples around the first `nodes` entities matching a generate_full_text_query string."""
+        terms = [term.lower() for term in re.findall(r"(\S+?)~2", query)]
+        with self._lock:
+            matches = [entity for entity in self.entities
+                       if terms and all(term in entity.lower() for term in terms)][:nodes]
+            output = []
+            for node in matches:
+                output.extend(f"{node} - {rel_type} -> {target}" for rel_type, target in self.outgoing[node])
+                output.extend(f"{source} - {rel_type} -> {node}" for rel_type, source in self.incoming[node])
+        return output[:limit]
+
+    def async_driver(self, latency=0.0):
+        return FakeAsyncGraphDriver(self, latency)
+
+
+class _FakeResult:
+    def __init__(self, records):
+        self._records = iter(records)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._records)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _FakeAsyncSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def run(self, query, parameters=None, **kwargs):
+        records, _, _ = await self.driver.execute_query(query, parameters, **kwargs)
+        return _FakeResult(records)
+
+
+class FakeAsyncGraphDriver:
+    """The slice of neo4j.AsyncDriver that rag.graph's retrievers use, over an InMemoryGraph."""
+
+    def __init__(self, graph, latency=0.0):
+        self.graph = graph
+        self.latency = latency  # simulated round trip
+
+    def session(self, **kwargs):
+        return _FakeAsyncSession(self)
+
+    async def execute_query(self, query, parameters=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        parameters = parameters or {}
+        records = []
+        for text in parameters.get("queries") or [parameters.get("query", "")]:
+            records.extend({"output": output} for output in self.graph.neighborhood(text))
+        return records, None, None
+
+    async def close(self):
+        pass
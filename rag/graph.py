@@ -0,0 +1,140 @@
+"""Hybrid (knowledge graph + vector) retrieval over Neo4j.
+
+`aretriever` runs entity extraction concurrently with the vector search and
+then fetches entity neighborhoods in one of two modes (GRAPH_QUERY_MODE):
+
+- "per_entity": one full-text query per entity, in parallel; the context
+  string is identical to the original sequential retriever in app.py.
+- "batched" (default): a single UNWIND round-trip for all entities with the
+  same LIMIT per entity, streamed back and deduplicated across entities.
+
+Entities with nothing left to search for once Lucene special characters are
+removed are skipped.
+"""
+import asyncio
+import os
+
+from langchain_community.vectorstores.neo4j_vector import remove_lucene_chars
+
+from rag.aio import run
+from rag.neo4j_pool import aget_driver
+from rag.tracing import span
+
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+GRAPH_QUERY_MODE = os.getenv("GRAPH_QUERY_MODE", "batched")
+GRAPH_QUERY_MODES = ("batched", "per_entity")
+
+NEIGHBORHOOD_QUERY = """CALL db.index.fulltext.queryNodes('entity', $query, {limit:2})
+                    YIELD node,score
+                    CALL {
+                      WITH node
+                      MATCH (node)-[r:!MENTIONS]->(neighbor)
+                      RETURN node.id + ' - ' + type(r) + ' -> ' + neighbor.id AS output
+                      UNION ALL
+                      WITH node
+                      MATCH (node)<-[r:!MENTIONS]-(neighbor)
+                      RETURN neighbor.id + ' - ' + type(r) + ' -> ' +  node.id AS output
+                    }
+                    RETURN output LIMIT 50
+                    """
+
+
+# LIMIT inside the CALL subquery applies per UNWIND row, i.e. per entity.
+BATCHED_NEIGHBORHOOD_QUERY = """UNWIND $queries AS query
+                    CALL {
+                      WITH query
+                      CALL db.index.fulltext.queryNodes('entity', query, {limit:2})
+                      YIELD node,score
+                      CALL {
+                        WITH node
+                        MATCH (node)-[r:!MENTIONS]->(neighbor)
+                        RETURN node.id + ' - ' + type(r) + ' -> ' + neighbor.id AS output
+                        UNION ALL
+                        WITH node
+                        MATCH (node)<-[r:!MENTIONS]-(neighbor)
+                        RETURN neighbor.id + ' - ' + type(r) + ' -> ' +  node.id AS output
+                      }
+                      RETURN output LIMIT 50
+                    }
+                    RETURN output
+                    """
+
+
+def generate_full_text_query(input: str) -> str:
+    """
+    Generate a full-text search query for a given input string.
+
+    This function constructs a query string suitable for a full-text search.
+    It processes the input string by splitting it into words and appending a
+    similarity threshold (~2 changed characters) to each word, then combines
+    them using the AND operator. Useful for mapping entities from user questions
+    to database values, and allows for some misspelings.
+    """
+    full_text_query = ""
+    words = [el for el in remove_lucene_chars(input).split() if el]
+    for word in words[:-1]:
+        full_text_query += f" {word}~2 AND"
+    full_text_query += f" {words[-1]}~2"
+    return full_text_query.strip()
+
+
+def format_context(structured_data: str, unstructured_data: list) -> str:
+    final_data = f"""Structured data:
+                            {structured_data}
+                            Unstructured data:
+                            {"#Document ". join(unstructured_data)}
+                                        """
+    return final_data
+
+
+def _searchable(entities):
+    """The entities generate_full_text_query can build a query for."""
+    return [entity for entity in entities if remove_lucene_chars(entity).split()]
+
+
+async def _aneighborhood(driver, entity: str) -> str:
+    records, _, _ = await driver.execute_query(
+        NEIGHBORHOOD_QUERY, {"query": generate_full_text_query(entity)}, database_=NEO4J_DATABASE, routing_="r")
+    return "\n".join([el['output'] for el in records])
+
+
+async def _abatched_neighborhoods(driver, entities) -> str:
+    if not entities:
+        return ""
+    queries = [generate_full_text_query(entity) for entity in entities]
+    seen = {}  # insertion-ordered set of triples
+    async with driver.session(database=NEO4J_DATABASE, default_access_mode="READ") as session:
+        result = await session.run(BATCHED_NEIGHBORHOOD_QUERY, {"queries": queries})
+        async for record in result:
+            seen.setdefault(record["output"], None)
+    return "\n".join(seen)
+
+
+async def _timed(name, awaitable):
+    with span(name):
+        return await awaitable
+
+
+async def aretriever(question: str, entity_chain, vector_search, driver=None, mode=None) -> str:
+    mode = mode or GRAPH_QUERY_MODE
+    if mode not in GRAPH_QUERY_MODES:
+        raise ValueError(f"Unknown GRAPH_QUERY_MODE {mode!r}, expected one of {GRAPH_QUERY_MODES}")
+    driver = driver or await aget_driver()
+    entities, documents = await asyncio.gather(
+        _timed("entity_extraction", entity_chain.ainvoke({"question": question})),
+        asyncio.to_thread(vector_search, question),
+    )
+    names = _searchable(entities.names)
+    with span("graph_query", mode=mode, entities=len(names)):
+        if mode == "batched":
+            structured_data = await _abatched_neighborhoods(driver, names)
+        else:
+            # gather keeps entity order, so joining matches the sequential `result +=` exactly.
+            neighborhoods = await asyncio.gather(*[_aneighborhood(driver, entity) for entity in names])
+            structured_data = "".join(neighborhoods)
+    return format_context(structured_data, [el.page_content for el in documents])
+
+
+def concurrent_retriever(question: str, entity_chain, vector_search, mode=None, driver=None) -> str:
+    """Synchronous entry point for chains: runs aretriever on the shared event loop."""
+    return run(aretriever(question, entity_chain, vector_search, driver=driver, mode=mode))
@@ -0,0 +1,188 @@
+"""The knowledge-graph RAG pipeline behind app.py, usable outside Streamlit.
+
+`load_graph_index` bootstraps the schema and opens the hybrid Neo4j vector
+index, `get_chain` hands out the graph + vector RAG chain built once per
+index, and `ingest` runs PDFs through graph extraction into Neo4j. app.py and
+the HTTP service (server.py) both use these.
+"""
+from typing import List, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts.prompt import PromptTemplate
+from langchain_core.pydantic_v1 import BaseModel, Field
+from langchain_core.runnables import (
+    RunnableBranch,
+    RunnableLambda,
+    RunnableParallel,
+    RunnablePassthrough,
+)
+
+from rag.chains import get_llm, get_registry
+from rag.graph import concurrent_retriever
+from rag.graph_extract import ExtractionCheckpoint
+from rag.graph_schema import KEYWORD_INDEX, RETRIEVAL_QUERY, VECTOR_INDEX, EmbeddingBackfill, bootstrap
+from rag.graph_writer import BulkGraphWriter
+from rag.ingest import GraphSink, run_pipeline
+from rag.neo4j_pool import get_driver, share_driver
+from rag.retrieval_cache import bump_version, cached_similarity_search
+from rag.tracing import CONDENSE_RUN
+
+CHAT_MODEL = "gpt-3.5-turbo-0125"  # gpt-4-0125-preview occasionally has issues
+
+
+def load_graph_index():
+    """
+    Bootstrap the schema, start the embedding backfill and open the hybrid
+    vector index. Returns (vector_index, backfill); callers keep one per process.
+    """
+    from langchain_community.vectorstores import Neo4jVector
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings()
+    driver = get_driver()
+    bootstrap(driver, dimensions=len(embeddings.embed_query("dimension probe")))
+    backfill = EmbeddingBackfill(driver, embeddings).start()
+    vector_index = share_driver(Neo4jVector.from_existing_index(
+        embeddings,
+        index_name=VECTOR_INDEX,
+        keyword_index_name=KEYWORD_INDEX,
+        search_type="hybrid",
+        retrieval_query=RETRIEVAL_QUERY,
+    ))
+    return vector_index, backfill
+
+
+def build_chain(vector_index, backfill, driver=None):
+    """
+    The graph + vector RAG chain; built once per vector index through the
+    chain registry. `driver` (an async Neo4j driver) defaults to the pool's.
+    """
+    llm = get_llm("openai", CHAT_MODEL, temperature=0)
+
+    # Retriever
+
+    # Extract entities from text
+    class Entities(BaseModel):
+        """Identifying information about entities."""
+
+        names: List[str] = Field(
+            ...,
+            description="All the person, organization, or business entities that "
+            "appear in the text",
+        )
+
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are extracting organization and person entities from the text.",
+            ),
+            (
+                "human",
+                "Use the given format to extract information from the following "
+                "input: {question}",
+            ),
+        ]
+    )
+
+    entity_chain = prompt | llm.with_structured_output(Entities)
+
+    def vector_search(question: str):
+        # Runs on a worker thread, so no st.session_state here; the index only changes as the backfill embeds.
+        return cached_similarity_search(vector_index, question, namespace="neo4j", version=backfill.version)
+
+    def retriever(question: str):
+        print(f"Search query: {question}")
+        # Entity extraction and vector search run concurrently, then one parallel
+        # full-text neighborhood query per entity; same context string as before.
+        return concurrent_retriever(question, entity_chain, vector_search, driver=driver)
+
+    # Condense a chat history and follow-up question into a standalone question
+    _template = """Given the following conversation and a follow up question, rephrase the follow up question to be a standalone question,
+                    in its original language.
+                    Chat History:
+                    {chat_history}
+                    Follow Up Input: {question}
+                    Standalone question:"""  # noqa: E501
+    CONDENSE_QUESTION_PROMPT = PromptTemplate.from_template(_template)
+
+    def _format_chat_history(chat_history: List[Tuple[str, str]]) -> List:
+        buffer = []
+        for human, ai in chat_history:
+            buffer.append(HumanMessage(content=human))
+            buffer.append(AIMessage(content=ai))
+        return buffer
+
+    _search_query = RunnableBranch(
+        # If input includes chat_history, we condense it with the follow-up question
+        (
+            RunnableLambda(lambda x: bool(x.get("chat_history"))).with_config(
+                run_name="HasChatHistoryCheck"
+            ),  # Condense follow-up question and chat into a standalone_question
+            (
+                RunnablePassthrough.assign(
+                    chat_history=lambda x: _format_chat_history(x["chat_history"])
+                )
+                | CONDENSE_QUESTION_PROMPT
+                | get_llm("openai", "gpt-3.5-turbo", temperature=0)
+                | StrOutputParser()
+            ).with_config(run_name=CONDENSE_RUN),  # timed as one stage by rag.tracing
+        ),
+        # Else, we have no chat history, so just pass through the question
+        RunnableLambda(lambda x: x["question"]),
+    )
+
+    template = """Answer the question based only on the following context:
+                {context}
+
+                Question: {question}
+                Answer:"""
+    prompt = ChatPromptTemplate.from_template(template)
+
+    chain = (
+        RunnableParallel(
+            {
+                "context": _search_query | retriever,
+                "question": RunnablePassthrough(),
+            }
+        )
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+    return chain
+
+
+def get_chain(vector_index, backfill):
+    return get_registry().get(("neo4j-rag", id(vector_index)), lambda: build_chain(vector_index, backfill))
+
+
+def get_llm_transformer():
+    def build():
+        from langchain_experimental.graph_transformers import LLMGraphTransformer
+        return LLMGraphTransformer(llm=get_llm("openai", CHAT_MODEL, temperature=0))
+    return get_registry().get(("graph-transformer", CHAT_MODEL), build)
+
+
+def ingest(pdf_files, corpus_key, backfill, writer=None, llm_transformer=None, text_splitter=None):
+    """
+    Stream pages -> 512-token chunks -> graph extraction -> Neo4j writes; returns
+    the writer's stats. `writer`, `llm_transformer` and `text_splitter` default
+    to a BulkGraphWriter on the pooled driver, the registry's transformer and a
+    TokenTextSplitter.
+    """
+    if text_splitter is None:
+        from langchain_text_splitters import TokenTextSplitter
+        text_splitter = TokenTextSplitter(chunk_size=512, chunk_overlap=24)
+    # Chunks are extracted concurrently; finished ones are checkpointed so a failed ingest resumes on rerun.
+    # The checkpoint file is deleted once the whole ingest has succeeded.
+    # Writes are grouped UNWIND MERGEs keyed on chunk hashes, so re-uploading a PDF is a no-op.
+    writer = writer or BulkGraphWriter(get_driver())
+    with ExtractionCheckpoint.for_corpus(corpus_key) as checkpoint:
+        sink = GraphSink(writer, llm_transformer or get_llm_transformer(), checkpoint=checkpoint)
+        run_pipeline(pdf_files, text_splitter, sink, batch_size=32, backend="pdfplumber")
+    bump_version(backfill.namespace)  # new Document text is keyword-searchable before it is embedded
+    backfill.notify()  # embed the new Document nodes off the request path
+    return writer.stats()
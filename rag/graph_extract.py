@@ -0,0 +1,135 @@
+"""Concurrent knowledge-graph extraction for ingestion.
+
+Chunks are sent to LLMGraphTransformer.aprocess_response concurrently, bounded
+by a semaphore. Rate-limit and transient errors are retried with exponential
+backoff and jitter (honouring Retry-After when the SDK exposes it). Finished
+chunks are checkpointed in SQLite keyed by content hash, so an interrupted
+ingest resumes where it stopped instead of starting over.
+"""
+import asyncio
+import hashlib
+import os
+import pickle
+import random
+import sqlite3
+import threading
+
+from rag.aio import run
+from rag.cache import CACHE_DIR
+
+GRAPH_CONCURRENCY = int(os.getenv("GRAPH_CONCURRENCY", "8"))
+GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "6"))
+CHECKPOINT_DIR = os.path.join(CACHE_DIR, "graph_checkpoints")
+
+
+class ExtractionCheckpoint:
+    """
+    Persistent map of chunk hash -> GraphDocument. Used as a context manager,
+    the file is deleted when the block completes and kept, for resuming, when
+    it raises.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS done (key TEXT PRIMARY KEY, graph_document BLOB)")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_corpus(cls, corpus_key):
+        return cls(os.path.join(CHECKPOINT_DIR, f"{corpus_key}.sqlite"))
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT graph_document FROM done WHERE key = ?", (key,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def put(self, key, graph_document):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO done VALUES (?, ?)",
+                               (key, pickle.dumps(graph_document, protocol=pickle.HIGHEST_PROTOCOL)))
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def remove(self):
+        self.close()
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.remove()
+        else:
+            self.close()
+
+
+def chunk_key(document):
+    return hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+
+
+def _status_code(exc):
+    return getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def _is_retryable(exc):
+    status = _status_code(exc)
+    if status == 429 or (status is not None and status >= 500):
+        return True
+    name = type(exc).__name__.lower()
+    return "ratelimit" in name or "timeout" in name or isinstance(exc, (ConnectionError, asyncio.TimeoutError))
+
+
+def _retry_after(exc):
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def _extract_one(llm_transformer, document, semaphore, max_retries, base_delay):
+    async with semaphore:
+        for attempt in range(max_retries + 1):
+            try:
+                return await llm_transformer.aprocess_response(document)
+            except Exception as exc:
+                if attempt == max_retries or not _is_retryable(exc):
+                    raise
+                delay = _retry_after(exc) or base_delay * 2 ** attempt
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+
+async def aextract_graph_documents(documents, llm_transformer, concurrency=GRAPH_CONCURRENCY,
+                                   max_retries=GRAPH_MAX_RETRIES, checkpoint=None, base_delay=1.0, semaphore=None):
+    """
+    GraphDocuments for `documents`, in order; checkpointed chunks are not
+    re-extracted. Pass a shared `semaphore` to bound concurrency across calls.
+    """
+    semaphore = semaphore or asyncio.Semaphore(concurrency)
+
+    async def extract(document):
+        key = chunk_key(document)
+        if checkpoint is not None:
+            graph_document = await asyncio.to_thread(checkpoint.get, key)
+            if graph_document is not None:
+                return graph_document
+        graph_document = await _extract_one(llm_transformer, document, semaphore, max_retries, base_delay)
+        if checkpoint is not None:
+            await asyncio.to_thread(checkpoint.put, key, graph_document)
+        return graph_document
+
+    return await asyncio.gather(*[extract(document) for document in documents])
+
+
+def extract_graph_documents(documents, llm_transformer, **kwargs):
+    """Blocking wrapper around aextract_graph_documents, run on the shared event loop."""
+    return run(aextract_graph_documents(documents, llm_transformer, **kwargs))
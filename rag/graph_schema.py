@@ -0,0 +1,189 @@
+"""One-time Neo4j schema bootstrap and background embedding backfill.
+
+`bootstrap` creates the uniqueness constraints, the full-text indexes (entity
+names for the structured retriever, Document text for hybrid search) and the
+Document vector index, then waits until every index is ONLINE. It is
+idempotent and memoised per process, so the apps call it at start-up instead
+of issuing DDL on every upload.
+
+New Document nodes are created with the EmbeddingPending label (see
+rag.graph_writer). `EmbeddingBackfill` embeds only those nodes, in batches,
+on a background thread, so the question path just reads the existing index.
+
+Run it as a standalone migration with:
+
+    python -m rag.graph_schema
+"""
+import logging
+import os
+import threading
+import time
+
+from rag.retrieval_cache import bump_version, index_version
+
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "64"))
+BACKFILL_POLL_SECONDS = float(os.getenv("BACKFILL_POLL_SECONDS", "30"))
+
+ENTITY_INDEX = "entity"
+KEYWORD_INDEX = "keyword"
+VECTOR_INDEX = "vector"
+PENDING_LABEL = "EmbeddingPending"
+
+CONSTRAINT_QUERIES = [
+    "CREATE CONSTRAINT IF NOT EXISTS FOR (n:__Entity__) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT IF NOT EXISTS FOR (d:Document) REQUIRE d.id IS UNIQUE",
+]
+
+FULLTEXT_QUERIES = [
+    f"CREATE FULLTEXT INDEX {ENTITY_INDEX} IF NOT EXISTS FOR (e:__Entity__) ON EACH [e.id]",
+    f"CREATE FULLTEXT INDEX {KEYWORD_INDEX} IF NOT EXISTS FOR (d:Document) ON EACH [d.text]",
+]
+
+VECTOR_QUERY = """CREATE VECTOR INDEX {name} IF NOT EXISTS FOR (d:Document) ON (d.embedding)
+OPTIONS {{indexConfig: {{`vector.dimensions`: {dimensions}, `vector.similarity_function`: 'cosine'}}}}"""
+
+# Documents stored before the pending label existed; a one-off scan at bootstrap.
+MARK_UNEMBEDDED_QUERY = f"""MATCH (d:Document) WHERE d.embedding IS NULL AND NOT d:{PENDING_LABEL}
+SET d:{PENDING_LABEL}"""
+
+INDEX_STATE_QUERY = """SHOW INDEXES YIELD name, state
+WHERE name IN $names
+RETURN name, state"""
+
+PENDING_QUERY = f"""MATCH (d:{PENDING_LABEL})
+RETURN d.id AS id, d.text AS text
+LIMIT $limit"""
+
+SET_EMBEDDINGS_QUERY = f"""UNWIND $rows AS row
+MATCH (d:Document {{id: row.id}})
+CALL db.create.setNodeVectorProperty(d, 'embedding', row.embedding)
+REMOVE d:{PENDING_LABEL}"""
+
+# Matches what Neo4jVector.from_existing_graph(text_node_properties=["text"]) returns as page_content.
+RETRIEVAL_QUERY = """RETURN reduce(str='', k IN ['text'] | str + '\\n' + k + ': ' + coalesce(node[k], '')) AS text,
+node {.*, `embedding`: Null, id: Null, `text`: Null} AS metadata, score"""
+
+logger = logging.getLogger(__name__)
+
+_bootstrapped = set()
+_bootstrap_lock = threading.Lock()
+
+
+def wait_for_indexes(driver, names, timeout=300, database=NEO4J_DATABASE):
+    deadline = time.monotonic() + timeout
+    while True:
+        records, _, _ = driver.execute_query(INDEX_STATE_QUERY, {"names": list(names)}, database_=database)
+        states = {record["name"]: record["state"] for record in records}
+        failed = [name for name, state in states.items() if state == "FAILED"]
+        if failed:
+            raise RuntimeError(f"Neo4j indexes failed to populate: {failed}")
+        if len(states) == len(names) and all(state == "ONLINE" for state in states.values()):
+            return
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Neo4j indexes not ONLINE after {timeout}s: {states}")
+        time.sleep(0.5)
+
+
+def bootstrap(driver, dimensions=None, database=NEO4J_DATABASE, timeout=300):
+    """
+    Create constraints and indexes if missing and block until they are ONLINE.
+    The vector index is skipped when `dimensions` is None.
+    """
+    with _bootstrap_lock:
+        if (id(driver), database, dimensions) in _bootstrapped:
+            return
+        names = [ENTITY_INDEX, KEYWORD_INDEX]
+        queries = CONSTRAINT_QUERIES + FULLTEXT_QUERIES
+        if dimensions:
+            names.append(VECTOR_INDEX)
+            queries = queries + [VECTOR_QUERY.format(name=VECTOR_INDEX, dimensions=int(dimensions)),
+                                 MARK_UNEMBEDDED_QUERY]
+        for query in queries:
+            driver.execute_query(query, database_=database)
+        wait_for_indexes(driver, names, timeout=timeout, database=database)
+        _bootstrapped.add((id(driver), database, dimensions))
+
+
+class EmbeddingBackfill:
+    """
+    Embeds pending Document nodes in batches on a daemon thread.
+
+    Call `notify()` after an ingest to start a pass right away; otherwise the
+    thread polls every `poll_seconds`. Every batch written bumps the
+    retrieval-cache version of `namespace` (rag.retrieval_cache), so cached
+    results from any process see newly searchable documents; `version` reads it.
+    """
+
+    def __init__(self, driver, embeddings, batch_size=BACKFILL_BATCH_SIZE,
+                 poll_seconds=BACKFILL_POLL_SECONDS, database=NEO4J_DATABASE, namespace="neo4j"):
+        self.driver = driver
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.database = database
+        self.namespace = namespace
+        self.embedded = 0
+        self._wake = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Embed one batch of pending documents; returns how many were embedded."""
+        records, _, _ = self.driver.execute_query(
+            PENDING_QUERY, {"limit": self.batch_size}, database_=self.database, routing_="r")
+        if not records:
+            return 0
+        vectors = self.embeddings.embed_documents([record["text"] or "" for record in records])
+        rows = [{"id": record["id"], "embedding": vector} for record, vector in zip(records, vectors)]
+        self.driver.execute_query(SET_EMBEDDINGS_QUERY, {"rows": rows}, database_=self.database)
+        self.embedded += len(rows)
+        bump_version(self.namespace)
+        return len(rows)
+
+    @property
+    def version(self):
+        return index_version(self.namespace)
+
+    def run_until_empty(self):
+        total = 0
+        while True:
+            count = self.run_once()
+            if not count:
+                return total
+            total += count
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            try:
+                self.run_until_empty()
+            except Exception:
+                logger.exception("Embedding backfill pass failed; retrying on the next wake-up")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="embedding-backfill", daemon=True)
+            self._thread.start()
+        return self
+
+    def notify(self):
+        self.start()
+        self._wake.set()
+
+
+def main():
+    from dotenv import load_dotenv
+    from langchain_openai import OpenAIEmbeddings
+
+    from rag.neo4j_pool import get_driver
+
+    load_dotenv()
+    embeddings = OpenAIEmbeddings()
+    driver = get_driver()
+    bootstrap(driver, dimensions=len(embeddings.embed_query("dimension probe")))
+    print(f"Indexes ONLINE; embedded {EmbeddingBackfill(driver, embeddings).run_until_empty()} pending documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Bulk, idempotent writer for LLMGraphTransformer output.
+
+Replaces Neo4jGraph.add_graph_documents. Nodes are grouped by label and
+relationships by type, then written with one UNWIND query per group in
+transactions of `batch_size` rows. Source chunks become Document nodes
+MERGEd on a SHA-256 of their text, and documents already in the graph are
+skipped entirely, so re-ingesting the same PDF is a cheap no-op. MERGE relies
+on the uniqueness constraints from rag.graph_schema.bootstrap.
+"""
+import hashlib
+import os
+import time
+from collections import defaultdict
+
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+GRAPH_WRITE_BATCH = int(os.getenv("GRAPH_WRITE_BATCH", "1000"))
+
+# New documents are labelled for rag.graph_schema.EmbeddingBackfill.
+DOCUMENT_QUERY = """UNWIND $rows AS row
+MERGE (d:Document {id: row.id})
+ON CREATE SET d:EmbeddingPending, d.text = row.text, d += row.metadata"""
+
+NODE_QUERY = """UNWIND $rows AS row
+MERGE (n:__Entity__ {{id: row.id}})
+SET n:{label}, n += row.properties"""
+
+MENTIONS_QUERY = """UNWIND $rows AS row
+MATCH (d:Document {id: row.document})
+MATCH (n:__Entity__ {id: row.entity})
+MERGE (d)-[:MENTIONS]->(n)"""
+
+RELATIONSHIP_QUERY = """UNWIND $rows AS row
+MATCH (s:__Entity__ {{id: row.source}})
+MATCH (t:__Entity__ {{id: row.target}})
+MERGE (s)-[r:{type}]->(t)
+SET r += row.properties"""
+
+EXISTING_DOCUMENTS_QUERY = """UNWIND $ids AS id
+MATCH (d:Document {id: id})
+RETURN d.id AS id"""
+
+
+def document_id(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _quote(name):
+    # Labels and relationship types cannot be query parameters.
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def _properties(properties):
+    # Neo4j only stores primitives and lists of primitives.
+    return {key: value for key, value in (properties or {}).items()
+            if isinstance(value, (str, int, float, bool)) or
+            (isinstance(value, list) and all(isinstance(v, (str, int, float, bool)) for v in value))}
+
+
+class BulkGraphWriter:
+    def __init__(self, driver, database=NEO4J_DATABASE, batch_size=GRAPH_WRITE_BATCH):
+        self.driver = driver
+        self.database = database
+        self.batch_size = batch_size
+        self.nodes_written = 0
+        self.relationships_written = 0
+        self.seconds = 0.0
+
+    def _write(self, session, query, rows):
+        for start in range(0, len(rows), self.batch_size):
+            session.execute_write(lambda tx, batch: tx.run(query, rows=batch).consume(),
+                                  rows[start:start + self.batch_size])
+
+    def existing_documents(self, ids):
+        """Subset of `ids` already stored as Document nodes."""
+        with self.driver.session(database=self.database, default_access_mode="READ") as session:
+            records = session.run(EXISTING_DOCUMENTS_QUERY, ids=list(ids))
+            return {record["id"] for record in records}
+
+    def write(self, graph_documents):
+        """MERGE graph documents whose source chunk is not in the graph yet; returns how many were new."""
+        start_time = time.perf_counter()
+        by_id = {document_id(doc.source.page_content): doc for doc in graph_documents}
+        new_ids = set(by_id) - self.existing_documents(by_id)
+
+        documents, mentions = [], []
+        nodes = defaultdict(dict)  # label -> id -> properties
+        relationships = defaultdict(dict)  # type -> (source, target) -> properties
+        for doc_id in new_ids:
+            doc = by_id[doc_id]
+            documents.append({"id": doc_id, "text": doc.source.page_content,
+                              "metadata": _properties(doc.source.metadata)})
+            for node in doc.nodes:
+                nodes[node.type].setdefault(node.id, {}).update(_properties(node.properties))
+                mentions.append({"document": doc_id, "entity": node.id})
+            for rel in doc.relationships:
+                for node in (rel.source, rel.target):
+                    nodes[node.type].setdefault(node.id, {})
+                relationships[rel.type].setdefault((rel.source.id, rel.target.id), {}).update(
+                    _properties(rel.properties))
+
+        with self.driver.session(database=self.database) as session:
+            self._write(session, DOCUMENT_QUERY, documents)
+            for label, rows in nodes.items():
+                self._write(session, NODE_QUERY.format(label=_quote(label)),
+                            [{"id": node_id, "properties": props} for node_id, props in rows.items()])
+            self._write(session, MENTIONS_QUERY, mentions)
+            for rel_type, rows in relationships.items():
+                self._write(session, RELATIONSHIP_QUERY.format(type=_quote(rel_type)),
+                            [{"source": s, "target": t, "properties": props} for (s, t), props in rows.items()])
+
+        self.nodes_written += len(documents) + sum(len(rows) for rows in nodes.values())
+        self.relationships_written += len(mentions) + sum(len(rows) for rows in relationships.values())
+        self.seconds += time.perf_counter() - start_time
+        return len(new_ids)
+
+    def stats(self):
+        seconds = self.seconds or float("inf")
+        return {
+            "nodes": self.nodes_written,
+            "relationships": self.relationships_written,
+            "seconds": self.seconds,
+            "nodes_per_sec": self.nodes_written / seconds,
+            "rels_per_sec": self.relationships_written / seconds,
+        }
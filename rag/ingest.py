@@ -0,0 +1,239 @@
+"""Streaming ingestion pipeline: pages -> chunks -> embedding batches -> upserts.
+
+Each stage is a generator. `prefetch` runs a stage on a background thread
+behind a bounded queue, so PDF parsing, embedding and vector-store writes
+overlap while memory stays proportional to the batch size, not the corpus.
+"""
+import asyncio
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from langchain_core.documents import Document
+
+from rag.pdf_extract import DEFAULT_BACKEND, DEFAULT_WORKERS, iter_pages
+
+DEFAULT_BATCH_SIZE = 64
+PREFETCH_POLL = 0.1  # seconds a blocked producer waits before checking whether the consumer stopped
+_DONE = object()
+
+
+def iter_chunks(pages, text_splitter):
+    """
+    Split a stream of pages into (chunk, metadata) pairs.
+
+    The tail chunk of each page is carried into the next one so chunks still
+    span page boundaries the way splitting the concatenated text did. A
+    splitter with `split_pages` (rag.chunking.StructuredSplitter) chunks the
+    page stream itself.
+    """
+    if hasattr(text_splitter, "split_pages"):
+        yield from text_splitter.split_pages(pages)
+        return
+    carry, carry_page, source = "", None, None
+    for page in pages:
+        if page.source != source and carry:
+            yield carry, {"source": source, "page": carry_page}
+            carry = ""
+        source = page.source
+        text = carry + page.text
+        offset, starts = 0, []
+        chunks = text_splitter.split_text(text)
+        for chunk in chunks:
+            # A chunk starting inside the carried text belongs to the page it came from.
+            position = text.find(chunk, offset)
+            position = offset if position == -1 else position
+            starts.append(carry_page if position < len(carry) else page.number)
+            offset = position + 1
+        for chunk, start in zip(chunks[:-1], starts):
+            yield chunk, {"source": source, "page": start}
+        carry, carry_page = (chunks[-1], starts[-1]) if chunks else ("", None)
+    if carry:
+        yield carry, {"source": source, "page": carry_page}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def prefetch(iterable, depth=2):
+    """
+    Produce items of `iterable` on a worker thread, at most `depth` ahead of the consumer.
+
+    When the consumer stops early (an exception, or closing the generator) the
+    worker stops too and closes `iterable`, so its cleanup still runs.
+    """
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=PREFETCH_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as exc:  # re-raised in the consumer
+            put(exc)
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while (item := items.get()) is not _DONE:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_embedded_batches(chunks, embeddings, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield (texts, metadatas, vectors) per batch; vectors is None when embeddings is None."""
+    for batch in batched(chunks, batch_size):
+        texts = [text for text, _ in batch]
+        metadatas = [metadata for _, metadata in batch]
+        vectors = embeddings.embed_documents(texts) if embeddings is not None else None
+        yield texts, metadatas, vectors
+
+
+def run_pipeline(sources, text_splitter, sink, embeddings=None, batch_size=DEFAULT_BATCH_SIZE,
+                 backend=DEFAULT_BACKEND, workers=DEFAULT_WORKERS):
+    """Stream `sources` through extraction, splitting and embedding into `sink`; returns the chunk count."""
+    pages = prefetch(iter_pages(sources, backend=backend, workers=workers))
+    batches = prefetch(iter_embedded_batches(iter_chunks(pages, text_splitter), embeddings, batch_size))
+    count = 0
+    try:
+        for texts, metadatas, vectors in batches:
+            sink.upsert(texts, metadatas, vectors)
+            count += len(texts)
+    finally:
+        batches.close()  # stops both producers if the sink failed; iter_pages then removes its temp files
+    if hasattr(sink, "flush"):
+        sink.flush()
+    return count
+
+
+class FaissSink:
+    """
+    Builds a FAISS store from the first batch and appends the rest with
+    add_embeddings; `flush()` switches a large store to FAISS_INDEX_TYPE.
+    """
+
+    def __init__(self, embeddings, store=None):
+        self.embeddings = embeddings
+        self.store = store
+
+    def upsert(self, texts, metadatas, vectors):
+        from langchain_community.vectorstores.faiss import FAISS
+        if self.store is None:
+            self.store = FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings, metadatas=metadatas)
+        else:
+            self.store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+
+    def flush(self):
+        from rag.faiss_index import maybe_upgrade
+        if self.store is not None:
+            self.store.index = maybe_upgrade(self.store.index)
+
+
+class PineconeSink:
+    """
+    Upserts precomputed vectors into one namespace of a Pinecone index using
+    the langchain `text` metadata key.
+
+    Every upsert and flush bumps the namespace's retrieval-cache version
+    (rag.retrieval_cache.bump_version).
+
+    Requests of `batch_size` vectors are sent from `workers` threads, with a
+    bounded number in flight; `flush()` waits for the rest and re-raises the
+    first failure.
+    """
+
+    def __init__(self, index, id_prefix, text_key="text", namespace=None, batch_size=None, workers=None):
+        from rag.pinecone_index import PINECONE_UPSERT_BATCH, PINECONE_UPSERT_WORKERS
+        self.index = index
+        self.id_prefix = id_prefix
+        self.text_key = text_key
+        self.namespace = namespace
+        self.batch_size = batch_size or PINECONE_UPSERT_BATCH
+        self.workers = workers or PINECONE_UPSERT_WORKERS
+        self.count = 0
+        self._executor = None
+        self._pending = deque()
+
+    def _send(self, records):
+        if self.namespace:
+            return self.index.upsert(vectors=records, namespace=self.namespace)
+        return self.index.upsert(vectors=records)
+
+    def upsert(self, texts, metadatas, vectors):
+        from rag.retrieval_cache import bump_version
+        records = []
+        for text, metadata, vector in zip(texts, metadatas, vectors):
+            records.append((f"{self.id_prefix}-{self.count}", list(vector), {**metadata, self.text_key: text}))
+            self.count += 1
+        for batch in batched(records, self.batch_size):
+            if self.workers <= 1:
+                self._send(batch)
+                continue
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="pinecone-upsert")
+            while len(self._pending) >= 2 * self.workers:
+                self._pending.popleft().result()
+            self._pending.append(self._executor.submit(self._send, batch))
+        bump_version(self.namespace or "")
+
+    def flush(self):
+        from rag.retrieval_cache import bump_version
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            bump_version(self.namespace or "")  # queued batches have landed; results cached meanwhile are stale
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+class GraphSink:
+    """
+    Extracts each batch of chunks concurrently with an LLMGraphTransformer and
+    bulk-writes it with a rag.graph_writer.BulkGraphWriter. Chunks already in
+    the graph are neither re-extracted nor re-written. One semaphore bounds the
+    LLM calls in flight for the whole ingest, not per batch.
+    """
+
+    def __init__(self, writer, llm_transformer, checkpoint=None, concurrency=None):
+        from rag.graph_extract import GRAPH_CONCURRENCY
+        self.writer = writer
+        self.llm_transformer = llm_transformer
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency or GRAPH_CONCURRENCY
+        self.semaphore = asyncio.Semaphore(self.concurrency)  # binds to the shared loop on first use
+
+    def upsert(self, texts, metadatas, vectors):
+        from rag.graph_extract import extract_graph_documents
+        from rag.graph_writer import document_id
+        existing = self.writer.existing_documents([document_id(text) for text in texts])
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)
+                     if document_id(text) not in existing]
+        if not documents:
+            return
+        graph_documents = extract_graph_documents(documents, self.llm_transformer, checkpoint=self.checkpoint,
+                                                  semaphore=self.semaphore)
+        self.writer.write(graph_documents)
@@ -0,0 +1,366 @@
+"""In-process, on-disk stand-in for a Pinecone index (VECTOR_BACKEND=local).
+
+`LocalIndex` speaks the slice of the Pinecone data-plane API the apps use:
+upsert / query / delete / describe_index_stats, per namespace. PineconeSink
+and rag.pinecone_index therefore work against it unchanged.
+`LocalVectorStore` is the LangChain store over it, with the same
+from_texts / from_existing_index / similarity_search contract as the Pinecone
+stores.
+
+Search is exact cosine similarity: one NumPy matrix-vector product per query
+plus a partial sort. A namespace with at least LOCAL_HNSW_MIN vectors
+switches to an hnswlib HNSW graph when hnswlib is installed. Namespaces are
+saved under LOCAL_VECTOR_DIR/<index>/ a moment after the last write, and are
+memory-mapped when loaded.
+"""
+import atexit
+import json
+import os
+import threading
+import uuid
+from urllib.parse import quote, unquote
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from rag.cache import DATA_DIR
+
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", os.path.join(DATA_DIR, "vector_indexes"))
+LOCAL_HNSW_MIN = int(os.getenv("LOCAL_HNSW_MIN", "20000"))  # 0 disables HNSW
+LOCAL_HNSW_M = int(os.getenv("LOCAL_HNSW_M", "16"))
+LOCAL_HNSW_EF_CONSTRUCTION = int(os.getenv("LOCAL_HNSW_EF_CONSTRUCTION", "200"))
+LOCAL_HNSW_EF = int(os.getenv("LOCAL_HNSW_EF", "64"))
+LOCAL_SAVE_DELAY = float(os.getenv("LOCAL_SAVE_DELAY", "1.0"))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _matches(metadata, filter):
+    """Pinecone metadata filters: {"key": value}, {"key": {"$eq"|"$ne"|"$in"|"$nin": ...}}."""
+    for key, condition in (filter or {}).items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand or op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand or op == "$nin" and value in operand:
+                return False
+            if op not in ("$eq", "$ne", "$in", "$nin"):
+                raise NotImplementedError(f"Unsupported metadata filter operator {op!r}")
+    return True
+
+
+class _Namespace:
+    """Vectors of one namespace: a growable normalized matrix, swap-remove deletes, optional HNSW."""
+
+    def __init__(self, dimension, vectors=None, ids=(), metadatas=()):
+        self.dimension = dimension
+        self.ids = list(ids)
+        self.metadatas = list(metadatas)
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self._data = vectors if vectors is not None else np.zeros((0, dimension), dtype=np.float32)
+        self._labels = list(range(len(self.ids)))  # row -> stable HNSW label
+        self._label_rows = {label: row for row, label in enumerate(self._labels)}
+        self._next_label = len(self.ids)
+        self._hnsw = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def matrix(self):
+        return self._data[:len(self.ids)]
+
+    def _reserve(self, size):
+        if size <= self._data.shape[0] and self._data.flags.writeable:
+            return
+        grown = np.zeros((max(size, 2 * self._data.shape[0], 64), self.dimension), dtype=np.float32)
+        grown[:len(self.ids)] = self.matrix  # also copies a read-only memory map into RAM
+        self._data = grown
+
+    def upsert(self, ids, vectors, metadatas):
+        vectors = _normalize(vectors)
+        self._reserve(len(self.ids) + len(ids))
+        new_labels = []
+        for vector_id, vector, metadata in zip(ids, vectors, metadatas):
+            row = self.rows.get(vector_id)
+            if row is None:
+                row = len(self.ids)
+                self.ids.append(vector_id)
+                self.metadatas.append(metadata)
+                self._labels.append(None)
+                self.rows[vector_id] = row
+            else:
+                self.metadatas[row] = metadata
+                self._forget_label(row)
+            label = self._next_label
+            self._next_label += 1
+            self._labels[row] = label
+            self._label_rows[label] = row
+            self._data[row] = vector
+            new_labels.append(label)
+        if self._hnsw is not None and new_labels:
+            self._hnsw.resize_index(max(self._hnsw.get_max_elements(), self._next_label))
+            self._hnsw.add_items(self._data[[self._label_rows[label] for label in new_labels]], new_labels)
+
+    def _forget_label(self, row):
+        label = self._labels[row]
+        del self._label_rows[label]
+        if self._hnsw is not None:
+            self._hnsw.mark_deleted(label)
+
+    def delete(self, ids):
+        for vector_id in ids:
+            row = self.rows.pop(vector_id, None)
+            if row is None:
+                continue
+            self._forget_label(row)
+            last = len(self.ids) - 1
+            if row != last:  # move the last row into the hole
+                self._data[row] = self._data[last]
+                self.ids[row], self.metadatas[row], self._labels[row] = self.ids[last], self.metadatas[last], self._labels[last]
+                self.rows[self.ids[row]] = row
+                self._label_rows[self._labels[row]] = row
+            self.ids.pop()
+            self.metadatas.pop()
+            self._labels.pop()
+
+    def _index(self):
+        if self._hnsw is None and LOCAL_HNSW_MIN and len(self.ids) >= LOCAL_HNSW_MIN:
+            try:
+                import hnswlib
+            except ImportError:
+                return None
+            hnsw = hnswlib.Index(space="ip", dim=self.dimension)  # inner product of unit vectors = cosine
+            hnsw.init_index(max_elements=self._next_label, ef_construction=LOCAL_HNSW_EF_CONSTRUCTION, M=LOCAL_HNSW_M)
+            hnsw.add_items(self.matrix, self._labels)
+            hnsw.set_ef(LOCAL_HNSW_EF)
+            self._hnsw = hnsw
+        return self._hnsw
+
+    def search(self, vector, k, filter=None):
+        """[(row, cosine score)] of the k nearest rows, best first."""
+        if not self.ids:
+            return []
+        query = _normalize(vector)
+        hnsw = None if filter else self._index()
+        if hnsw is not None:
+            labels, distances = hnsw.knn_query(query, k=min(k, len(self.ids)))
+            return [(self._label_rows[label], 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])]
+        scores = self.matrix @ query
+        if filter:
+            allowed = np.fromiter((_matches(metadata, filter) for metadata in self.metadatas), dtype=bool,
+                                  count=len(self.metadatas))
+            scores = np.where(allowed, scores, -np.inf)
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+
+class _Stats:
+    def __init__(self, dimension, namespaces):
+        self.dimension = dimension
+        self.namespaces = namespaces
+        self.total_vector_count = sum(item["vector_count"] for item in namespaces.values())
+
+
+class LocalIndex:
+    """A Pinecone-style index kept in memory and persisted to `root`/<name>/."""
+
+    def __init__(self, name, dimension=None, root=LOCAL_VECTOR_DIR):
+        self.name = name
+        self.dimension = dimension
+        self.path = os.path.join(root, quote(name, safe=""))
+        self._namespaces = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._timer = None
+        os.makedirs(self.path, exist_ok=True)
+        self._load()
+
+    def _file(self, namespace, suffix):
+        return os.path.join(self.path, (quote(namespace, safe="") or "__default__") + suffix)
+
+    def _load(self):
+        for entry in sorted(os.listdir(self.path)):
+            if not entry.endswith(".json"):
+                continue
+            stem = entry[:-len(".json")]
+            namespace = "" if stem == "__default__" else unquote(stem)
+            with open(os.path.join(self.path, entry)) as f:
+                meta = json.load(f)
+            vectors = np.load(self._file(namespace, ".npy"), mmap_mode="r")
+            self.dimension = self.dimension or vectors.shape[1]
+            self._namespaces[namespace] = _Namespace(vectors.shape[1], vectors, meta["ids"], meta["metadatas"])
+
+    def _namespace(self, namespace, dimension=None):
+        namespace = namespace or ""
+        if namespace not in self._namespaces:
+            self.dimension = self.dimension or dimension
+            self._namespaces[namespace] = _Namespace(self.dimension)
+        return self._namespaces[namespace]
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        """`vectors`: (id, values, metadata) tuples or {"id", "values", "metadata"} dicts."""
+        records = [(v["id"], v["values"], v.get("metadata") or {}) if isinstance(v, dict) else
+                   (v[0], v[1], v[2] if len(v) > 2 else {}) for v in vectors]
+        if not records:
+            return {"upserted_count": 0}
+        ids, values, metadatas = zip(*records)
+        with self._lock:
+            self._namespace(namespace, len(values[0])).upsert(ids, values, metadatas)
+            self._touch(namespace)
+        return {"upserted_count": len(records)}
+
+    def query(self, vector, top_k=10, namespace=None, filter=None, include_metadata=True, include_values=False,
+              **kwargs):
+        with self._lock:
+            space = self._namespaces.get(namespace or "")
+            hits = space.search(vector, top_k, filter) if space is not None else []
+            matches = []
+            for row, score in hits:
+                match = {"id": space.ids[row], "score": score}
+                if include_metadata:
+                    match["metadata"] = dict(space.metadatas[row])
+                if include_values:
+                    match["values"] = space.matrix[row].tolist()
+                matches.append(match)
+        return {"matches": matches, "namespace": namespace or ""}
+
+    def delete(self, ids=None, delete_all=False, namespace=None, filter=None, **kwargs):
+        with self._lock:
+            space = self._namespaces.get(namespace or "")
+            if space is None:
+                return {}
+            if delete_all:
+                del self._namespaces[namespace or ""]
+            else:
+                if filter:
+                    ids = [vector_id for vector_id, metadata in zip(space.ids, space.metadatas)
+                           if _matches(metadata, filter)]
+                space.delete(ids or [])
+            self._touch(namespace)
+        return {}
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            return _Stats(self.dimension, {name: {"vector_count": len(space)}
+                                           for name, space in self._namespaces.items()})
+
+    def _touch(self, namespace):
+        # Write-behind: a burst of upserts is saved once, LOCAL_SAVE_DELAY after the last one.
+        self._dirty.add(namespace or "")
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(LOCAL_SAVE_DELAY, self.save)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def save(self):
+        with self._lock:
+            for namespace in self._dirty:
+                space = self._namespaces.get(namespace)
+                if space is None or not len(space):
+                    for suffix in (".json", ".npy"):
+                        if os.path.exists(self._file(namespace, suffix)):
+                            os.remove(self._file(namespace, suffix))
+                    continue
+                # Vectors first: a namespace is only loaded when its .json exists.
+                np.save(self._file(namespace, ".tmp.npy"), space.matrix)
+                os.replace(self._file(namespace, ".tmp.npy"), self._file(namespace, ".npy"))
+                with open(self._file(namespace, ".tmp"), "w") as f:
+                    json.dump({"ids": space.ids, "metadatas": space.metadatas}, f, default=str)
+                os.replace(self._file(namespace, ".tmp"), self._file(namespace, ".json"))
+            self._dirty.clear()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(name, dimension=None, root=LOCAL_VECTOR_DIR):
+    """The process-wide LocalIndex `name`, loaded from disk on first use."""
+    with _indexes_lock:
+        key = (root, name)
+        if key not in _indexes:
+            _indexes[key] = LocalIndex(name, dimension, root)
+        return _indexes[key]
+
+
+@atexit.register
+def _save_all():
+    for index in list(_indexes.values()):
+        index.save()
+
+
+class LocalVectorStore(VectorStore):
+    """LangChain store over one namespace of a LocalIndex, interchangeable with PineconeVectorStore."""
+
+    def __init__(self, index, embedding, text_key="text", namespace=None):
+        self._index = index
+        self._embedding = embedding
+        self._text_key = text_key
+        self._namespace = namespace
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(self, texts, metadatas=None, ids=None, namespace=None, batch_size=100, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            vectors = self._embedding.embed_documents(chunk)
+            self._index.upsert([(ids[start + i], vectors[i], {**metadatas[start + i], self._text_key: text})
+                                for i, text in enumerate(chunk)], namespace=namespace or self._namespace)
+        return ids
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, namespace=None, **kwargs):
+        results = self._index.query(embedding, top_k=k, namespace=namespace or self._namespace, filter=filter)
+        documents = []
+        for match in results["matches"]:
+            metadata = match["metadata"]
+            text = metadata.pop(self._text_key, "")
+            documents.append((Document(id=match["id"], page_content=text, metadata=metadata), match["score"]))
+        return documents
+
+    def similarity_search_with_score(self, query, k=4, filter=None, namespace=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter, namespace)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, namespace=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter, namespace)]
+
+    def similarity_search(self, query, k=4, filter=None, namespace=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, namespace)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2  # cosine similarity in [-1, 1], as PineconeVectorStore maps it
+
+    def delete(self, ids=None, delete_all=None, namespace=None, filter=None, **kwargs):
+        self._index.delete(ids=ids, delete_all=bool(delete_all), namespace=namespace or self._namespace, filter=filter)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, index_name=None, namespace=None,
+                   text_key="text", batch_size=100, **kwargs):
+        store = cls(get_local_index(index_name or "default"), embedding, text_key, namespace)
+        store.add_texts(texts, metadatas, ids, batch_size=batch_size)
+        return store
+
+    @classmethod
+    def from_existing_index(cls, index_name, embedding, text_key="text", namespace=None, **kwargs):
+        return cls(get_local_index(index_name), embedding, text_key, namespace)
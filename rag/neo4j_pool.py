@@ -0,0 +1,95 @@
+"""One pooled Neo4j driver per process, shared by every Neo4j client.
+
+Neo4jGraph and Neo4jVector each open their own driver, and Streamlit reruns
+rebuilt them on every interaction. `share_driver` swaps a client's private
+driver for the process-wide pooled one, so the graph store, the vector
+index, the bulk writer, the full-text retriever and the graph visualizer all
+draw connections from the same pool. Idle connections are liveness-checked
+before reuse and both drivers are closed at interpreter exit.
+
+Pool settings come from the environment:
+NEO4J_MAX_POOL_SIZE, NEO4J_LIVENESS_CHECK_SECONDS, NEO4J_CONNECTION_TIMEOUT
+and NEO4J_MAX_CONNECTION_LIFETIME.
+"""
+import atexit
+import os
+import threading
+
+from rag.aio import run
+
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_LIVENESS_CHECK_SECONDS = float(os.getenv("NEO4J_LIVENESS_CHECK_SECONDS", "30"))
+NEO4J_CONNECTION_TIMEOUT = float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "15"))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
+
+_driver = None
+_async_driver = None
+_lock = threading.Lock()
+
+
+def driver_config():
+    return {
+        "max_connection_pool_size": NEO4J_MAX_POOL_SIZE,
+        # Connections idle longer than this are pinged before being handed out.
+        "liveness_check_timeout": NEO4J_LIVENESS_CHECK_SECONDS,
+        "connection_timeout": NEO4J_CONNECTION_TIMEOUT,
+        "max_connection_lifetime": NEO4J_MAX_CONNECTION_LIFETIME,
+        "keep_alive": True,
+    }
+
+
+def _credentials():
+    # Read lazily: the apps call load_dotenv() after their imports.
+    return os.environ["NEO4J_URI"], (os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"])
+
+
+def get_driver():
+    """The shared synchronous driver, created and verified on first use."""
+    global _driver
+    if _driver is None:
+        with _lock:
+            if _driver is None:
+                from neo4j import GraphDatabase
+                uri, auth = _credentials()
+                driver = GraphDatabase.driver(uri, auth=auth, **driver_config())
+                driver.verify_connectivity()
+                _driver = driver
+    return _driver
+
+
+async def aget_driver():
+    """The shared async driver. Must be awaited on the rag.aio loop, which owns its connections."""
+    global _async_driver
+    if _async_driver is None:
+        from neo4j import AsyncGraphDatabase
+        uri, auth = _credentials()
+        _async_driver = AsyncGraphDatabase.driver(uri, auth=auth, **driver_config())
+    return _async_driver
+
+
+def share_driver(client):
+    """Point a LangChain Neo4j client (Neo4jGraph, Neo4jVector) at the shared pool and close its own driver."""
+    driver = get_driver()
+    own, client._driver = client._driver, driver
+    if own is not driver:
+        own.close()
+    return client
+
+
+def get_graph(**kwargs):
+    from langchain_community.graphs import Neo4jGraph
+    return share_driver(Neo4jGraph(**kwargs))
+
+
+def close():
+    global _driver, _async_driver
+    with _lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+        if _async_driver is not None:
+            run(_async_driver.close(), timeout=10)
+            _async_driver = None
+
+
+atexit.register(close)
@@ -0,0 +1,253 @@
+"""Page-level PDF text extraction sharded across a process pool.
+
+Pages are split into contiguous ranges, each range is parsed in a worker
+process, and the results come back in page order with page numbers attached.
+Three backends are available: "pdfplumber" (layout aware, slower), "pypdf",
+and "layout". "layout" also attaches pdfplumber's structure to each page as
+heading / text / table blocks, for rag.chunking.StructuredSplitter.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+BACKENDS = ("pdfplumber", "pypdf", "layout")
+DEFAULT_BACKEND = os.getenv("PDF_BACKEND", "pdfplumber")
+DEFAULT_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or os.cpu_count() or 1
+# Below this many pages the pool round-trip costs more than it saves.
+MIN_PARALLEL_PAGES = 8
+# A line at least this much larger than the body font is a heading.
+HEADING_RATIO = float(os.getenv("PDF_HEADING_RATIO", "1.15"))
+
+Page = namedtuple("Page", ["number", "text", "source", "blocks"], defaults=(None,))
+# kind: heading | text | table. size: a heading's font size, which orders the outline (0 for other blocks).
+Block = namedtuple("Block", ["kind", "text", "size"])
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn avoids forking the (threaded) Streamlit server process.
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _page_count(path, backend):
+    if backend in ("pdfplumber", "layout"):
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _outside(bboxes):
+    def test(obj):
+        x, y = (obj["x0"] + obj["x1"]) / 2, (obj["top"] + obj["bottom"]) / 2
+        return not any(x0 <= x <= x1 and top <= y <= bottom for x0, top, x1, bottom in bboxes)
+    return test
+
+
+def _table_text(rows):
+    return "\n".join(" | ".join((cell or "").replace("\n", " ").strip() for cell in row).strip(" |")
+                     for row in rows if any(cell for cell in row))
+
+
+def _layout_items(page):
+    """
+    Text lines (top, bottom, size, font, text) outside tables, tables and
+    one-cell boxes (top, text) of one page.
+    """
+    tables = page.find_tables()
+    text_page = page.filter(_outside([table.bbox for table in tables])) if tables else page
+    lines = []
+    for line in text_page.extract_text_lines(return_chars=True, strip=True):
+        chars = [char for char in line["chars"] if char["text"].strip()]
+        if not chars:
+            continue
+        size = Counter(round(char["size"], 1) for char in chars).most_common(1)[0][0]
+        fonts = {char["fontname"] for char in chars}
+        lines.append((line["top"], line["bottom"], size, fonts.pop() if len(fonts) == 1 else None, line["text"]))
+    grids, boxes = [], []
+    for table in tables:
+        rows = table.extract()
+        # A one-cell "table" is a boxed callout, read as ordinary text.
+        (grids if sum(len(row) for row in rows) > 1 else boxes).append((table.bbox[1], _table_text(rows)))
+    return lines, grids, boxes
+
+
+def _layout_blocks(items):
+    """
+    Per page, Blocks in reading order. The body size and font are the most
+    common ones in the shard; short lines set larger, or entirely in another
+    font (bold, semibold), are headings. Consecutive body lines without a
+    paragraph gap are joined.
+    """
+    sizes, fonts = Counter(), Counter()
+    for lines, _, _ in items:
+        for _, _, size, font, text in lines:
+            sizes[size] += len(text)
+            fonts[font] += len(text)
+    body = sizes.most_common(1)[0][0] if sizes else 0
+    body_font = fonts.most_common(1)[0][0] if fonts else None
+
+    pages = []
+    for lines, tables, boxes in items:
+        blocks, paragraph, last_bottom = [], [], None
+        pending = sorted([(top, 0, (bottom, size, font, text)) for top, bottom, size, font, text in lines] +
+                         [(top, 1, text) for top, text in tables] + [(top, 2, text) for top, text in boxes],
+                         key=lambda item: (item[0], item[1]))
+
+        def flush():
+            if paragraph:
+                blocks.append(Block("text", _join_lines(paragraph), 0))
+                paragraph.clear()
+
+        for top, kind, payload in pending:
+            if kind:
+                flush()
+                if payload:
+                    blocks.append(Block("table" if kind == 1 else "text", payload, 0))
+                last_bottom = None
+                continue
+            bottom, size, font, text = payload
+            larger = size >= body * HEADING_RATIO and len(text) <= 200
+            emphasised = font not in (None, body_font) and size >= body and len(text) <= 100 \
+                and not text.endswith((".", ":", ",", ";"))
+            if larger or emphasised:
+                flush()
+                if blocks and blocks[-1].kind == "heading" and blocks[-1].size == size and last_bottom is not None \
+                        and top - last_bottom < (bottom - top):
+                    blocks[-1] = Block("heading", f"{blocks[-1].text} {text}", size)  # wrapped heading
+                else:
+                    blocks.append(Block("heading", text, size))
+            else:
+                if last_bottom is not None and top - last_bottom > 0.8 * (bottom - top):
+                    flush()  # paragraph gap
+                paragraph.append(text)
+            last_bottom = bottom
+        flush()
+        pages.append(blocks)
+    return pages
+
+
+def _join_lines(lines):
+    text = lines[0]
+    for line in lines[1:]:
+        text = text[:-1] + line if text.endswith("-") and line[:1].islower() else f"{text} {line}"
+    return text
+
+
+def _extract_range(path, start, stop, backend):
+    """Extract pages [start, stop) of one file as (text, blocks) pairs; runs inside a worker process."""
+    texts = []
+    if backend == "layout":
+        import pdfplumber
+        items = []
+        with pdfplumber.open(path, pages=list(range(start + 1, stop + 1))) as pdf:
+            for page in pdf.pages:
+                items.append(_layout_items(page))
+                page.flush_cache()
+        return [("\n".join(block.text for block in blocks), blocks) for blocks in _layout_blocks(items)]
+    if backend == "pdfplumber":
+        import pdfplumber
+        with pdfplumber.open(path, pages=list(range(start + 1, stop + 1))) as pdf:
+            for page in pdf.pages:
+                texts.append(page.extract_text() or "")
+                page.flush_cache()
+    else:
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        for i in range(start, stop):
+            texts.append(reader.pages[i].extract_text() or "")
+    return [(text, None) for text in texts]
+
+
+def _as_path(source, tmp_paths):
+    """Workers open files by path, so spill in-memory uploads to a temp file once."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source), os.path.basename(os.fspath(source))
+    if isinstance(source, (bytes, bytearray)):
+        data, name = bytes(source), "upload.pdf"
+    else:
+        if hasattr(source, "getvalue"):
+            data = source.getvalue()
+        else:
+            data = source.read()
+            source.seek(0)
+        name = getattr(source, "name", "upload.pdf")
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    tmp_paths.append(path)
+    return path, name
+
+
+def iter_pages(sources, backend=DEFAULT_BACKEND, workers=DEFAULT_WORKERS):
+    """
+    Yield Page(number, text, source, blocks) for every page of every source, in order
+    (blocks is None except for the "layout" backend).
+
+    Sources may be paths, bytes or file-like objects; page numbers start at 1
+    within each source. At most ~2 shards per worker are in flight, so memory
+    stays bounded however large the corpus is.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend {backend!r}, expected one of {BACKENDS}")
+    if not isinstance(sources, (list, tuple)):
+        sources = [sources]
+
+    tmp_paths = []
+    try:
+        files = [_as_path(source, tmp_paths) for source in sources]
+        jobs = []
+        for path, name in files:
+            n_pages = _page_count(path, backend)
+            shard = max(1, -(-n_pages // (workers * 4)))  # ~4 shards per worker for load balance
+            for start in range(0, n_pages, shard):
+                jobs.append((path, name, start, min(start + shard, n_pages)))
+
+        total_pages = sum(stop - start for _, _, start, stop in jobs)
+        if workers <= 1 or total_pages < MIN_PARALLEL_PAGES:
+            for path, name, start, stop in jobs:
+                texts = _extract_range(path, start, stop, backend)
+                yield from (Page(start + i + 1, text, name, blocks) for i, (text, blocks) in enumerate(texts))
+            return
+
+        pool = _get_pool(workers)
+        window = deque()
+        pending = iter(jobs)
+        for job in pending:
+            window.append((job, pool.submit(_extract_range, job[0], job[2], job[3], backend)))
+            if len(window) >= workers * 2:
+                break
+        while window:
+            (_, name, start, _), future = window.popleft()
+            texts = future.result()
+            job = next(pending, None)
+            if job is not None:
+                window.append((job, pool.submit(_extract_range, job[0], job[2], job[3], backend)))
+            yield from (Page(start + i + 1, text, name, blocks) for i, (text, blocks) in enumerate(texts))
+    finally:
+        for path in tmp_paths:
+            os.remove(path)
+
+
+def extract_pages(sources, backend=DEFAULT_BACKEND, workers=DEFAULT_WORKERS):
+    """All pages of the sources as a list, see iter_pages."""
+    return list(iter_pages(sources, backend=backend, workers=workers))
+
+
+def extract_text(sources, backend=DEFAULT_BACKEND, workers=DEFAULT_WORKERS):
+    """All page text of the sources joined into one string (the apps' old loader contract)."""
+    return "".join(page.text for page in extract_pages(sources, backend=backend, workers=workers))
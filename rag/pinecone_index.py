@@ -0,0 +1,142 @@
+"""Long-lived Pinecone indexes partitioned into namespaces.
+
+The apps used to delete and recreate an index on every upload, which is slow
+and wipes everyone else's vectors. Instead `ensure_index` creates an index
+only if it is missing and polls until it is ready (memoised per process),
+each corpus is written to its own namespace (optionally prefixed by a user),
+and deletes are scoped to one namespace. Upserts are batched and sent in
+parallel by rag.ingest.PineconeSink.
+
+VECTOR_BACKEND=local swaps the hosted service for rag.local_index, which
+has the same index and store interface. `get_index` and `open_vector_store`
+return whichever backend is configured, so the hosted and local paths can be
+benchmarked side by side.
+"""
+import os
+import re
+import threading
+import time
+
+PINECONE_CLOUD = os.getenv("PINECONE_CLOUD", "aws")
+PINECONE_REGION = os.getenv("PINECONE_REGION", "us-east-1")
+PINECONE_UPSERT_BATCH = int(os.getenv("PINECONE_UPSERT_BATCH", "100"))
+PINECONE_UPSERT_WORKERS = int(os.getenv("PINECONE_UPSERT_WORKERS", "4"))
+PINECONE_READY_TIMEOUT = float(os.getenv("PINECONE_READY_TIMEOUT", "300"))
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")  # pinecone | local
+
+_client = None
+_ready = set()
+_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            from pinecone import Pinecone
+            _client = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
+        return _client
+
+
+def _status(error):
+    return getattr(error, "status", None) or getattr(error, "status_code", None)
+
+
+def wait_until_ready(name, timeout=PINECONE_READY_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    delay = 0.5
+    while not get_client().describe_index(name).status["ready"]:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Pinecone index {name!r} not ready after {timeout}s")
+        time.sleep(delay)
+        delay = min(delay * 2, 10)
+
+
+def get_index(name):
+    """Data-plane handle of an existing index on the configured backend."""
+    if VECTOR_BACKEND == "local":
+        from rag.local_index import get_local_index
+        return get_local_index(name)
+    return get_client().Index(name)
+
+
+def ensure_index(name, dimension, metric="cosine", timeout=PINECONE_READY_TIMEOUT):
+    """The Index handle for `name`, creating the index if it is missing and waiting until it is ready."""
+    if VECTOR_BACKEND == "local":
+        from rag.local_index import get_local_index
+        return get_local_index(name, dimension)
+    client = get_client()
+    with _lock:
+        if name in _ready:
+            return client.Index(name)
+    if name not in client.list_indexes().names():
+        from pinecone import ServerlessSpec
+        try:
+            client.create_index(name, dimension=dimension, metric=metric,
+                                spec=ServerlessSpec(cloud=PINECONE_CLOUD, region=PINECONE_REGION))
+        except Exception as exc:
+            if _status(exc) != 409:  # created concurrently by another process
+                raise
+    wait_until_ready(name, timeout)
+    with _lock:
+        _ready.add(name)
+    return client.Index(name)
+
+
+def namespace_for(corpus_key, user=None):
+    """Namespace of one corpus; content-addressed, so re-uploading the same PDFs reuses it."""
+    if not user:
+        return corpus_key
+    return f"{re.sub(r'[^A-Za-z0-9_.-]+', '-', user)}/{corpus_key}"
+
+
+def namespace_count(index, namespace):
+    """Vectors stored in `namespace` (0 if it does not exist)."""
+    summary = index.describe_index_stats().namespaces.get(namespace or "")
+    if summary is None:
+        return 0
+    count = getattr(summary, "vector_count", None)
+    return summary["vector_count"] if count is None else count
+
+
+def wait_for_namespace(index, namespace, count, timeout=PINECONE_READY_TIMEOUT):
+    """Poll until `count` upserted vectors are visible; serverless writes are eventually consistent."""
+    deadline = time.monotonic() + timeout
+    while namespace_count(index, namespace) < count:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Pinecone namespace {namespace!r} has fewer than {count} vectors after {timeout}s")
+        time.sleep(0.5)
+
+
+def delete_namespace(index, namespace):
+    """Drop every vector in `namespace` and nothing else."""
+    from rag.retrieval_cache import bump_version
+    if not namespace:
+        raise ValueError("Refusing to clear the default namespace")
+    try:
+        index.delete(delete_all=True, namespace=namespace)
+    except Exception as exc:
+        if _status(exc) != 404:  # namespace already gone
+            raise
+    finally:
+        bump_version(namespace)
+
+
+def open_vector_store(index_name, embedding, namespace=None, text_key="text"):
+    """LangChain store over one namespace of an existing index on the configured backend."""
+    if VECTOR_BACKEND == "local":
+        from rag.local_index import LocalVectorStore
+        return LocalVectorStore.from_existing_index(index_name, embedding, text_key=text_key, namespace=namespace)
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore(index_name=index_name, embedding=embedding, namespace=namespace, text_key=text_key)
+
+
+def vector_store_from_texts(texts, embedding, index_name, metadatas=None, namespace=None):
+    """Embed and upsert `texts`, returning the store; `from_texts` on the configured backend."""
+    if VECTOR_BACKEND == "local":
+        from rag.local_index import LocalVectorStore
+        return LocalVectorStore.from_texts(texts, embedding, metadatas=metadatas, index_name=index_name,
+                                           namespace=namespace)
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore.from_texts(texts, embedding, metadatas=metadatas, index_name=index_name,
+                                          namespace=namespace)
@@ -0,0 +1,85 @@
+"""Question answering over the "chatindex" Pinecone index.
+
+Shared by groq/app3.py and the HTTP service (server.py): ingestion into the
+index, the cached store handle, retrieval and the Groq answer chain. Each
+uploaded corpus lives in its own namespace of the long-lived index (see
+rag.pinecone_index); questions are answered from one namespace. The TOP_K
+retrieved chunks are packed into CHAT_MODEL's context budget (rag.context).
+"""
+import os
+
+from rag.cache import cache_key, get_default_cache, splitter_settings, upload_key
+from rag.chains import get_registry, get_stuff_answer_chain
+from rag.context import pack_context
+from rag.embeddings import get_embeddings
+from rag.ingest import PineconeSink, run_pipeline
+from rag.pinecone_index import (VECTOR_BACKEND, ensure_index, namespace_count, namespace_for, open_vector_store,
+                                wait_for_namespace)
+from rag.tracing import span
+
+INDEX_NAME = "chatindex"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DIMENSION = 384
+CHAT_MODEL = "mixtral-8x7b-32768"
+TOP_K = 20
+
+QA_PROMPT_TEMPLATE = """
+    Answer the question as detailed as possible from the provided context, make sure to provide all the details, if the answer is not in
+    provided context just say, "answer is not available in the context", don't provide the wrong answer\n\n
+    Context:\n {context}?\n
+    Question: \n{question}\n
+ 
+    Answer:
+    """
+
+
+def get_text_splitter():
+    from rag.chunking import StructuredSplitter
+    return StructuredSplitter()
+
+
+def get_store(namespace=None):
+    """The LangChain store over one namespace of INDEX_NAME, built once per process."""
+    def build():
+        return open_vector_store(INDEX_NAME, get_embeddings(EMBEDDING_MODEL), namespace=namespace)
+    return get_registry().get((VECTOR_BACKEND, INDEX_NAME, EMBEDDING_MODEL, namespace), build)
+
+
+def ingest(pdf_docs, user=None):
+    """
+    Write the PDFs into their own namespace of INDEX_NAME and return it. A
+    corpus this process already stored completely is not re-embedded.
+    """
+    text_splitter = get_text_splitter()
+    corpus_key = upload_key(pdf_docs, splitter=splitter_settings(text_splitter), embeddings=EMBEDDING_MODEL)
+    namespace = namespace_for(corpus_key, user)
+    index = ensure_index(INDEX_NAME, dimension=DIMENSION)
+    cache = get_default_cache()
+    marker = cache_key(INDEX_NAME, namespace)
+    stored = cache.get(marker)
+    if stored is not None and namespace_count(index, namespace) >= stored["upserted"]:
+        return namespace
+
+    sink = PineconeSink(index, id_prefix=corpus_key, namespace=namespace)
+    count = run_pipeline(pdf_docs, text_splitter, sink, embeddings=get_embeddings(EMBEDDING_MODEL), backend="layout")
+    wait_for_namespace(index, namespace, count)
+    cache.put(marker, {"upserted": count})
+    return namespace
+
+
+def retrieve_context(question, k=TOP_K, store=None, namespace=None):
+    """The top-k chunks for `question` as a rag.context.PackedContext."""
+    store = store or get_store(namespace)
+    with span("vector_search", k=k):
+        docs = store.similarity_search(question, k=k)
+    return pack_context(docs, CHAT_MODEL, question=question, embeddings=store.embeddings)
+
+
+def retrieve(question, k=TOP_K, store=None, namespace=None):
+    return retrieve_context(question, k, store, namespace).documents
+
+
+def get_conversational_chain():
+    # Built once per process; later questions reuse the chain and the Groq HTTP client.
+    # Same prompt and stuffing as load_qa_chain, but as a runnable so the answer can be streamed.
+    return get_stuff_answer_chain(QA_PROMPT_TEMPLATE, "groq", CHAT_MODEL, groq_api_key=os.getenv('GROQ_API_KEY'))
@@ -0,0 +1,237 @@
+"""Query-embedding and retrieval result cache shared by every session in the process.
+
+Query vectors are memoized per (embedding model, normalized question); they do
+not depend on the index. Top-k results are memoized per (namespace, index
+version, normalized question, k). Both live in an in-memory LRU/TTL map backed
+by an on-disk store under RAG_CACHE_DIR, so they survive restarts.
+
+Index versions come from the writers: every sink or store that upserts into or
+deletes from a namespace calls `bump_version(namespace)`, which records a new
+token on disk, and `search` reads it back with `index_version(namespace)`. A
+write from any process (an app session, server.py /ingest, the embedding
+backfill) therefore makes older results unreachable; they then age out by
+LRU/TTL. Stores passed without a namespace are cached in memory only, keyed
+by their size.
+"""
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from rag.cache import CACHE_DIR, DATA_DIR, IngestionCache, cache_key, embedding_settings
+from rag.tracing import span
+
+CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "900"))
+RETRIEVAL_CACHE_DIR = os.getenv("RETRIEVAL_CACHE_DIR", os.path.join(CACHE_DIR, "retrieval"))  # "": memory only
+RETRIEVAL_CACHE_DISK_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_DISK_ENTRIES", "4096"))
+RETRIEVAL_CACHE_EVICT_EVERY = int(os.getenv("RETRIEVAL_CACHE_EVICT_EVERY", "64"))
+VERSIONS_DIR = os.path.join(DATA_DIR, "index_versions")  # lives as long as the indexes it versions
+
+
+def _version_path(namespace):
+    return os.path.join(VERSIONS_DIR, cache_key(namespace))
+
+
+def index_version(namespace):
+    """Token of the last write recorded for `namespace` by any process ("0" before the first)."""
+    try:
+        with open(_version_path(namespace)) as f:
+            return f.read() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def bump_version(namespace):
+    """Record a write to `namespace`: results cached for it become unreachable in every process."""
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=VERSIONS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, _version_path(namespace))
+
+
+def _model_key(embeddings):
+    # Model and backend: int8 or ONNX vectors differ from torch ones, and query vectors persist across restarts.
+    return tuple(sorted(embedding_settings(embeddings).items()))
+
+
+def normalize_question(question):
+    """Case, whitespace and trailing punctuation should not defeat the cache."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+class TTLCache:
+    """Thread-safe LRU map whose entries also expire `ttl` seconds after insertion."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+            else:
+                for key in [key for key in self._data if predicate(key)]:
+                    del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RetrievalCache:
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, root=RETRIEVAL_CACHE_DIR):
+        self.ttl = ttl
+        self.vectors = TTLCache(maxsize, ttl)
+        self.results = TTLCache(maxsize, ttl)
+        # Evicting lists and stats the whole directory, so it runs every RETRIEVAL_CACHE_EVICT_EVERY writes, not per miss.
+        self.disk = IngestionCache(root, max_entries=RETRIEVAL_CACHE_DISK_ENTRIES,
+                                   evict_every=RETRIEVAL_CACHE_EVICT_EVERY) if root else None
+        self.disk_hits = 0
+
+    def _get(self, memory, key, persist=True):
+        value = memory.get(key)
+        if value is None and persist and self.disk is not None:
+            entry = self.disk.get(cache_key(*key))
+            if entry is not None and entry["expires"] > time.time():
+                value = entry["value"]
+                self.disk_hits += 1
+                memory.put(key, value)
+        return value
+
+    def _put(self, memory, key, value, persist=True):
+        memory.put(key, value)
+        if persist and self.disk is not None:
+            self.disk.put(cache_key(*key), {"expires": time.time() + self.ttl, "value": value})
+
+    def query_vector(self, embeddings, question):
+        key = (_model_key(embeddings), normalize_question(question))
+        vector = self._get(self.vectors, key)
+        if vector is None:
+            with span("query_embedding"):
+                vector = embeddings.embed_query(question)
+            self._put(self.vectors, key, vector)
+        return vector
+
+    def document_vectors(self, embeddings, texts):
+        """Vectors of retrieved chunk `texts`, embedding only the ones not seen before (kept in memory)."""
+        model = _model_key(embeddings)
+        keys = [(model, "document", text) for text in texts]
+        vectors = [self.vectors.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            with span("document_embedding", count=len(missing)):
+                embedded = embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+                self.vectors.put(keys[i], vector)
+        return vectors
+
+    def search(self, store, question, k=4, namespace=None, version=None):
+        """
+        Top-k (Document, score) pairs for `question`, from cache while the index
+        is unchanged. `version` defaults to `index_version(namespace)`.
+        """
+        persist = namespace is not None
+        if namespace is None:
+            namespace, version = str(id(store)), _index_version(store)  # process-local store
+        elif version is None:
+            version = index_version(namespace)
+        key = (namespace, version, normalize_question(question), k)
+        results = self._get(self.results, key, persist)
+        if results is None:
+            vector = self.query_vector(store.embeddings, question)
+            with span("vector_search", k=k):
+                results = _search_by_vector(store, vector, question, k)
+            self._put(self.results, key, results, persist)
+        return results
+
+    def invalidate(self, namespace):
+        """Drop cached results for one namespace, in this process and on disk."""
+        bump_version(namespace)
+        self.results.invalidate(lambda key: key[0] == namespace)
+
+    def stats(self):
+        return {
+            "vector_hits": self.vectors.hits, "vector_misses": self.vectors.misses,
+            "result_hits": self.results.hits, "result_misses": self.results.misses,
+            "disk_hits": self.disk_hits,
+        }
+
+
+def _index_version(store):
+    # Stores without a namespace: any add/delete changes the size.
+    index = getattr(store, "index", None)
+    return getattr(index, "ntotal", 0)
+
+
+def _search_by_vector(store, vector, question, k):
+    if hasattr(store, "similarity_search_with_score_by_vector"):  # FAISS, Neo4jVector
+        # Neo4jVector's hybrid mode also needs the raw text for its keyword index.
+        kwargs = {"query": question} if type(store).__name__ == "Neo4jVector" else {}
+        return store.similarity_search_with_score_by_vector(vector, k=k, **kwargs)
+    if hasattr(store, "similarity_search_by_vector_with_score"):  # Pinecone
+        return store.similarity_search_by_vector_with_score(vector, k=k)
+    return [(doc, None) for doc in store.similarity_search_by_vector(vector, k=k)]
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_retrieval_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = RetrievalCache()
+        return _default_cache
+
+
+def cached_similarity_search(store, question, k=4, namespace=None, version=None):
+    """Drop-in for store.similarity_search(question, k=k) backed by the process-wide cache."""
+    return [doc for doc, _ in get_retrieval_cache().search(store, question, k, namespace, version)]
+
+
+class CachedRetriever(BaseRetriever):
+    """Retriever over a vector store that goes through the retrieval cache."""
+
+    store: Any
+    k: int = 4
+    namespace: Optional[str] = None
+    version_fn: Optional[Callable] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        version = self.version_fn() if self.version_fn else None
+        return cached_similarity_search(self.store, query, self.k, self.namespace, version)
@@ -0,0 +1,88 @@
+"""Incremental answer rendering with time-to-first-token accounting.
+
+`answer_stream` wraps a chain's `.stream()` output, yields the answer text as
+it arrives (ready for `st.write_stream`) and records time to first token
+separately from total latency. Set STREAM_ANSWERS=0 to render the answer in
+one piece instead; timings are recorded either way.
+"""
+import os
+import time
+
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "1") != "0"
+
+
+class StreamStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.end = None
+        self.chunks = 0
+        self.text = ""
+        self.context = []
+
+    @property
+    def ttft(self):
+        return None if self.first_token is None else self.first_token - self.start
+
+    @property
+    def total(self):
+        return None if self.end is None else self.end - self.start
+
+    def summary(self):
+        if self.ttft is None:
+            return f"No answer tokens after {self.total or 0:.2f}s"
+        return f"First token after {self.ttft:.2f}s, full answer after {self.total:.2f}s ({self.chunks} chunks)"
+
+
+def _text(chunk, stats, key):
+    # create_retrieval_chain streams dicts: the retrieved documents once, then answer deltas.
+    if key is None:
+        return chunk
+    if "context" in chunk:
+        stats.context = chunk["context"]
+    return chunk.get(key)
+
+
+def _record(stats, text, parts):
+    if stats.first_token is None:
+        stats.first_token = time.perf_counter()
+    stats.chunks += 1
+    parts.append(text)
+
+
+def answer_stream(chunks, stats, key=None):
+    """Yield answer text from `chunks`; with `key`, chunks are dicts and the text is under `key`."""
+    parts = []
+    try:
+        for chunk in chunks:
+            text = _text(chunk, stats, key)
+            if text:
+                _record(stats, text, parts)
+                yield text
+    finally:
+        stats.end = time.perf_counter()
+        stats.text = "".join(parts)
+
+
+async def aanswer_stream(chunks, stats, key=None):
+    """answer_stream for a chain's `.astream()` output."""
+    parts = []
+    try:
+        async for chunk in chunks:
+            text = _text(chunk, stats, key)
+            if text:
+                _record(stats, text, parts)
+                yield text
+    finally:
+        stats.end = time.perf_counter()
+        stats.text = "".join(parts)
+
+
+def write_answer(tokens):
+    """Render answer text in Streamlit: token by token, or in one piece when STREAM_ANSWERS=0."""
+    import streamlit as st
+    if STREAM_ANSWERS:
+        return st.write_stream(tokens)
+    text = "".join(tokens)
+    st.write(text)
+    return text
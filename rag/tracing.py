@@ -0,0 +1,253 @@
+"""Wall-clock tracing spans for the question path.
+
+Each stage (condense_question, entity_extraction, query_embedding,
+vector_search, retrieval, context_packing, graph_query, prompt_assembly,
+llm_ttft, llm_total, plus the whole request and server.py's query_queue) is
+timed with `time.perf_counter`, kept in a bounded in-memory window for
+p50/p95/p99 summaries and appended to a JSON-lines file (TRACE_FILE; empty
+disables it) that the admin page reads across processes. Lines are handed to
+a background writer thread, so recording never does file IO on the caller's
+thread or event loop, and the file is rotated at TRACE_MAX_MB, keeping
+TRACE_BACKUPS older files.
+`Tracer.prometheus()` renders the window in the Prometheus text format.
+
+Stages inside LangChain runnables (prompt formatting, LLM calls, retrievers,
+the condense-question sub-chain) are timed by `TracingCallbackHandler`; pass
+`trace_config()` as the chain's config. The rest are timed with `span()`.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+from rag.cache import CACHE_DIR
+
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(CACHE_DIR, "traces", "spans.jsonl"))
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "10000"))
+TRACE_MAX_MB = int(os.getenv("TRACE_MAX_MB", "50"))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "3"))
+QUANTILES = (0.5, 0.95, 0.99)
+
+PROMPT_RUNS = ("ChatPromptTemplate", "PromptTemplate")
+CONDENSE_RUN = "condense_question"
+
+_trace_id = contextvars.ContextVar("rag_trace_id", default=None)
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.duration = None
+
+
+def _span_writer(path):
+    """Logger whose records are written to `path` by a QueueListener thread, with size-based rotation."""
+    writer = logging.getLogger(f"{__name__}.spans.{path}")
+    if not writer.handlers:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=TRACE_MAX_MB * 1024 * 1024, backupCount=TRACE_BACKUPS,
+                                      delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        records = queue.SimpleQueue()
+        listener = QueueListener(records, handler)
+        listener.start()
+        atexit.register(listener.stop)  # flushes what is still queued
+        writer.addHandler(QueueHandler(records))
+        writer.setLevel(logging.INFO)
+        writer.propagate = False
+    return writer
+
+
+def summarize(durations):
+    if not len(durations):
+        return {"count": 0}
+    values = np.asarray(durations, dtype=np.float64)
+    p50, p95, p99 = np.quantile(values, QUANTILES)
+    return {"count": int(values.size), "mean": float(values.mean()),
+            "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+class Tracer:
+    def __init__(self, path=TRACE_FILE, window=TRACE_WINDOW):
+        self.path = path
+        self._durations = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._lock = threading.Lock()
+        self._writer = _span_writer(path) if path else None
+
+    def record(self, name, seconds, **attrs):
+        with self._lock:
+            self._durations[name].append(seconds)
+            self._counts[name] += 1
+            self._sums[name] += seconds
+        if self._writer is not None:
+            line = {"ts": time.time(), "trace": _trace_id.get(), "span": name, "seconds": seconds, **attrs}
+            self._writer.info(json.dumps(line, default=str))
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = Span(name)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - start
+            self.record(name, span.duration, **attrs)
+
+    @contextmanager
+    def trace(self, name="request", **attrs):
+        """Root span: spans recorded inside it (on this thread) share a trace id."""
+        token = _trace_id.set(uuid.uuid4().hex[:16])
+        try:
+            with self.span(name, **attrs) as span:
+                yield span
+        finally:
+            try:
+                _trace_id.reset(token)
+            except ValueError:  # async generator closed from another context
+                pass
+
+    def summary(self):
+        with self._lock:
+            return {name: summarize(list(values)) for name, values in sorted(self._durations.items())}
+
+    def prometheus(self, metric="rag_stage_seconds"):
+        """Prometheus summary exposition of the in-memory window (quantiles) and lifetime totals."""
+        lines = [f"# HELP {metric} Wall-clock duration of RAG pipeline stages.", f"# TYPE {metric} summary"]
+        with self._lock:
+            windows = {name: list(values) for name, values in sorted(self._durations.items())}
+            totals = {name: (self._counts[name], self._sums[name]) for name in windows}
+        for name, values in windows.items():
+            for q, value in zip(QUANTILES, np.quantile(values, QUANTILES) if values else []):
+                lines.append(f'{metric}{{stage="{name}",quantile="{q}"}} {value:.6f}')
+            count, total = totals[name]
+            lines.append(f'{metric}_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Times prompt assembly, LLM first token / completion, retrievers and the condense-question sub-chain."""
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self._starts = {}
+        self._first_token = set()
+        self._condense = set()  # run ids inside the condense sub-chain; timed as one stage
+
+    def _inside_condense(self, run_id, parent_run_id):
+        if parent_run_id in self._condense:
+            self._condense.add(run_id)
+            return True
+        return False
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        if self._inside_condense(run_id, parent_run_id):
+            return
+        if name == CONDENSE_RUN:
+            self._condense.add(run_id)
+            self._starts[run_id] = (CONDENSE_RUN, time.perf_counter())
+        elif name in PROMPT_RUNS:
+            self._starts[run_id] = ("prompt_assembly", time.perf_counter())
+
+    def _end(self, run_id, **attrs):
+        self._condense.discard(run_id)
+        self._first_token.discard(run_id)
+        started = self._starts.pop(run_id, None)
+        if started:
+            stage, start = started
+            self.tracer.record(stage, time.perf_counter() - start, **attrs)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        if not self._inside_condense(run_id, parent_run_id):
+            self._starts[run_id] = ("llm_total", time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self.on_llm_start(serialized, messages, run_id=run_id, parent_run_id=parent_run_id)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        started = self._starts.get(run_id)
+        if started and run_id not in self._first_token:
+            self._first_token.add(run_id)
+            self.tracer.record("llm_ttft", time.perf_counter() - started[1])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        if not self._inside_condense(run_id, parent_run_id):
+            self._starts[run_id] = ("retrieval", time.perf_counter())
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, **attrs):
+    return _tracer.span(name, **attrs)
+
+
+def trace(name="request", **attrs):
+    return _tracer.trace(name, **attrs)
+
+
+def trace_config():
+    """Runnable config that times the chain's internal stages."""
+    return {"callbacks": [TracingCallbackHandler(_tracer)]}
+
+
+def load_spans(path=TRACE_FILE, limit=100000):
+    """The last `limit` spans from a JSON-lines trace file and its rotated backups."""
+    if not path:
+        return []
+    lines = deque(maxlen=limit)
+    for name in [f"{path}.{n}" for n in range(TRACE_BACKUPS, 0, -1)] + [path]:
+        if os.path.exists(name):
+            with open(name) as f:
+                lines.extend(f)
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except ValueError:
+            continue  # a line cut short by a concurrent writer
+    return spans
+
+
+def summarize_spans(spans, since=None):
+    durations = defaultdict(list)
+    for item in spans:
+        if since is None or item["ts"] >= since:
+            durations[item["span"]].append(item["seconds"])
+    return {name: summarize(values) for name, values in sorted(durations.items())}
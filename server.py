@@ -0,0 +1,245 @@
+"""Headless HTTP API over the retrieval chains of groq/app1.py, groq/app3.py and app.py.
+
+Corpora:
+- "faiss": groq/app1.py's persistent FAISS corpus answered by Groq (rag.faiss_qa)
+- "pinecone": the "chatindex" Pinecone index answered by Groq (rag.pinecone_qa)
+- "graph": the Neo4j knowledge graph + hybrid vector index (rag.graph_chain)
+
+Endpoints:
+- POST /ingest?corpus=...   multipart PDF upload(s); "pinecone" also takes &user=...
+- POST /query               {"question", "corpus", "chat_history", "namespace"} -> JSON answer
+- POST /query/stream        same body -> server-sent events: "token"*, then "end" (or "error")
+- GET  /health
+- GET  /metrics             per-stage latency summaries (Prometheus text format)
+- GET  /admin/spans         the same summaries as JSON
+
+Indexes, embedding models and chains are preloaded at start-up, once per
+worker process, and shared by all requests. Run with
+
+    python server.py
+
+or `uvicorn server:app --workers N`. Settings come from the environment:
+SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS (worker processes),
+SERVICE_MAX_CONCURRENCY (in-flight queries per worker; extra requests queue),
+SERVICE_LIMIT_CONCURRENCY (open connections per worker before uvicorn answers
+503), SERVICE_CORPORA (comma-separated corpora to load) and FAISS_CORPUS.
+"""
+import asyncio
+import io
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
+
+load_dotenv()
+
+from rag.cache import upload_key
+from rag.chains import format_documents
+from rag.streaming import StreamStats, aanswer_stream
+from rag.tracing import get_tracer, span, trace, trace_config
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "0.0.0.0")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+SERVICE_MAX_CONCURRENCY = int(os.getenv("SERVICE_MAX_CONCURRENCY", "32"))
+SERVICE_LIMIT_CONCURRENCY = int(os.getenv("SERVICE_LIMIT_CONCURRENCY", "0")) or None
+SERVICE_CORPORA = [name.strip() for name in os.getenv("SERVICE_CORPORA", "pinecone,graph").split(",") if name.strip()]
+FAISS_CORPUS = os.getenv("FAISS_CORPUS", "default")
+
+
+class QueryRequest(BaseModel):
+    question: str
+    corpus: str = "pinecone"
+    namespace: Optional[str] = None  # "pinecone" corpus: the namespace returned by /ingest
+    chat_history: List[Tuple[str, str]] = []
+
+
+class FaissCorpus:
+    answer_key = "answer"  # create_retrieval_chain streams dicts
+    corpus = None
+
+    def preload(self):
+        from rag.embeddings import warm_up
+        from rag.faiss_qa import EMBEDDING_MODEL, get_corpus
+        warm_up(EMBEDDING_MODEL, background=False)
+        self.corpus = get_corpus(FAISS_CORPUS)
+
+    async def prepare(self, request):
+        from rag.faiss_qa import get_chain
+        if self.corpus.store is None:
+            raise HTTPException(status_code=409, detail="The FAISS corpus is empty; POST /ingest?corpus=faiss first")
+        corpus = self.corpus
+        return get_chain(corpus.store, corpus.path, lambda: corpus.version), {"input": request.question}, []
+
+    def ingest(self, pdf_files, user=None):
+        from rag.faiss_qa import get_text_splitter
+        from rag.faiss_store import ingest_uploads
+        return {"added": ingest_uploads(self.corpus, pdf_files, get_text_splitter(), backend="layout")}
+
+
+class PineconeCorpus:
+    answer_key = None
+
+    def preload(self):
+        from rag.embeddings import warm_up
+        from rag.pinecone_qa import EMBEDDING_MODEL, get_conversational_chain, get_store
+        warm_up(EMBEDDING_MODEL, background=False)
+        get_store()
+        get_conversational_chain()
+
+    async def prepare(self, request):
+        """(chain, chain input, source documents) for a question."""
+        from rag.pinecone_qa import get_conversational_chain, retrieve
+        docs = await asyncio.to_thread(retrieve, request.question, namespace=request.namespace)
+        inputs = {"context": format_documents(docs), "question": request.question}
+        return get_conversational_chain(), inputs, docs
+
+    def ingest(self, pdf_files, user=None):
+        """Writes to a namespace of `user`'s own; without one, a fresh namespace nobody else can clear."""
+        from rag.pinecone_qa import ingest
+        return {"files": len(pdf_files), "namespace": ingest(pdf_files, user=user or uuid.uuid4().hex)}
+
+
+class GraphCorpus:
+    answer_key = None
+    vector_index = None
+    backfill = None
+
+    def preload(self):
+        from rag.graph_chain import get_chain, load_graph_index
+        self.vector_index, self.backfill = load_graph_index()
+        get_chain(self.vector_index, self.backfill)
+
+    async def prepare(self, request):
+        from rag.graph_chain import get_chain
+        inputs = {"question": request.question}
+        if request.chat_history:
+            inputs["chat_history"] = request.chat_history
+        return get_chain(self.vector_index, self.backfill), inputs, []
+
+    def ingest(self, pdf_files, user=None):
+        from rag.graph_chain import ingest
+        return ingest(pdf_files, upload_key(pdf_files), self.backfill)
+
+
+CORPORA = {"faiss": FaissCorpus, "pinecone": PineconeCorpus, "graph": GraphCorpus}
+corpora = {}
+query_slots = None
+ingest_lock = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global query_slots, ingest_lock
+    query_slots = asyncio.Semaphore(SERVICE_MAX_CONCURRENCY)
+    ingest_lock = asyncio.Lock()
+    for name in SERVICE_CORPORA:
+        corpus = CORPORA[name]()
+        await asyncio.to_thread(corpus.preload)
+        corpora[name] = corpus
+    yield
+
+
+app = FastAPI(title="Rapid Response RAG", lifespan=lifespan)
+
+
+def get_corpus(name):
+    if name not in corpora:
+        raise HTTPException(status_code=404, detail=f"Unknown or disabled corpus {name!r}; loaded: {sorted(corpora)}")
+    return corpora[name]
+
+
+@asynccontextmanager
+async def query_slot(corpus):
+    """One of SERVICE_MAX_CONCURRENCY slots; the wait is recorded as the "query_queue" stage."""
+    with span("query_queue", corpus=corpus):
+        await query_slots.acquire()
+    try:
+        yield
+    finally:
+        query_slots.release()
+
+
+def _sources(docs, stats):
+    docs = docs or stats.context
+    return [{"content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+
+
+def _timings(stats):
+    return {"ttft": stats.ttft, "total": stats.total}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "corpora": sorted(corpora)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Per-stage latency summaries of this worker in the Prometheus text format."""
+    return get_tracer().prometheus()
+
+
+@app.get("/admin/spans")
+async def spans():
+    return get_tracer().summary()
+
+
+@app.post("/ingest")
+async def ingest(files: List[UploadFile] = File(...), corpus: str = "pinecone", user: Optional[str] = None):
+    target = get_corpus(corpus)
+    pdf_files = []
+    for upload in files:
+        pdf = io.BytesIO(await upload.read())
+        pdf.name = upload.filename
+        pdf_files.append(pdf)
+    # Ingestion is CPU- and API-heavy; one at a time per worker, off the event loop.
+    async with ingest_lock:
+        result = await asyncio.to_thread(target.ingest, pdf_files, user)
+    return {"corpus": corpus, "result": result}
+
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    target = get_corpus(request.corpus)
+    async with query_slot(request.corpus):
+        with trace("request", app="server", corpus=request.corpus):
+            stats = StreamStats()
+            chain, inputs, docs = await target.prepare(request)
+            async for _ in aanswer_stream(chain.astream(inputs, config=trace_config()), stats, key=target.answer_key):
+                pass
+    return {"answer": stats.text, "sources": _sources(docs, stats), **_timings(stats)}
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    target = get_corpus(request.corpus)
+
+    async def events():
+        async with query_slot(request.corpus):
+            stats = StreamStats()
+            try:
+                with trace("request", app="server", corpus=request.corpus, stream=True):
+                    chain, inputs, docs = await target.prepare(request)
+                    async for token in aanswer_stream(chain.astream(inputs, config=trace_config()), stats,
+                                                      key=target.answer_key):
+                        yield {"event": "token", "data": token}
+            except Exception as exc:
+                yield {"event": "error", "data": json.dumps({"error": str(exc)})}
+                return
+            yield {"event": "end", "data": json.dumps({"sources": _sources(docs, stats), **_timings(stats)})}
+
+    return EventSourceResponse(events())
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("server:app", host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS,
+                limit_concurrency=SERVICE_LIMIT_CONCURRENCY)